@@ -0,0 +1,91 @@
+"""
+数据库在线备份。
+
+直接复制 data/collection.db 可能在 Streamlit 写入时拷到不一致的文件 (还有未合并的 WAL)。
+这里使用 SQLite 的在线备份 API 分步复制页面，每步之间短暂让出写锁，
+期间源库被其他连接修改时 SQLite 会自动重新开始，得到的总是某一时刻的一致快照。
+- 先写到临时文件，校验通过后再原子改名
+- 源库文件自上次备份以来没有变化时跳过 (记录在 BACKUP_DIR/last_backup.json)
+- 只保留最近 keep 份
+"""
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+DB_PATH = "data/collection.db"
+BACKUP_DIR = "data/backups"
+BACKUP_PAGES = 1024      # 每步复制的页数
+BACKUP_SLEEP = 0.05      # 秒，每步之间让出写锁的时间
+BACKUP_KEEP = 7
+
+
+def _source_state(db_path):
+    """源库与 WAL 文件的 (大小, 修改时间)，用于判断自上次备份以来是否有写入"""
+    state = []
+    for name in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(name)
+            state.append([st.st_size, st.st_mtime_ns])
+        except OSError:
+            state.append(None)
+    return state
+
+
+def backup_database(db_path=DB_PATH, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP, force=False, progress=print):
+    """
+    备份到 backup_dir/collection-<时间>.db，返回备份文件路径；
+    源库未变化且 force=False 时不备份，返回 None。
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"数据库不存在: {db_path}")
+    os.makedirs(backup_dir, exist_ok=True)
+    marker = os.path.join(backup_dir, "last_backup.json")
+    state = _source_state(db_path)
+    try:
+        with open(marker, encoding="utf-8") as f:
+            last = json.load(f)
+    except (OSError, ValueError):
+        last = {}
+    if not force and last.get("source") == state and os.path.exists(last.get("path", "")):
+        progress(f"数据库自上次备份 ({last['path']}) 以来没有变化，跳过。")
+        return None
+
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    dest = os.path.join(backup_dir, f"{stem}-{datetime.now():%Y%m%d-%H%M%S}.db")
+    tmp = dest + ".tmp"
+    started = time.time()
+
+    def report(status, remaining, total):
+        progress(f"备份进度 {total - remaining}/{total} 页")
+
+    try:
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst, pages=BACKUP_PAGES, progress=report, sleep=BACKUP_SLEEP)
+            ok = dst.execute("PRAGMA quick_check").fetchone()[0]
+            if ok != "ok":
+                raise RuntimeError(f"备份校验失败: {ok}")
+        finally:
+            src.close()
+            dst.close()
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, dest)
+
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump({"path": dest, "source": state, "finished_at": datetime.now().isoformat(sep=" ")}, f)
+    progress(f"已备份到 {dest} ({os.path.getsize(dest) / 1024 / 1024:.1f} MB，耗时 {time.time() - started:.1f}s)")
+
+    # 只保留最近 keep 份
+    backups = sorted(
+        name for name in os.listdir(backup_dir)
+        if name.startswith(stem + "-") and name.endswith(".db")
+    )
+    for name in backups[:-keep] if keep else []:
+        os.remove(os.path.join(backup_dir, name))
+    return dest
@@ -0,0 +1,116 @@
+"""
+进程内共享的数据库引擎、会话工厂与库版本号。
+
+- get_engine 每个数据库只初始化一次 (建表、索引、FTS、统计表)，之后复用连接池
+- get_scoped_session 按线程隔离会话 (Streamlit 每个浏览器会话的重跑在各自的线程中执行)
+- run_write 在新会话的短事务中写入，数据库被锁或乐观锁检查失败时退避重试
+- 每次提交都会递增版本号；library_version 再叠加数据库文件与 WAL 的修改时间，
+  其他进程 (如命令行导入) 写库后版本号同样会变化
+界面层的查询缓存以版本号为键：版本不变即可直接复用结果。
+引擎上的每条 SQL 都会计时，见 app.core.metrics。
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.core.metrics import increment, instrument_engine
+from app.core.models import init_db
+
+DEFAULT_DB_URL = "sqlite:///data/collection.db"
+WRITE_ATTEMPTS = 5
+WRITE_BACKOFF = 0.2  # 秒，第 n 次重试前等待 WRITE_BACKOFF * 2^(n-1)
+
+_engines = {}
+_factories = {}
+_scoped = {}
+_commits = {}
+_lock = threading.Lock()
+
+
+def _db_file(db_url):
+    """sqlite 文件库的路径，其他数据库返回 None"""
+    prefix = "sqlite:///"
+    if db_url.startswith(prefix) and db_url[len(prefix):] not in ("", ":memory:"):
+        return db_url[len(prefix):]
+    return None
+
+
+def get_engine(db_url=DEFAULT_DB_URL):
+    """进程内共享的引擎，首次调用时初始化数据库"""
+    with _lock:
+        if db_url not in _engines:
+            path = _db_file(db_url)
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            engine = init_db(db_url)
+            instrument_engine(engine)
+            _commits[db_url] = 0
+            event.listen(engine, "commit", lambda conn: bump_version(db_url))
+            _engines[db_url] = engine
+            _factories[db_url] = sessionmaker(bind=engine)
+        return _engines[db_url]
+
+
+def get_session_factory(db_url=DEFAULT_DB_URL):
+    """进程内共享的会话工厂"""
+    get_engine(db_url)
+    return _factories[db_url]
+
+
+def get_scoped_session(db_url=DEFAULT_DB_URL):
+    """按线程隔离的会话 (scoped_session)：同一线程内取到同一个会话，用完调用 remove() 关闭"""
+    factory = get_session_factory(db_url)
+    with _lock:
+        if db_url not in _scoped:
+            _scoped[db_url] = scoped_session(factory)
+        return _scoped[db_url]
+
+
+def is_locked_error(error):
+    """是否为 SQLite 的 database is locked / busy (等待超过 busy_timeout 仍未拿到锁)"""
+    message = str(getattr(error, "orig", error)).lower()
+    return isinstance(error, OperationalError) and ("locked" in message or "busy" in message)
+
+
+def run_write(fn, db_url=DEFAULT_DB_URL, attempts=WRITE_ATTEMPTS):
+    """
+    在新会话的短事务中执行 fn(session) 并提交，返回 fn 的结果。
+    数据库仍被锁或乐观锁检查失败 (StaleDataError，读取后条目被他人修改) 时回滚，
+    退避后整体重做；fn 会被再次调用，其中不应有数据库以外的副作用。
+    """
+    factory = get_session_factory(db_url)
+    for attempt in range(1, attempts + 1):
+        with factory() as session:
+            try:
+                result = fn(session)
+                session.commit()
+                return result
+            except (OperationalError, StaleDataError) as e:
+                session.rollback()
+                if attempt == attempts or not (isinstance(e, StaleDataError) or is_locked_error(e)):
+                    raise
+                increment("beanstash_write_retries_total", {"reason": "stale" if isinstance(e, StaleDataError) else "locked"})
+        time.sleep(WRITE_BACKOFF * 2 ** (attempt - 1))
+
+
+def bump_version(db_url=DEFAULT_DB_URL):
+    """标记库已变化 (引擎上的每次提交会自动调用)"""
+    with _lock:
+        _commits[db_url] = _commits.get(db_url, 0) + 1
+
+
+def library_version(db_url=DEFAULT_DB_URL):
+    """当前库版本：(本进程提交次数, 数据库文件 mtime, WAL 文件 mtime)"""
+    version = [_commits.get(db_url, 0)]
+    path = _db_file(db_url)
+    for name in (path, f"{path}-wal") if path else ():
+        try:
+            version.append(os.stat(name).st_mtime_ns)
+        except OSError:
+            version.append(0)
+    return tuple(version)
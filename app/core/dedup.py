@@ -0,0 +1,296 @@
+"""
+重复与近似重复条目的检测。
+
+dedup_keys 是按签名建立的倒排索引，每个条目对应若干签名：
+- isbn:<ISBN-13> / imdb:<tt 编号>   标识符 (ISBN-10 统一转换为 ISBN-13)
+- t:<类型>:<三字组>                 规范化标题 (及原名) 的三字组，短于 3 字的标题整体作为一个签名
+标题、原名、年份、标识符变化时由触发器把条目记入 dedup_dirty，
+查重前由 refresh_keys 在一个单独的短写事务中只重算这些条目的签名；
+find_matches / find_duplicate_groups 本身只读，不提交调用方的会话。
+
+比较只在共享签名的条目之间进行 (blocking)，出现在过多条目中的常见三字组不参与配对，
+因此全库查重的耗时随条目数近似线性增长，而不是两两比较。
+判定规则：标识符相同即为重复；否则标题三字组的 Dice 系数 (或较短标题被包含的比例) 够高，
+且两边年份都已知时相差不超过 1 年。
+"""
+import re
+import unicodedata
+
+from sqlalchemy import Integer, delete, func, insert, select, text
+
+from app.core.db import DEFAULT_DB_URL, get_session_factory, run_write
+from app.core.models import CollectionItem, dedup_dirty, dedup_keys
+
+DIRTY_COLUMNS = ("title", "original_title", "media_type", "year", "isbn", "imdb_id")
+MAX_BLOCK = 100          # 签名出现在更多条目中时不用于全库配对
+DICE_THRESHOLD = 0.75
+CONTAINMENT_THRESHOLD = 0.9
+MIN_CONTAINED_GRAMS = 4  # 按包含比例判定时，较短标题至少要有这么多个三字组
+SYNC_CHUNK = 500
+
+BRACKETS_RE = re.compile(r"[(\[（【〔][^)\]）】〕]*[)\]）】〕]")
+IMDB_RE = re.compile(r"tt\d+")
+
+
+def ensure_dedup(engine):
+    """创建维护 dedup_dirty 的触发器 (已是最新定义时跳过)，新建时把全部条目记为待重算"""
+    cols = ", ".join(DIRTY_COLUMNS)
+    # 不用 INSERT OR IGNORE：UPSERT (INSERT ... ON CONFLICT DO UPDATE) 触发时，
+    # 外层语句的冲突处理会覆盖触发器里的 OR IGNORE，条目已在 dedup_dirty 中就会报唯一约束错误
+    mark = "INSERT INTO dedup_dirty(item_id) SELECT new.id WHERE NOT EXISTS (SELECT 1 FROM dedup_dirty WHERE item_id = new.id);"
+    with engine.begin() as conn:
+        existing = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'dedup_dirty_ai'")
+        ).scalar()
+        if existing and mark in existing:
+            return
+        conn.execute(text("DROP TRIGGER IF EXISTS dedup_dirty_ai"))
+        conn.execute(text("DROP TRIGGER IF EXISTS dedup_dirty_au"))
+        conn.execute(text(f"""
+            CREATE TRIGGER dedup_dirty_ai AFTER INSERT ON collection_items BEGIN
+                {mark}
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER dedup_dirty_au AFTER UPDATE OF {cols} ON collection_items BEGIN
+                {mark}
+            END
+        """))
+        conn.execute(text("INSERT OR IGNORE INTO dedup_dirty(item_id) SELECT id FROM collection_items"))
+
+
+def normalize_title(title):
+    """全角转半角、转小写、去掉括号内的版本说明与所有标点空白"""
+    title = unicodedata.normalize("NFKC", title or "").lower()
+    title = BRACKETS_RE.sub("", title)
+    return "".join(ch for ch in title if ch.isalnum())
+
+
+def title_grams(*titles):
+    """标题的三字组集合 (不足 3 字的标题整体作为一个)"""
+    grams = set()
+    for title in titles:
+        norm = normalize_title(title)
+        if len(norm) < 3:
+            if norm:
+                grams.add(norm)
+        else:
+            grams.update(norm[i:i + 3] for i in range(len(norm) - 2))
+    return grams
+
+
+def normalize_isbn(isbn):
+    """去掉连字符等，ISBN-10 转为 ISBN-13；无法识别时返回 None"""
+    digits = re.sub(r"[^0-9X]", "", (isbn or "").upper())
+    if len(digits) == 10:
+        core = "978" + digits[:9]
+        check = (10 - sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(core)) % 10) % 10
+        return core + str(check)
+    return digits if len(digits) == 13 and digits.isdigit() else None
+
+
+def signature(media_type, title, original_title=None, isbn=None, imdb_id=None):
+    """一个条目的全部签名"""
+    keys = set()
+    isbn = normalize_isbn(isbn)
+    if isbn:
+        keys.add(f"isbn:{isbn}")
+    match = IMDB_RE.search((imdb_id or "").lower())
+    if match:
+        keys.add(f"imdb:{match.group()}")
+    type_name = getattr(media_type, "name", str(media_type or "").upper())
+    keys.update(f"t:{type_name}:{gram}" for gram in title_grams(title, original_title))
+    return keys
+
+
+def sync_keys(session):
+    """在当前事务中重算 dedup_dirty 中条目的签名 (由调用方提交)，返回处理的条目数"""
+    done = 0
+    while True:
+        ids = session.execute(select(dedup_dirty.c.item_id).limit(SYNC_CHUNK)).scalars().all()
+        if not ids:
+            return done
+        rows = session.execute(
+            select(CollectionItem.id, CollectionItem.media_type, CollectionItem.title,
+                   CollectionItem.original_title, CollectionItem.isbn, CollectionItem.imdb_id)
+            .where(CollectionItem.id.in_(ids))
+        ).all()
+        session.execute(delete(dedup_keys).where(dedup_keys.c.item_id.in_(ids)))
+        links = [
+            {"key": key[:120], "item_id": row.id}
+            for row in rows
+            for key in signature(row.media_type, row.title, row.original_title, row.isbn, row.imdb_id)
+        ]
+        if links:
+            session.execute(insert(dedup_keys).prefix_with("OR IGNORE"), links)
+        session.execute(delete(dedup_dirty).where(dedup_dirty.c.item_id.in_(ids)))
+        done += len(ids)
+
+
+def refresh_keys(db_url=DEFAULT_DB_URL):
+    """
+    有待重算的条目时，在单独的短写事务中同步签名 (经 run_write，被锁时重试)，返回处理的条目数。
+    没有时只读一次，不提交 (不会让库版本号变化)。
+    """
+    with get_session_factory(db_url)() as session:
+        if session.execute(select(dedup_dirty.c.item_id).limit(1)).first() is None:
+            return 0
+    return run_write(sync_keys, db_url)
+
+
+def _similar(shared, size_a, size_b):
+    """标题三字组的相似度 (0-1)，达不到阈值时返回 0"""
+    if not shared or not size_a or not size_b:
+        return 0.0
+    dice = 2 * shared / (size_a + size_b)
+    if dice >= DICE_THRESHOLD:
+        return dice
+    smaller = min(size_a, size_b)
+    if smaller >= MIN_CONTAINED_GRAMS and shared / smaller >= CONTAINMENT_THRESHOLD:
+        return shared / smaller * CONTAINMENT_THRESHOLD
+    return 0.0
+
+
+def _years_compatible(a, b):
+    return a is None or b is None or abs(a - b) <= 1
+
+
+def _gram_counts(session, item_ids):
+    """各条目的标题三字组个数"""
+    if not item_ids:
+        return {}
+    return dict(session.execute(
+        select(dedup_keys.c.item_id, func.count())
+        .where(dedup_keys.c.item_id.in_(list(item_ids)), dedup_keys.c.key.like("t:%"))
+        .group_by(dedup_keys.c.item_id)
+    ).all())
+
+
+def _items(session, item_ids):
+    rows = session.execute(
+        select(CollectionItem.id, CollectionItem.title, CollectionItem.year, CollectionItem.media_type,
+               CollectionItem.douban_id)
+        .where(CollectionItem.id.in_(list(item_ids)))
+    ).all()
+    return {row.id: row for row in rows}
+
+
+def _describe(row, score, reason):
+    return {
+        "id": row.id, "title": row.title, "year": row.year, "media_type": row.media_type.value,
+        "douban_id": row.douban_id, "score": round(score, 2), "reason": reason,
+    }
+
+
+def find_matches(session, record, exclude_id=None, limit=5):
+    """
+    查找与一条待入库记录 (字段同 CollectionItem 的列) 可能重复的已有条目，按相似度降序。
+    豆瓣 ID 相同的条目排在最前。只读；调用前先 refresh_keys，否则尚未同步签名的条目只能按豆瓣 ID 匹配。
+    """
+    found = {}
+    if record.get("douban_id"):
+        same = session.execute(
+            select(CollectionItem.id).where(CollectionItem.douban_id == record["douban_id"])
+        ).scalar()
+        if same is not None:
+            found[same] = (1.0, "豆瓣 ID 相同")
+
+    keys = signature(record.get("media_type"), record.get("title"), record.get("original_title"),
+                     record.get("isbn"), record.get("imdb_id"))
+    grams = [key for key in keys if key.startswith("t:")]
+    if keys:
+        shared_grams = func.sum(dedup_keys.c.key.like("t:%"), type_=Integer)
+        shared_ids = func.sum(dedup_keys.c.key.notlike("t:%"), type_=Integer)
+        # 达到任一判定阈值所需的最少共享三字组数，先在查询中过滤掉大部分候选
+        min_shared = min(len(grams) * DICE_THRESHOLD / 2, MIN_CONTAINED_GRAMS * CONTAINMENT_THRESHOLD)
+        candidates = session.execute(
+            select(dedup_keys.c.item_id, shared_grams.label("grams"), shared_ids.label("ids"))
+            .where(dedup_keys.c.key.in_(list(keys)))
+            .group_by(dedup_keys.c.item_id)
+            .having((shared_ids > 0) | (shared_grams >= min_shared))
+        ).all()
+        sizes = _gram_counts(session, [row.item_id for row in candidates if not row.ids])
+        for item_id, shared, ids in candidates:
+            if item_id in found:
+                continue
+            if ids:
+                found[item_id] = (1.0, "书号 / IMDb ID 相同")
+            else:
+                score = _similar(shared, len(grams), sizes.get(item_id, 0))
+                if score:
+                    found[item_id] = (score, "标题相似")
+
+    found.pop(exclude_id, None)
+    items = _items(session, found)
+    year = record.get("year")
+    matches = [
+        _describe(items[item_id], score, reason)
+        for item_id, (score, reason) in found.items()
+        if item_id in items and (reason != "标题相似" or _years_compatible(year, items[item_id].year))
+    ]
+    matches.sort(key=lambda m: (m["reason"] != "豆瓣 ID 相同", -m["score"], m["id"]))
+    return matches[:limit]
+
+
+def find_duplicate_groups(session, max_block=MAX_BLOCK):
+    """
+    全库查重：返回疑似重复的条目分组，每组为 {"items": [...], "score", "reason"}，
+    组内条目两两之间经由若干对判定为重复的关系相连，按相似度降序。只读；调用前先 refresh_keys。
+    """
+    pairs = session.execute(text("""
+        SELECT a.item_id AS a, b.item_id AS b,
+               SUM(a.key LIKE 't:%') AS grams, SUM(a.key NOT LIKE 't:%') AS ids
+        FROM dedup_keys a
+        JOIN dedup_keys b ON b.key = a.key AND b.item_id > a.item_id
+        WHERE a.key IN (SELECT key FROM dedup_keys GROUP BY key HAVING COUNT(*) BETWEEN 2 AND :max_block)
+        GROUP BY a.item_id, b.item_id
+    """), {"max_block": max_block}).all()
+
+    sizes = dict(session.execute(
+        select(dedup_keys.c.item_id, func.count()).where(dedup_keys.c.key.like("t:%")).group_by(dedup_keys.c.item_id)
+    ).all())
+    scored = []
+    for a, b, grams, ids in pairs:
+        if ids:
+            scored.append((a, b, 1.0, "书号 / IMDb ID 相同"))
+        else:
+            score = _similar(grams, sizes.get(a, 0), sizes.get(b, 0))
+            if score:
+                scored.append((a, b, score, "标题相似"))
+    items = _items(session, {item_id for a, b, _, _ in scored for item_id in (a, b)})
+
+    # 并查集把两两判定的结果合并成组
+    parent = {}
+
+    def root(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    best = {}
+    for a, b, score, reason in scored:
+        if a not in items or b not in items:
+            continue
+        if reason == "标题相似" and not _years_compatible(items[a].year, items[b].year):
+            continue
+        parent[root(a)] = root(b)
+        best[(a, b)] = (score, reason)
+
+    groups = {}
+    for (a, b), (score, reason) in best.items():
+        group = groups.setdefault(root(a), {"ids": set(), "score": 0.0, "reason": reason})
+        group["ids"].update((a, b))
+        if score > group["score"]:
+            group["score"], group["reason"] = score, reason
+    report = [
+        {
+            "items": [_describe(items[item_id], group["score"], group["reason"]) for item_id in sorted(group["ids"])],
+            "score": round(group["score"], 2),
+            "reason": group["reason"],
+        }
+        for group in groups.values()
+    ]
+    report.sort(key=lambda g: (-g["score"], g["items"][0]["id"]))
+    return report
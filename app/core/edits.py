@@ -0,0 +1,88 @@
+"""
+界面编辑的并发控制 (乐观锁)。
+
+开始编辑时记下可编辑字段的原值与 version_id (snapshot)，表单控件以这份原值为初值，
+之后的重跑不会因为他人写入而把用户正在改的内容换掉。保存时：
+- 只写用户改动过的字段
+- 在一个短写事务中重新读取条目：version_id 未变时直接写入；已被他人修改时，
+  他人也改过 (且改成了不同的值) 的字段视为冲突，抛出 EditConflict，其余改动照常合并写入
+- ORM 以读取时的 version_id 为更新条件，读取与写入之间被抢先修改会得到 StaleDataError，
+  由 run_write 整体重做 (重做时按上面的规则重新判断)
+"""
+from datetime import datetime
+
+from app.core.db import DEFAULT_DB_URL, run_write
+from app.core.models import CollectionItem
+
+EDIT_FIELDS = ("my_status", "my_rating", "my_tags", "my_comment", "isbn", "imdb_id", "douban_id", "local_cover_path")
+
+
+class EditConflict(Exception):
+    """要保存的字段已被他人修改 (fields 为 {字段: 当前值})，或条目已被删除 (deleted)"""
+
+    def __init__(self, fields=None, deleted=False):
+        self.fields = fields or {}
+        self.deleted = deleted
+        super().__init__("条目已被删除" if deleted else f"字段已被他人修改: {', '.join(self.fields)}")
+
+
+def snapshot(item):
+    """开始编辑时的原值：{"id", "version_id", "fields": {字段: 值}}"""
+    return {
+        "id": item.id,
+        "version_id": item.version_id,
+        "fields": {field: getattr(item, field) for field in EDIT_FIELDS},
+    }
+
+
+def _same(a, b):
+    """None、空字符串与 0 评分视为相同 (表单控件无法表示 None)"""
+    return (a or None) == (b or None)
+
+
+def changed_fields(base, values):
+    """values 中与原值不同的可编辑字段"""
+    return {
+        field: value for field, value in values.items()
+        if field in EDIT_FIELDS and not _same(value, base["fields"][field])
+    }
+
+
+def save_edit(base, values, force=False, db_url=DEFAULT_DB_URL):
+    """
+    保存一次编辑，返回实际写入的字段名。
+    base 为 snapshot 的结果，values 为表单中的值；force=True 时冲突字段也以本次为准。
+    """
+    changes = changed_fields(base, values)
+
+    def write(session):
+        item = session.get(CollectionItem, base["id"])
+        if item is None:
+            raise EditConflict(deleted=True)
+        if item.version_id != base["version_id"] and not force:
+            conflicts = {
+                field: getattr(item, field) for field, value in changes.items()
+                if not _same(getattr(item, field), base["fields"][field]) and not _same(getattr(item, field), value)
+            }
+            if conflicts:
+                raise EditConflict(conflicts)
+        if not changes:
+            return []
+        for field, value in changes.items():
+            setattr(item, field, value)
+        item.updated_at = datetime.now()
+        return list(changes)
+
+    return run_write(write, db_url)
+
+
+def delete_item(item_id, db_url=DEFAULT_DB_URL):
+    """删除条目，条目已不存在时返回 False"""
+    def write(session):
+        item = session.get(CollectionItem, item_id)
+        if item is None:
+            return False
+        session.delete(item)
+        return True
+
+    return run_write(write, db_url)
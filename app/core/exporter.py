@@ -0,0 +1,160 @@
+"""
+分块流式导出 collection_items (CSV / TSV / JSONL / Parquet)。
+
+- 按 id 顺序每次读取 CHUNK_SIZE 行写出，内存占用与库的大小无关
+- Parquet 需要 pyarrow (可选依赖)，每块写成一个 row group
+- 增量导出：在 <输出文件>.state.json 中记录已导出的最大 updated_at，
+  下次只导出此后变化的行 (CSV/TSV/JSONL 追加到原文件，Parquet 另写一个带时间戳的分片)；
+  起点向前多取 INCREMENTAL_OVERLAP 秒，窗口内已按相同 updated_at 导出过的行 (记录在状态文件中) 会跳过。
+  消费方按 id 去重、后出现的为准。删除的条目不会出现在增量中。
+"""
+import csv
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.core.models import CollectionItem
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # 未安装时不支持 Parquet
+    pyarrow = None
+
+CHUNK_SIZE = 1000
+EXPORT_FORMATS = ("csv", "tsv", "jsonl", "parquet")
+# 增量导出向前多取的时间窗口 (秒)：导出期间才提交、但时间戳更早的写入也不会漏掉
+INCREMENTAL_OVERLAP = 60
+RECENT_PRUNE_AT = 10000  # 记录的重叠窗口条目超过这么多时先按当前的最大 updated_at 清理一次
+
+
+def _plain(value):
+    """枚举取显示值，时间转为 ISO 字符串"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if hasattr(value, "value") and hasattr(value, "name"):
+        return value.value
+    return value
+
+
+def iter_chunks(engine, since=None, chunk_size=CHUNK_SIZE):
+    """按 id 顺序分块产出行 (字典列表)；since 不为空时只取 updated_at 晚于它的行"""
+    table = CollectionItem.__table__
+    query = select(table).order_by(table.c.id)
+    if since is not None:
+        query = query.where(table.c.updated_at > since)
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(query)
+        for chunk in result.partitions():
+            yield [{key: _plain(value) for key, value in row._mapping.items()} for row in chunk]
+
+
+def _write_text(chunks, path, fmt, fields, append):
+    """CSV / TSV / JSONL 写出，返回行数"""
+    count = 0
+    write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+    with open(path, "a" if append else "w", encoding="utf-8", newline="") as f:
+        if fmt == "jsonl":
+            for chunk in chunks:
+                for row in chunk:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += len(chunk)
+        else:
+            writer = csv.DictWriter(f, fieldnames=fields, delimiter="\t" if fmt == "tsv" else ",")
+            if write_header:
+                writer.writeheader()
+            for chunk in chunks:
+                writer.writerows(chunk)
+                count += len(chunk)
+    return count
+
+
+def _arrow_schema():
+    """由模型列类型推出 Parquet 列类型 (枚举、时间等存为字符串)"""
+    types = {"Integer": pyarrow.int64(), "Float": pyarrow.float64()}
+    return pyarrow.schema([
+        (col.name, types.get(type(col.type).__name__, pyarrow.string()))
+        for col in CollectionItem.__table__.columns
+    ])
+
+
+def _write_parquet(chunks, path):
+    if pyarrow is None:
+        raise RuntimeError("导出 Parquet 需要安装 pyarrow (pip install pyarrow)")
+    schema = _arrow_schema()
+    count = 0
+    tmp_path = path + ".tmp"
+    with pyarrow.parquet.ParquetWriter(tmp_path, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pyarrow.Table.from_pylist(chunk, schema=schema))
+            count += len(chunk)
+    os.replace(tmp_path, path)
+    return count
+
+
+def _load_state(state_path):
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_items(engine, path, fmt=None, incremental=False, chunk_size=CHUNK_SIZE):
+    """
+    导出到 path，fmt 默认取自扩展名。
+    返回 {"path": 实际写入的文件, "rows": 行数, "since": 增量起点或 None}。
+    """
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    fields = [col.name for col in CollectionItem.__table__.columns]
+
+    state_path = path + ".state.json"
+    state = _load_state(state_path) if incremental else {}
+    since = None
+    if state.get("max_updated_at"):
+        since = datetime.fromisoformat(state["max_updated_at"]) - timedelta(seconds=INCREMENTAL_OVERLAP)
+
+    # 记录本次导出见到的最大 updated_at，作为下次增量的起点；
+    # 另记下重叠窗口内已导出的 {id: updated_at}，下次窗口内未再变化的行不重复追加
+    max_seen = [state.get("max_updated_at")]
+    previous = state.get("recent", {}) if since is not None else {}
+    recent = dict(previous)
+
+    def prune():
+        if max_seen[0]:
+            cutoff = (datetime.fromisoformat(max_seen[0]) - timedelta(seconds=INCREMENTAL_OVERLAP)).isoformat(sep=" ")
+            for key in [key for key, updated in recent.items() if updated < cutoff]:
+                del recent[key]
+
+    def tracked(chunks):
+        for chunk in chunks:
+            fresh = [row for row in chunk if previous.get(str(row["id"])) != row["updated_at"]]
+            for row in fresh:
+                if row["updated_at"]:
+                    recent[str(row["id"])] = row["updated_at"]
+                    if max_seen[0] is None or row["updated_at"] > max_seen[0]:
+                        max_seen[0] = row["updated_at"]
+            if len(recent) > RECENT_PRUNE_AT:
+                prune()
+            if fresh:
+                yield fresh
+
+    chunks = tracked(iter_chunks(engine, since=since, chunk_size=chunk_size))
+    target = path
+    if fmt == "parquet":
+        if since is not None:
+            stem, ext = os.path.splitext(path)
+            target = f"{stem}.{datetime.now():%Y%m%d%H%M%S}{ext}"
+        rows = _write_parquet(chunks, target)
+    else:
+        rows = _write_text(chunks, path, fmt, fields, append=since is not None)
+
+    if incremental:
+        prune()
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump({"max_updated_at": max_seen[0], "recent": recent, "exported_at": datetime.now().isoformat(sep=" ")}, f)
+    return {"path": target, "rows": rows, "since": since}
@@ -1,17 +1,29 @@
-import requests
 from bs4 import BeautifulSoup
 import re
 import json
+from app.core.transport import DEFAULT_HEADERS, get_client
+from app.core.http_cache import get_response_cache
+from app.core.parser import parse_detail
+from app.core.metrics import timed
 
 class DoubanFetcher:
     """负责从豆瓣抓取资讯的类"""
     
-    def __init__(self):
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Referer': 'https://www.douban.com/'
-        }
+    def __init__(self, client=None, cache=None):
+        # 默认复用进程内共享的连接池，测试时可传入指向本地桩服务器的客户端
+        self.client = client or get_client()
+        # 默认使用 data/http_cache.db 响应缓存，传入 cache=False 关闭
+        self.cache = get_response_cache() if cache is None else cache
+        self.headers = dict(DEFAULT_HEADERS)
 
+    @timed("http_get")
+    def _get_html(self, url, kind, max_age=None):
+        """获取页面 HTML，优先走响应缓存"""
+        if self.cache:
+            return self.cache.fetch(self.client, url, kind, headers=self.headers, max_age=max_age)
+        return self.client.get(url, headers=self.headers).text
+
+    @timed("douban_search")
     def search(self, query, category="movie"):
         """搜索条目并返回候选列表"""
         # 注意：真实生产环境建议使用已有的 API 封装，这里展示基础爬取逻辑
@@ -22,8 +34,8 @@ class DoubanFetcher:
             search_url = f"https://www.douban.com/search?cat=1003&q={query}"
             
         try:
-            response = requests.get(search_url, headers=self.headers, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
+            html = self._get_html(search_url, "search")
+            soup = BeautifulSoup(html, 'html.parser')
             results = []
             
             # 解析搜索结果 (简化版)
@@ -41,79 +53,35 @@ class DoubanFetcher:
             print(f"搜索失败: {e}")
             return []
 
-    def fetch_detail(self, url):
-        """抓取详情页详细信息"""
+    @timed("fetch_detail")
+    def fetch_detail(self, url, max_age=None):
+        """抓取详情页详细信息 (max_age 可覆盖缓存有效期，0 表示强制重新验证)"""
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            data = {}
-            # 通用标题
-            data['title'] = soup.select_one('h1 span[property="v:itemreviewed"]').get_text(strip=True) if soup.select_one('h1 span[property="v:itemreviewed"]') else ""
-            
-            # 封面图
-            cover_tag = soup.select_one('#mainpic img')
-            data['cover_url'] = cover_tag['src'] if cover_tag else ""
-
-            # 评分
-            rating_tag = soup.select_one('.ll.rating_num')
-            data['rating_douban'] = float(rating_tag.get_text()) if rating_tag and rating_tag.get_text() else None
-
-            info_text = soup.select_one('#info').get_text() if soup.select_one('#info') else ""
-            
-            # 根据 URL 判断类型
-            if "movie.douban.com" in url:
-                data['media_type'] = "movie"
-                data['director'] = soup.select_one('span:contains("导演") .attrs').get_text(strip=True) if soup.select_one('span:contains("导演") .attrs') else ""
-                
-                # 主演 (取前3个)
-                casts = [a.get_text() for a in soup.select('span.actor .attrs a')[:5]]
-                data['cast'] = " / ".join(casts)
-                
-                # 年份
-                year_tag = soup.select_one('.year')
-                if year_tag:
-                    year_match = re.search(r'(\d{4})', year_tag.get_text())
-                    data['year'] = year_match.group(1) if year_match else None
-                
-                # 剧情简介
-                summary_tag = soup.select_one('span[property="v:summary"]')
-                data['summary'] = summary_tag.get_text(strip=True) if summary_tag else ""
-
-                # IMDb 链接提取
-                imdb_match = re.search(r'IMDb:.*?(\w+)', info_text)
-                data['imdb_id'] = imdb_match.group(1) if imdb_match else None
-
-                # 制片国家
-                country_match = re.search(r'制片国家/地区: (.*)', info_text)
-                data['country'] = country_match.group(1).split('\n')[0].strip() if country_match else ""
-                
-                # 类型
-                genres = [span.get_text() for span in soup.select('span[property="v:genre"]')]
-                data['genres'] = " / ".join(genres)
-            
-            elif "book.douban.com" in url:
-                data['media_type'] = "book"
-                author_tag = soup.select_one('span:contains("作者")')
-                data['author'] = author_tag.find_next_sibling('a').get_text(strip=True) if author_tag and author_tag.find_next_sibling('a') else ""
-                
-                # ISBN
-                isbn_match = re.search(r'ISBN: (\d+)', info_text)
-                data['isbn'] = isbn_match.group(1) if isbn_match else ""
-                
-                # 出版社
-                pub_match = re.search(r'出版社: (.*)', info_text)
-                data['publisher'] = pub_match.group(1).strip() if pub_match else ""
-
-                # 简介
-                summary_node = soup.select_one('.intro p')
-                data['summary'] = summary_node.get_text(strip=True) if summary_node else ""
-                
-            return data
+            html = self._get_html(url, "detail", max_age=max_age)
+            return self.parse_detail(html, url)
         except Exception as e:
             print(f"抓取详情失败: {e}")
             return None
 
+    @timed("parse_detail")
+    def parse_detail(self, html, url):
+        """解析详情页 HTML，url 用于判断条目类型 (见 app.core.parser)"""
+        return parse_detail(html, url)
+
+    def fetch_details_many(self, urls, max_workers=4, max_age=None):
+        """并发抓取多个详情页，按输入顺序返回结果 (失败项为 None)"""
+        return self.client.map(lambda url: self.fetch_detail(url, max_age=max_age), urls, max_workers=max_workers)
+
+    def reparse_cached(self):
+        """用缓存中的原始 HTML 离线重新解析所有详情页，逐条产出 (url, data)"""
+        if not self.cache:
+            return
+        for url, html in self.cache.iter_raw("detail"):
+            try:
+                yield url, self.parse_detail(html, url)
+            except Exception as e:
+                print(f"解析缓存页面失败 {url}: {e}")
+
     def search_imdb(self, query):
         """IMDb 搜索占位 (建议使用专门的库如 imdbpy 或公开 API)"""
         # 这里仅为逻辑展示，实际可通过类似 https://www.imdb.com/find?q=... 爬取
@@ -0,0 +1,223 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+CACHE_PATH = "data/http_cache.db"
+# 各类页面的缓存有效期 (秒)：搜索结果变化快，详情页变化慢
+DEFAULT_TTLS = {
+    "search": 60 * 60,
+    "detail": 7 * 24 * 60 * 60,
+}
+CACHE_LIMIT = 200 * 1024 * 1024  # 压缩后正文总量上限 200MB
+# 命中时的访问时间先记在内存里，攒够条数或间隔到了再一起写回，避免每次命中都提交一次
+TOUCH_BATCH = 100
+TOUCH_INTERVAL = 30  # 秒
+
+
+def normalize_url(url):
+    """缓存键：小写协议与主机、排序查询参数、去掉片段"""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+class ResponseCache:
+    """
+    SQLite 持久化的 HTTP 响应缓存。
+    - 按规范化 URL 存储压缩后的原始 HTML，解析器改进后可离线重新解析
+    - 每类页面独立 TTL，过期后带 ETag / Last-Modified 做条件请求
+    - 超出容量上限时按最近访问时间淘汰；总量在写入事务中用 SUM(size) 现算，
+      多个进程共用同一缓存文件时也不会偏差
+    """
+
+    def __init__(self, path=CACHE_PATH, ttls=None, max_bytes=CACHE_LIMIT):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._touched = {}  # 尚未写回的访问时间 {key: accessed_at}
+        self._touched_at = time.time()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # isolation_level=None：事务由 put 显式 BEGIN IMMEDIATE，读取不开启事务
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        # 覆盖索引：SUM(size) 与淘汰时的扫描都不用读正文所在的页
+        self._conn.execute("DROP INDEX IF EXISTS ix_responses_accessed")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_responses_accessed_size ON responses (accessed_at, size, key)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_kind ON responses (kind)")
+
+    def get(self, url):
+        """读取缓存条目 (不检查是否过期)，未命中返回 None"""
+        key = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, kind, status, etag, last_modified, body, fetched_at FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_BATCH or time.time() - self._touched_at >= TOUCH_INTERVAL:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._flush_touched()
+                self._conn.execute("COMMIT")
+        return {
+            "url": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "etag": row[3],
+            "last_modified": row[4],
+            "text": zlib.decompress(row[5]).decode("utf-8"),
+            "fetched_at": row[6],
+        }
+
+    def put(self, url, kind, text, status=200, etag=None, last_modified=None):
+        key = normalize_url(url)
+        body = zlib.compress(text.encode("utf-8"), 6)
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE：先拿到写锁，其他进程的写入不会插在统计总量与淘汰之间
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._touched.pop(key, None)
+                self._flush_touched()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, url, kind, status, etag, last_modified, body, len(body), now, now)
+                )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _revalidated(self, url):
+        """304 后刷新抓取时间"""
+        key = normalize_url(url)
+        with self._lock:
+            self._touched.pop(key, None)
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                (time.time(), time.time(), key)
+            )
+
+    def flush(self):
+        """把内存中的访问时间写回缓存文件"""
+        with self._lock:
+            if self._touched:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._flush_touched()
+                self._conn.execute("COMMIT")
+
+    def _flush_touched(self):
+        """写回攒下的访问时间 (调用方持有锁并已开启事务)"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE responses SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()]
+            )
+            self._touched = {}
+        self._touched_at = time.time()
+
+    def _evict(self):
+        """淘汰最久未访问的条目直到降到上限的 90% (调用方持有锁并已开启写事务)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def fetch(self, client, url, kind, headers=None, max_age=None):
+        """
+        带缓存地获取页面文本。
+        未过期直接返回缓存；过期则发条件请求，304 时沿用缓存；
+        网络失败时若有旧缓存也会返回旧内容。
+        max_age 可覆盖该类页面的 TTL (0 表示强制重新验证)。
+        """
+        ttl = self.ttls.get(kind, 0) if max_age is None else max_age
+        entry = self.get(url)
+        if entry and time.time() - entry["fetched_at"] < ttl:
+            return entry["text"]
+
+        request_headers = dict(headers or {})
+        if entry:
+            if entry["etag"]:
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = client.get(url, headers=request_headers)
+        except Exception:
+            if entry:
+                return entry["text"]
+            raise
+
+        if response.status_code == 304 and entry:
+            self._revalidated(url)
+            return entry["text"]
+        if response.status_code == 200:
+            self.put(
+                url, kind, response.text,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified")
+            )
+        elif entry:
+            return entry["text"]
+        return response.text
+
+    def iter_raw(self, kind="detail"):
+        """遍历某类已缓存页面的 (url, html)，用于离线重新解析"""
+        with self._lock:
+            rows = self._conn.execute("SELECT url, body FROM responses WHERE kind = ?", (kind,)).fetchall()
+        for url, body in rows:
+            yield url, zlib.decompress(body).decode("utf-8")
+
+    def clear(self):
+        with self._lock:
+            self._touched = {}
+            self._conn.execute("DELETE FROM responses")
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache():
+    """进程内共享的响应缓存"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+            atexit.register(_default_cache.flush)
+        return _default_cache
@@ -0,0 +1,218 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+from app.core.models import CollectionItem, MediaType, CollectionStatus
+from app.core.refresh import fingerprint
+
+CHECKPOINT_DIR = "data/import_checkpoints"
+
+# 豆瓣导出文件中常见的列名
+URL_KEYS = ("链接", "豆瓣链接", "url", "URL", "link", "subject_url")
+STATUS_KEYS = ("我的状态", "状态", "status")
+RATING_KEYS = ("个人评分", "我的评分", "rating", "my_rating")
+TAGS_KEYS = ("我的标签", "标签", "tags", "my_tags")
+COMMENT_KEYS = ("我的短评", "短评", "comment", "my_comment")
+
+# 中文状态词互不包含，可在“2020-01-01 看过”这样的文本中按子串查找；
+# 英文状态 (豆瓣 API 的 wish/do/collect 与命令行的 wish/doing/done) 只按整个值匹配，
+# 否则 "done" 会因包含 "do" 被当成在看
+STATUS_WORDS = {
+    CollectionStatus.WISH: ("想看", "想听", "想读"),
+    CollectionStatus.DOING: ("在看", "在听", "在读"),
+    CollectionStatus.DONE: ("看过", "听过", "读过"),
+}
+STATUS_TOKENS = {
+    "wish": CollectionStatus.WISH,
+    "do": CollectionStatus.DOING,
+    "doing": CollectionStatus.DOING,
+    "collect": CollectionStatus.DONE,
+    "done": CollectionStatus.DONE,
+}
+SUBJECT_RE = re.compile(r"(movie|book|music)\.douban\.com/subject/(\d+)")
+
+
+def _pick(record, keys):
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ""):
+            return str(value).strip()
+    return None
+
+
+def _parse_status(text):
+    if not text:
+        return None
+    text = text.strip().lower()
+    if text in STATUS_TOKENS:
+        return STATUS_TOKENS[text]
+    for status, words in STATUS_WORDS.items():
+        if any(word in text for word in words):
+            return status
+    return None
+
+
+def _parse_rating(text):
+    match = re.search(r"\d+(\.\d+)?", text or "")
+    return min(float(match.group()), 5.0) if match else None
+
+
+def normalize_record(record):
+    """把导出文件中的一行 (字符串或字典) 规范化为导入记录，无法识别时返回 None"""
+    if isinstance(record, str):
+        record = {"url": record}
+    url = _pick(record, URL_KEYS)
+    match = SUBJECT_RE.search(url or "")
+    if not match:
+        return None
+    site, sid = match.groups()
+    return {
+        "url": f"https://{site}.douban.com/subject/{sid}/",
+        "site": site,
+        "sid": sid,
+        "my_status": _parse_status(_pick(record, STATUS_KEYS)),
+        "my_rating": _parse_rating(_pick(record, RATING_KEYS)),
+        "my_tags": _pick(record, TAGS_KEYS),
+        "my_comment": _pick(record, COMMENT_KEYS),
+    }
+
+
+def read_records(path):
+    """读取豆瓣导出 CSV / JSON 或纯 URL 列表，按出现顺序去重"""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8-sig") as f:
+        if ext == ".csv":
+            raw = list(csv.DictReader(f))
+        elif ext == ".json":
+            raw = json.load(f)
+            if isinstance(raw, dict):
+                raw = raw.get("items") or raw.get("interests") or []
+        else:
+            raw = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    records, seen = [], set()
+    for entry in raw:
+        record = normalize_record(entry)
+        if record and record["url"] not in seen:
+            seen.add(record["url"])
+            records.append(record)
+    return records
+
+
+def item_fields(record, detail, local_cover_path=None):
+    """由导入记录与详情页数据得到条目各列的值"""
+    year = detail.get("year")
+    return dict(
+        title=detail["title"],
+        media_type=MediaType(detail.get("media_type") or record["site"]),
+        cover_url=detail.get("cover_url"),
+        local_cover_path=local_cover_path,
+        douban_id=record["sid"],
+        douban_url=record["url"],
+        isbn=detail.get("isbn") or None,
+        imdb_id=detail.get("imdb_id"),
+        my_status=record["my_status"] or CollectionStatus.WISH,
+        my_rating=record["my_rating"],
+        my_tags=record["my_tags"],
+        my_comment=record["my_comment"],
+        year=int(year) if str(year or "").isdigit() else None,
+        summary=detail.get("summary"),
+        rating_douban=detail.get("rating_douban"),
+        director=detail.get("director"),
+        cast=detail.get("cast"),
+        country=detail.get("country"),
+        genres=detail.get("genres"),
+        author=detail.get("author"),
+        publisher=detail.get("publisher"),
+        fetched_at=datetime.now(),
+        content_hash=fingerprint(detail),
+    )
+
+
+def build_item(record, detail, local_cover_path=None):
+    """由导入记录与详情页数据构造 CollectionItem"""
+    return CollectionItem(**item_fields(record, detail, local_cover_path))
+
+
+class ImportCheckpoint:
+    """追加写入的断点文件：每成功提交一批就记录对应 URL，崩溃或被封后可续传"""
+
+    def __init__(self, source_path, checkpoint_dir=CHECKPOINT_DIR):
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        digest = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:12]
+        self.path = os.path.join(checkpoint_dir, f"{digest}.jsonl")
+        self.done = set()
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["url"])
+                    except (ValueError, KeyError):
+                        continue  # 崩溃时写了一半的行
+
+    def mark(self, urls):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for url in urls:
+                f.write(json.dumps({"url": url}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(urls)
+
+
+def run_import(session, path, fetcher=None, workers=4, batch_size=50, progress=print):
+    """
+    批量导入：分批并发抓取详情与封面，每批一个事务写库并记录断点。
+    整批抓取全部失败时视为被限流，提前停止以便稍后续传。
+    返回统计信息字典。
+    """
+    from app.core.fetcher import DoubanFetcher
+    from app.core.upsert import bulk_upsert
+    from app.utils.downloader import download_covers
+
+    fetcher = fetcher or DoubanFetcher()
+    checkpoint = ImportCheckpoint(path)
+    records = read_records(path)
+
+    existing = {row[0] for row in session.query(CollectionItem.douban_id).filter(CollectionItem.douban_id.isnot(None))}
+    todo = [r for r in records if r["url"] not in checkpoint.done and r["sid"] not in existing]
+    stats = {
+        "total": len(records),
+        "skipped": len(records) - len(todo),
+        "imported": 0,
+        "failed": 0,
+        "stopped": False,
+    }
+    progress(f"共 {stats['total']} 条，已存在/已完成 {stats['skipped']} 条，待导入 {len(todo)} 条")
+
+    started = time.time()
+    for offset in range(0, len(todo), batch_size):
+        batch = todo[offset:offset + batch_size]
+        details = fetcher.fetch_details_many([r["url"] for r in batch], max_workers=workers)
+        # 没解析出标题的页面 (404、验证码页等) 视为失败
+        details = [d if d and d.get("title") else None for d in details]
+        if not any(details):
+            stats["stopped"] = True
+            progress("⚠️ 整批抓取失败，可能已被限流，已停止。稍后重新运行即可从断点继续。")
+            break
+
+        ok = [(r, d) for r, d in zip(batch, details) if d]
+        covers = download_covers(
+            [(d.get("cover_url"), d.get("isbn") or d.get("imdb_id") or r["sid"]) for r, d in ok],
+            max_workers=workers
+        )
+        outcomes = bulk_upsert(session, [item_fields(r, d, cover) for (r, d), cover in zip(ok, covers)])
+        written = [r["url"] for (r, _), (status, _) in zip(ok, outcomes) if status != "failed"]
+        checkpoint.mark(written)
+
+        stats["imported"] += len(written)
+        stats["failed"] += len(batch) - len(written)
+        elapsed = time.time() - started
+        progress(f"进度 {offset + len(batch)}/{len(todo)} | 成功 {stats['imported']} | 失败 {stats['failed']} | {stats['imported'] / elapsed:.1f} 条/秒")
+
+    stats["elapsed"] = time.time() - started
+    stats["rate"] = stats["imported"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+    return stats
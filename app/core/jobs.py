@@ -0,0 +1,242 @@
+"""
+后台任务队列：详情补全与封面下载。
+
+任务持久化在 jobs 表中，进程重启后继续执行：
+- enqueue 与条目写入在同一事务中，入库无需等待网络
+- JobWorker 在后台线程中轮询，用有界线程池执行；失败按指数退避重试，
+  超过 MAX_ATTEMPTS 次记为 failed，可在界面或命令行中重试
+- run_pending 供命令行无界面地清空队列
+执行成功的任务直接删除，表中只保留待处理、执行中与失败的任务。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+
+from app.core.models import CollectionItem, Job
+from app.core.refresh import fingerprint
+
+JOB_ENRICH = "enrich"
+JOB_COVER = "cover"
+MAX_ATTEMPTS = 5
+RETRY_BASE = 30      # 秒，第 n 次失败后等待 RETRY_BASE * 2^(n-1)
+STALE_AFTER = 600    # 秒，执行中超过该时间视为所在进程已退出，重新排队
+# 详情补全时写入的字段 (只填空值，不覆盖用户已修改的内容)
+ENRICH_FIELDS = (
+    "cover_url", "isbn", "imdb_id", "summary", "rating_douban", "director",
+    "cast", "country", "genres", "author", "publisher",
+)
+
+
+def enqueue(session, kind, item_id):
+    """在当前事务中加入任务，由调用方提交；同一条目的同类任务未结束时不重复加入"""
+    pending = session.query(Job.id).filter(
+        Job.kind == kind, Job.item_id == item_id, Job.status != "failed"
+    ).first()
+    if pending:
+        return None
+    job = Job(kind=kind, item_id=item_id)
+    session.add(job)
+    return job
+
+
+def _enrich(session, item, fetcher):
+    """抓取详情页补全条目，需要时再排队下载封面"""
+    if not item.douban_url:
+        raise ValueError("条目没有豆瓣链接")
+    detail = fetcher.fetch_detail(item.douban_url)
+    if not detail or not detail.get("title"):
+        raise RuntimeError("抓取详情失败")
+    for field in ENRICH_FIELDS:
+        if detail.get(field) and not getattr(item, field):
+            setattr(item, field, detail[field])
+    if not item.year and str(detail.get("year") or "").isdigit():
+        item.year = int(detail["year"])
+    item.fetched_at = datetime.now()
+    item.content_hash = fingerprint(detail)
+    if item.cover_url and not item.local_cover_path:
+        enqueue(session, JOB_COVER, item.id)
+
+
+def _cover(session, item, fetcher):
+    """下载封面并记录本地路径"""
+    from app.utils.downloader import download_cover
+    from app.utils.cover_index import get_cover_index
+
+    identifiers = [i for i in (item.isbn, item.imdb_id, item.douban_id) if i]
+    path = download_cover(item.cover_url, identifier=identifiers[0] if identifiers else None, aliases=identifiers[1:])
+    if not path:
+        raise RuntimeError("下载封面失败")
+    get_cover_index().add(path)
+    item.local_cover_path = path
+
+
+HANDLERS = {JOB_ENRICH: _enrich, JOB_COVER: _cover}
+
+
+def recover_stale(session_factory):
+    """把长时间停留在 running 的任务 (进程中途退出) 放回队列"""
+    cutoff = datetime.now() - timedelta(seconds=STALE_AFTER)
+    with session_factory() as session:
+        result = session.execute(
+            update(Job).where(Job.status == "running", Job.updated_at < cutoff).values(status="pending")
+        )
+        if result.rowcount:
+            session.commit()
+        return result.rowcount
+
+
+def claim(session_factory, limit, ignore_delay=False):
+    """领取至多 limit 个可执行的任务并标记为 running，返回任务 id 列表"""
+    now = datetime.now()
+    with session_factory() as session:
+        query = session.query(Job.id).filter(Job.status == "pending")
+        if not ignore_delay:
+            query = query.filter(Job.run_after <= now)
+        candidates = [job_id for job_id, in query.order_by(Job.run_after, Job.id).limit(limit)]
+        if not candidates:
+            # 空轮询不提交，避免无谓地改变库版本号
+            return []
+        claimed = []
+        for job_id in candidates:
+            # 条件更新：多个进程同时领取同一任务时只有一个成功
+            result = session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "pending")
+                .values(status="running", attempts=Job.attempts + 1, updated_at=now)
+            )
+            if result.rowcount:
+                claimed.append(job_id)
+        session.commit()
+        return claimed
+
+
+def run_job(session_factory, job_id, fetcher):
+    """执行一个已领取的任务，成功返回 True；失败时安排重试或记为 failed 并返回 False"""
+    with session_factory() as session:
+        job = session.get(Job, job_id)
+        if job is None:
+            return True
+        kind, item_id = job.kind, job.item_id
+        try:
+            item = session.get(CollectionItem, item_id)
+            if item is not None:  # 条目已被删除时任务直接完成
+                HANDLERS[kind](session, item, fetcher)
+            session.delete(job)
+            session.commit()
+            return True
+        except Exception as e:
+            session.rollback()
+            job = session.get(Job, job_id)
+            if job is None:
+                return False
+            job.last_error = str(e)[:500]
+            if job.attempts >= MAX_ATTEMPTS:
+                job.status = "failed"
+            else:
+                job.status = "pending"
+                job.run_after = datetime.now() + timedelta(seconds=RETRY_BASE * 2 ** (job.attempts - 1))
+            session.commit()
+            print(f"后台任务失败 ({kind} #{item_id}，第 {job.attempts} 次): {e}")
+            return False
+
+
+def run_pending(session_factory, max_workers=4, fetcher=None, ignore_delay=False, progress=print):
+    """
+    在当前进程中执行队列里的任务直到没有可执行的任务 (命令行使用)。
+    ignore_delay=True 时不等待重试间隔，失败任务会立即重试直到次数用尽。
+    返回 {"done": 成功数, "failed": 失败次数}。
+    """
+    if fetcher is None:
+        from app.core.fetcher import DoubanFetcher
+        fetcher = DoubanFetcher()
+    recover_stale(session_factory)
+    stats = {"done": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            job_ids = claim(session_factory, max_workers * 2, ignore_delay=ignore_delay)
+            if not job_ids:
+                break
+            for ok in pool.map(lambda job_id: run_job(session_factory, job_id, fetcher), job_ids):
+                stats["done" if ok else "failed"] += 1
+            progress(f"进度 | 成功 {stats['done']} | 失败 {stats['failed']}")
+    return stats
+
+
+def job_counts(session):
+    """各状态的任务数，如 {"pending": 3, "failed": 1}"""
+    return dict(session.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+
+
+def retry_failed(session):
+    """把失败的任务重新放回队列 (重置重试次数)，由调用方提交，返回任务数"""
+    result = session.execute(
+        update(Job).where(Job.status == "failed").values(status="pending", attempts=0, run_after=datetime.now())
+    )
+    return result.rowcount
+
+
+class JobWorker:
+    """后台线程：轮询任务表并用有界线程池执行，wake() 可让新任务立即开始"""
+
+    def __init__(self, session_factory, max_workers=2, poll_interval=5.0, fetcher=None):
+        self.session_factory = session_factory
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.fetcher = fetcher
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="bean-stash-jobs", daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        if self.fetcher is None:
+            from app.core.fetcher import DoubanFetcher
+            self.fetcher = DoubanFetcher()
+        try:
+            recover_stale(self.session_factory)
+        except Exception as e:
+            print(f"恢复后台任务失败: {e}")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while not self._stop.is_set():
+                try:
+                    job_ids = claim(self.session_factory, self.max_workers)
+                    if job_ids:
+                        list(pool.map(lambda job_id: run_job(self.session_factory, job_id, self.fetcher), job_ids))
+                        continue
+                except Exception as e:
+                    print(f"后台任务轮询失败: {e}")
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+_default_worker = None
+_default_lock = threading.Lock()
+
+
+def get_worker():
+    """进程内共享的后台任务线程 (首次调用时启动)"""
+    global _default_worker
+    from app.core.db import get_session_factory
+    with _default_lock:
+        if _default_worker is None:
+            _default_worker = JobWorker(get_session_factory())
+        _default_worker.start()
+        return _default_worker
@@ -0,0 +1,217 @@
+"""
+热点路径的耗时统计。
+
+- instrument_engine 在引擎上挂 SQL 事件，记录每条语句的耗时；超过 SLOW_QUERY_SECONDS 的
+  连同参数追加到 data/slow_queries.log (每行一个 JSON)，最近的几条也保留在内存中
+- span / timed 为抓取、解析、封面下载等调用计时
+- 所有耗时累积到进程内的计数器与直方图，write_prometheus 以 Prometheus 文本格式
+  写到 data/metrics.prom (可交给 node_exporter 的 textfile collector 采集)
+- begin_collect / end_collect 收集当前线程一次运行 (如 Streamlit 的一次重跑) 中的明细，
+  供界面的调试面板展示；后台线程中的耗时只进入累计统计
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from sqlalchemy import event
+
+METRICS_PATH = "data/metrics.prom"
+SLOW_QUERY_LOG = "data/slow_queries.log"
+SLOW_QUERY_SECONDS = 0.1
+EXPORT_INTERVAL = 10       # 秒，maybe_write_prometheus 两次写出的最小间隔
+SLOW_QUERY_KEEP = 50       # 内存中保留的最近慢查询条数
+PARAM_REPR_LIMIT = 200     # 慢查询日志中每个参数最多保留的字符数
+# 直方图桶的上界 (秒)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_histograms = {}   # (指标名, 标签) -> [各桶计数..., 总和, 次数]
+_counters = {}     # (指标名, 标签) -> 累计值
+_slow_queries = deque(maxlen=SLOW_QUERY_KEEP)
+_collector = contextvars.ContextVar("metrics_collector", default=None)
+_last_export = [0.0]
+
+
+def observe(name, labels, seconds):
+    """把一次耗时计入直方图，并记入当前线程正在收集的明细"""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                values[i] += 1
+                break
+        values[-2] += seconds
+        values[-1] += 1
+    collected = _collector.get()
+    if collected is not None:
+        label = labels.get("span") or f"SQL {labels.get('op', '')}".strip()
+        total, count = collected.get(label, (0.0, 0))
+        collected[label] = (total + seconds, count + 1)
+
+
+def increment(name, labels=None, amount=1):
+    """累加计数器"""
+    key = (name, tuple(sorted((labels or {}).items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def span(name):
+    """为一段代码计时：with span("fetch_detail"): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("beanstash_span_seconds", {"span": name}, time.perf_counter() - started)
+
+
+def timed(name):
+    """为函数计时的装饰器"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _short(value):
+    text = repr(value)
+    return text if len(text) <= PARAM_REPR_LIMIT else text[:PARAM_REPR_LIMIT] + "..."
+
+
+def _log_slow(statement, parameters, seconds):
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (list, tuple, dict)):
+        params = f"<{len(parameters)} 组参数> " + _short(parameters[0])  # executemany
+    else:
+        params = _short(parameters)
+    entry = {
+        "at": datetime.now().isoformat(sep=" ", timespec="seconds"),
+        "ms": round(seconds * 1000, 1),
+        "statement": " ".join(statement.split()),
+        "params": params,
+    }
+    with _lock:
+        _slow_queries.append(entry)
+    increment("beanstash_slow_queries_total")
+    try:
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or ".", exist_ok=True)
+        with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"写入慢查询日志失败: {e}")
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("metrics_started")
+    if not stack:
+        return
+    seconds = time.perf_counter() - stack.pop()
+    op = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+    observe("beanstash_sql_seconds", {"op": op}, seconds)
+    if seconds >= SLOW_QUERY_SECONDS:
+        _log_slow(statement, parameters, seconds)
+
+
+def _error(context):
+    # 语句出错时 after_cursor_execute 不会触发，丢弃对应的开始时间
+    stack = context.connection.info.get("metrics_started") if context.connection is not None else None
+    if stack:
+        stack.pop()
+
+
+def instrument_engine(engine):
+    """为引擎上的每条 SQL 计时"""
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _error)
+
+
+def slow_queries():
+    """最近的慢查询 (新的在前)"""
+    with _lock:
+        return list(reversed(_slow_queries))
+
+
+def begin_collect():
+    """开始收集当前线程中的耗时明细，返回传给 end_collect 的标记"""
+    return _collector.set({}), time.perf_counter()
+
+
+def end_collect(token):
+    """结束收集，返回 (总耗时秒, [(名称, 耗时秒, 次数)]，按耗时降序)"""
+    ctx_token, started = token
+    collected = _collector.get() or {}
+    _collector.reset(ctx_token)
+    rows = sorted(((name, total, count) for name, (total, count) in collected.items()), key=lambda r: -r[1])
+    return time.perf_counter() - started, rows
+
+
+def _labels(pairs):
+    """Prometheus 标签串，无标签时为空"""
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """累计的计数器与直方图，Prometheus 文本格式"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(values) for key, values in _histograms.items()}
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_labels(labels)} {value}")
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {values[-2]:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {values[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=METRICS_PATH):
+    """原子地写出指标文件"""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(render_prometheus())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"写入指标文件失败: {e}")
+
+
+def maybe_write_prometheus(path=METRICS_PATH, min_interval=EXPORT_INTERVAL):
+    """距上次写出超过 min_interval 秒时才写出 (适合在每次界面重跑时调用)"""
+    now = time.monotonic()
+    with _lock:
+        if now - _last_export[0] < min_interval:
+            return
+        _last_export[0] = now
+    write_prometheus(path)
@@ -1,8 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, Enum, ForeignKey
+from sqlalchemy import create_engine, event, inspect, Column, Integer, String, Float, Text, DateTime, Enum, ForeignKey, Index, Table
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, sessionmaker, Session
 from datetime import datetime
 import enum
+import re
+import zlib
 
 Base = declarative_base()
 
@@ -16,8 +18,61 @@ class MediaType(enum.Enum):
     BOOK = "book"
     MUSIC = "music"
 
+# SQLite 连接参数：WAL 允许读写并发，NORMAL 在 WAL 下兼顾安全与写入速度
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("mmap_size", 256 * 1024 * 1024),
+    ("cache_size", -64 * 1024),  # 负数单位为 KB，即 64MB
+    ("busy_timeout", 5000),      # 毫秒，遇到写锁时等待而不是立即报错
+    ("temp_store", "MEMORY"),
+    ("foreign_keys", "ON"),      # item_tags 依赖级联删除
+)
+
+# 条目与标签的多对多关联，(tag_id, item_id) 索引用于按标签筛选与计数
+item_tags = Table(
+    'item_tags', Base.metadata,
+    Column('item_id', Integer, ForeignKey('collection_items.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_item_tags_tag', 'tag_id', 'item_id'),
+)
+
+# 查重签名：每个条目的标识符 (isbn:/imdb:) 与规范化标题的三字组 (t:<类型>:<三字组>)，
+# 主键 (key, item_id) 即倒排索引，由 app.core.dedup 维护
+dedup_keys = Table(
+    'dedup_keys', Base.metadata,
+    Column('key', String(120), primary_key=True),
+    Column('item_id', Integer, ForeignKey('collection_items.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_dedup_keys_item', 'item_id'),
+    sqlite_with_rowid=False,
+)
+
+# 标题、标识符变化后待重算签名的条目，由触发器写入
+dedup_dirty = Table(
+    'dedup_dirty', Base.metadata,
+    Column('item_id', Integer, ForeignKey('collection_items.id', ondelete='CASCADE'), primary_key=True),
+)
+
+class Tag(Base):
+    __tablename__ = 'tags'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+
 class CollectionItem(Base):
     __tablename__ = 'collection_items'
+    __table_args__ = (
+        # 与界面的筛选/排序组合对应：类型+状态、仅状态、仅类型、不筛选，均按 (created_at, id) 倒序
+        Index('ix_items_type_status_created', 'media_type', 'my_status', 'created_at', 'id'),
+        Index('ix_items_status_created', 'my_status', 'created_at', 'id'),
+        Index('ix_items_type_created', 'media_type', 'created_at', 'id'),
+        Index('ix_items_created', 'created_at', 'id'),
+        # 封面匹配与去重时按书号 / IMDb 查找
+        Index('ix_items_isbn', 'isbn'),
+        Index('ix_items_imdb_id', 'imdb_id'),
+        # 元数据刷新按抓取时间从旧到新挑选 (从未抓取的 NULL 排在最前)
+        Index('ix_items_fetched', 'fetched_at', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     title = Column(String(255), nullable=False)
@@ -38,12 +93,18 @@ class CollectionItem(Base):
     my_rating = Column(Float)  # 1-5 星
     my_status = Column(Enum(CollectionStatus), default=CollectionStatus.WISH)
     my_comment = Column(Text)
-    my_tags = Column(String(255))  # 以逗号分隔
+    my_tags = Column(String(255))  # 以逗号分隔 (展示与编辑用，规范化后的标签见 tags)
+    tags = relationship(Tag, secondary=item_tags, passive_deletes=True)
     
     # 统计
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     completed_at = Column(DateTime)
+    fetched_at = Column(DateTime)      # 最近一次抓取详情页的时间
+    content_hash = Column(String(40))  # 最近一次解析结果的指纹，见 app.core.refresh
+    # 乐观锁版本号：ORM 每次更新时递增，并以读取时的值为更新条件 (见 app.core.edits)
+    version_id = Column(Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version_id}
     
     # 详细信息 (通用)
     year = Column(Integer)
@@ -71,9 +132,116 @@ class CollectionItem(Base):
     genre = Column(String(100))
     media_format = Column(String(50))
 
+class Job(Base):
+    """后台任务 (封面下载、详情补全)，由 app.core.jobs 领取执行"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False)
+    item_id = Column(Integer, ForeignKey('collection_items.id', ondelete='CASCADE'), nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending / running / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, default=datetime.now)  # 失败重试前的等待
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+def parse_tags(text):
+    """把逗号分隔的标签文本拆成去重后的标签名列表 (兼容中文逗号、顿号、分号)"""
+    names = []
+    for part in re.split(r"[,，、;；]", text or ""):
+        name = part.strip()[:100]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+@event.listens_for(Session, "before_flush")
+def _sync_item_tags(session, flush_context, instances):
+    """my_tags 文本变化时同步 tags 关联，保证两者一致"""
+    changed = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, CollectionItem)
+        and (obj in session.new or inspect(obj).attrs.my_tags.history.has_changes())
+    ]
+    if not changed:
+        return
+
+    names = {name for obj in changed for name in parse_tags(obj.my_tags)}
+    with session.no_autoflush:
+        known = {t.name: t for t in session.query(Tag).filter(Tag.name.in_(names))} if names else {}
+        for obj in changed:
+            tags = []
+            for name in parse_tags(obj.my_tags):
+                if name not in known:
+                    known[name] = Tag(name=name)
+                    session.add(known[name])
+                tags.append(known[name])
+            obj.tags = tags
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def ensure_columns(engine):
+    """为已有数据库补上模型中新增的列 (ALTER TABLE ADD COLUMN，已存在的跳过)"""
+    for table in (CollectionItem.__table__,):
+        existing = {col["name"] for col in inspect(engine).get_columns(table.name)}
+        missing = [col for col in table.columns if col.name not in existing]
+        if not missing:
+            continue
+        with engine.begin() as conn:
+            for col in missing:
+                col_type = col.type.compile(dialect=engine.dialect)
+                # 带默认值的非空列 (如 version_id) 连同默认值一起添加，已有的行取默认值
+                default = f" NOT NULL DEFAULT {col.server_default.arg}" if col.server_default is not None else ""
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {col_type}{default}')
+
+def ensure_indexes(engine):
+    """为已有数据库补建索引 (已存在的会跳过)"""
+    for index in CollectionItem.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
+# 触发器、FTS 配置或数据迁移 (ensure_fts / ensure_stats / migrate_tags / ensure_dedup) 有变化时递增：
+# 这些不体现在表、列与索引名中，不递增的话已有数据库会因指纹不变而跳过它们。
+# 对应的 ensure_* 需能识别并替换旧的定义
+MIGRATION_VERSION = 2  # 2: dedup_dirty 触发器不再使用 OR IGNORE (见 app.core.dedup.ensure_dedup)
+
+def schema_fingerprint():
+    """模型结构 (表、列、索引名) 与 MIGRATION_VERSION 的指纹，保存在 SQLite 的 PRAGMA user_version 中"""
+    parts = [f"migration:{MIGRATION_VERSION}"]
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        columns = ",".join(col.name for col in table.columns)
+        indexes = ",".join(sorted(index.name for index in table.indexes))
+        parts.append(f"{table.name}:{columns}:{indexes}")
+    return zlib.crc32("|".join(parts).encode("utf-8")) & 0x7fffffff
+
 def init_db(db_path="sqlite:///data/collection.db"):
     engine = create_engine(db_path, echo=False)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+        # 结构与模型一致的库 (上次初始化时记录了指纹) 跳过建表与迁移检查，加快启动
+        with engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA user_version").scalar() == schema_fingerprint():
+                return engine
     Base.metadata.create_all(engine)
+    ensure_columns(engine)
+    ensure_indexes(engine)
+    if engine.dialect.name == "sqlite":
+        from app.core.search import ensure_fts
+        from app.core.stats import ensure_stats
+        from app.core.tags import migrate_tags
+        from app.core.dedup import ensure_dedup
+        ensure_fts(engine)
+        ensure_stats(engine)
+        migrate_tags(engine)
+        ensure_dedup(engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"PRAGMA user_version = {schema_fingerprint()}")
     return engine
 
 def get_session(engine):
@@ -0,0 +1,185 @@
+"""
+豆瓣详情页解析器。
+
+相比对整页建树：
+- 只为标题 (h1)、#mainpic、评分区、#info 与简介区建树，评论/推荐等大块内容直接跳过
+- 页面带 JSON-LD 时，标题、封面、评分、类型、ISBN 直接取自结构化数据
+- 安装了 lxml 时自动使用 lxml 解析
+输出字段与旧解析逻辑保持一致，由 fixtures/douban 下的冻结样本校验。
+"""
+import html as html_lib
+import json
+import os
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    PARSER_ENGINE = "lxml"
+except ImportError:
+    PARSER_ENGINE = "html.parser"
+
+CORPUS_DIR = "fixtures/douban"
+# 需要建树的区域：封面、详情、评分、简介 (新旧页面的简介容器 id 不同)
+REGION_IDS = frozenset({"mainpic", "info", "interest_sectl", "link-report", "link-report-intra"})
+LD_JSON_RE = re.compile(r'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.S)
+
+
+class _RegionStrainer(SoupStrainer):
+    """只允许 h1 与 REGION_IDS 中的区域 (及其子节点) 进入文档树"""
+
+    def __init__(self):
+        super().__init__(id=sorted(REGION_IDS))
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return name == "h1" or (attrs or {}).get("id") in REGION_IDS
+
+
+# bs4 4.13 之前的 SoupStrainer 没有 allow_tag_creation 钩子，此时退回整页建树
+_STRAINER = _RegionStrainer() if hasattr(SoupStrainer, "allow_tag_creation") else None
+
+
+def _json_ld(html):
+    """提取页面内嵌的 JSON-LD，不存在或无法解析时返回空字典"""
+    match = LD_JSON_RE.search(html)
+    if not match:
+        return {}
+    try:
+        # 豆瓣的 JSON-LD 里偶尔有未转义的换行，需要非严格模式
+        data = json.loads(match.group(1), strict=False)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _first_span_containing(soup, text):
+    """等价于 select_one('span:contains(text)')：文档顺序中第一个文本包含 text 的 span"""
+    for span in soup.find_all("span"):
+        if text in span.get_text():
+            return span
+    return None
+
+
+def _first_attrs_under(soup, text):
+    """等价于 select_one('span:contains(text) .attrs')"""
+    for span in soup.find_all("span"):
+        if text in span.get_text():
+            attrs_tag = span.find(class_="attrs")
+            if attrs_tag is not None:
+                return attrs_tag
+    return None
+
+
+def parse_detail(html, url):
+    """解析详情页 HTML，url 用于判断条目类型"""
+    ld = _json_ld(html)
+    soup = BeautifulSoup(html, PARSER_ENGINE, parse_only=_STRAINER)
+
+    data = {}
+    # 通用标题
+    if ld.get("name"):
+        data['title'] = html_lib.unescape(ld["name"]).strip()
+    else:
+        title_tag = soup.select_one('h1 span[property="v:itemreviewed"]')
+        data['title'] = title_tag.get_text(strip=True) if title_tag else ""
+
+    # 封面图
+    if ld.get("image"):
+        data['cover_url'] = ld["image"]
+    else:
+        cover_tag = soup.select_one('#mainpic img')
+        data['cover_url'] = cover_tag['src'] if cover_tag else ""
+
+    # 评分
+    rating = ld.get("aggregateRating")
+    if isinstance(rating, dict) and "ratingValue" in rating:
+        data['rating_douban'] = float(rating["ratingValue"]) if rating["ratingValue"] else None
+    else:
+        rating_tag = soup.select_one('.ll.rating_num')
+        rating_text = rating_tag.get_text() if rating_tag else ""
+        data['rating_douban'] = float(rating_text) if rating_text else None
+
+    info_tag = soup.find(id="info")
+    info_text = info_tag.get_text() if info_tag else ""
+
+    # 根据 URL 判断类型
+    if "movie.douban.com" in url:
+        data['media_type'] = "movie"
+        director_tag = _first_attrs_under(soup, "导演")
+        data['director'] = director_tag.get_text(strip=True) if director_tag else ""
+
+        # 主演 (取前5个)
+        casts = [a.get_text() for a in soup.select('span.actor .attrs a')[:5]]
+        data['cast'] = " / ".join(casts)
+
+        # 年份
+        year_tag = soup.select_one('.year')
+        if year_tag:
+            year_match = re.search(r'(\d{4})', year_tag.get_text())
+            data['year'] = year_match.group(1) if year_match else None
+
+        # 剧情简介
+        summary_tag = soup.select_one('span[property="v:summary"]')
+        data['summary'] = summary_tag.get_text(strip=True) if summary_tag else ""
+
+        # IMDb 链接提取
+        imdb_match = re.search(r'IMDb:.*?(\w+)', info_text)
+        data['imdb_id'] = imdb_match.group(1) if imdb_match else None
+
+        # 制片国家
+        country_match = re.search(r'制片国家/地区: (.*)', info_text)
+        data['country'] = country_match.group(1).split('\n')[0].strip() if country_match else ""
+
+        # 类型
+        if isinstance(ld.get("genre"), list):
+            data['genres'] = " / ".join(ld["genre"])
+        else:
+            data['genres'] = " / ".join(span.get_text() for span in soup.select('span[property="v:genre"]'))
+
+    elif "book.douban.com" in url:
+        data['media_type'] = "book"
+        author_tag = _first_span_containing(soup, "作者")
+        author_link = author_tag.find_next_sibling('a') if author_tag else None
+        data['author'] = author_link.get_text(strip=True) if author_link else ""
+
+        # ISBN (结构化数据中带 X 校验位的 ISBN 与正文正则结果不一致，只取纯数字)
+        ld_isbn = str(ld.get("isbn") or "")
+        if ld_isbn.isdigit():
+            data['isbn'] = ld_isbn
+        else:
+            isbn_match = re.search(r'ISBN: (\d+)', info_text)
+            data['isbn'] = isbn_match.group(1) if isbn_match else ""
+
+        # 出版社
+        pub_match = re.search(r'出版社: (.*)', info_text)
+        data['publisher'] = pub_match.group(1).strip() if pub_match else ""
+
+        # 简介
+        summary_node = soup.select_one('.intro p')
+        data['summary'] = summary_node.get_text(strip=True) if summary_node else ""
+
+    return data
+
+
+def verify_corpus(corpus_dir=CORPUS_DIR):
+    """用冻结样本校验解析结果，返回不一致的 (文件名, 期望, 实际) 列表"""
+    mismatches = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(corpus_dir, name), encoding="utf-8") as f:
+            case = json.load(f)
+        with open(os.path.join(corpus_dir, name[:-5] + ".html"), encoding="utf-8") as f:
+            actual = parse_detail(f.read(), case["url"])
+        if actual != case["expected"]:
+            mismatches.append((name, case["expected"], actual))
+    return mismatches
+
+
+if __name__ == "__main__":
+    print(f"解析引擎: {PARSER_ENGINE}")
+    failed = verify_corpus()
+    for name, expected, actual in failed:
+        print(f"❌ {name}\n  期望: {expected}\n  实际: {actual}")
+    print("✅ 样本全部一致" if not failed else f"共 {len(failed)} 个样本不一致")
@@ -0,0 +1,143 @@
+"""
+搜索结果详情页的后台预取。
+
+“✨ 发现与录入”展示搜索结果时就开始抓取并解析各候选的详情页 (以及封面)，
+用户点击“入库”时多半已经就绪，可以直接写入完整条目，不必再等网络。
+- 有界：固定大小的线程池，缓存至多 PREFETCH_ENTRIES 项，超出时丢弃最旧的
+- 可取消：新的搜索替换旧结果时，旧结果中尚未开始的抓取被取消，已开始的不再下载封面。
+  预取器在进程内共享，“旧结果”按调用方 (owner，界面中为每个浏览器会话) 分别记录：
+  同一 URL 只要还有会话需要就保留，一个会话的搜索不会取消另一个会话的预取
+- 短期缓存：结果保留 PREFETCH_TTL 秒
+封面只下载到按内容寻址的存储 (未链接到任何条目名，见 app.utils.cover_store)，
+入库时才链接；没被入库的封面会被 `python main.py covers` 清理。
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+PREFETCH_WORKERS = 3
+PREFETCH_ENTRIES = 20
+PREFETCH_TTL = 600   # 秒
+PREFETCH_COVERS = True
+
+
+class Prefetcher:
+    """按 URL 缓存的后台详情预取"""
+
+    def __init__(self, fetcher=None, max_workers=PREFETCH_WORKERS, max_entries=PREFETCH_ENTRIES, ttl=PREFETCH_TTL, covers=PREFETCH_COVERS):
+        if fetcher is None:
+            from app.core.fetcher import DoubanFetcher
+            fetcher = DoubanFetcher()
+        self.fetcher = fetcher
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.covers = covers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # url -> (future, 取消标记, 创建时间, 需要它的 owner 集合)
+
+    def _load(self, url, cancelled):
+        detail = self.fetcher.fetch_detail(url)
+        if not detail or not detail.get("title"):
+            return None
+        cover = None
+        if self.covers and detail.get("cover_url") and not cancelled.is_set():
+            from app.utils.cover_store import get_cover_store
+            try:
+                cover = get_cover_store().download(detail["cover_url"])
+            except Exception as e:
+                print(f"预取封面失败: {e}")
+        return {"detail": detail, "cover": cover}
+
+    def _drop(self, url):
+        future, cancelled, _, _ = self.entries.pop(url)
+        cancelled.set()
+        future.cancel()
+
+    def _release(self, owner, keep=()):
+        """owner 不再需要 keep 以外的条目；已没有任何 owner 需要且尚未完成的取消 (调用方持有锁)"""
+        for url, (future, _, _, owners) in list(self.entries.items()):
+            if url in keep:
+                continue
+            owners.discard(owner)
+            if not owners and not future.done():
+                self._drop(url)
+
+    def prefetch(self, urls, owner=None):
+        """开始为 owner 预取 urls；owner 之前要过、这次不再需要的条目若尚未完成则取消"""
+        now = time.monotonic()
+        with self.lock:
+            for url, (_, _, created, _) in list(self.entries.items()):
+                if now - created > self.ttl:
+                    self._drop(url)
+            self._release(owner, keep=set(urls))
+            for url in urls:
+                if url not in self.entries:
+                    cancelled = threading.Event()
+                    self.entries[url] = (self.executor.submit(self._load, url, cancelled), cancelled, now, set())
+                else:
+                    self.entries.move_to_end(url)
+                self.entries[url][3].add(owner)
+            # 超出上限时先丢弃已没有 owner 需要的 (已完成) 条目，再丢弃最旧的
+            while len(self.entries) > self.max_entries:
+                unowned = next((url for url, entry in self.entries.items() if not entry[3]), None)
+                self._drop(unowned or next(iter(self.entries)))
+
+    def get(self, url, wait=0):
+        """
+        取预取结果 {"detail", "cover"}：尚未完成时至多等待 wait 秒，
+        没有预取、已过期、抓取失败或仍未完成时返回 None。
+        """
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry and time.monotonic() - entry[2] > self.ttl:
+                self._drop(url)
+                entry = None
+        if entry is None:
+            return None
+        try:
+            return entry[0].result(timeout=wait)
+        except TimeoutError:
+            return None
+        except Exception as e:  # 包括已取消
+            print(f"预取详情失败: {e}")
+            return None
+
+    def cancel(self, owner=None):
+        """取消 owner 的预取 (其他 owner 仍需要的保留)"""
+        with self.lock:
+            self._release(owner)
+
+
+def link_cover(blob_path, identifiers):
+    """把预取的封面链接到条目的标识符名下，返回本地路径"""
+    from app.utils.cover_store import get_cover_store
+    from app.utils.cover_index import get_cover_index
+
+    identifiers = [i for i in identifiers if i]
+    if not blob_path or not identifiers:
+        return None
+    store = get_cover_store()
+    try:
+        path = store.link(blob_path, identifiers[0])
+        for alias in identifiers[1:]:
+            store.link(blob_path, alias)
+    except OSError as e:
+        print(f"链接封面失败: {e}")
+        return None
+    get_cover_index().add(path)
+    return path
+
+
+_default_prefetcher = None
+_default_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """进程内共享的预取器"""
+    global _default_prefetcher
+    with _default_lock:
+        if _default_prefetcher is None:
+            _default_prefetcher = Prefetcher()
+        return _default_prefetcher
@@ -0,0 +1,70 @@
+from sqlalchemy import and_, or_, func
+from app.core.models import CollectionItem
+from app.core.tags import tagged_item_ids
+
+# 网格卡片只需要的列：按行读取 (不构造 ORM 对象)，结果可直接放入界面缓存
+GRID_COLUMNS = (
+    CollectionItem.id, CollectionItem.title, CollectionItem.year, CollectionItem.media_type,
+    CollectionItem.isbn, CollectionItem.imdb_id, CollectionItem.douban_id,
+    CollectionItem.local_cover_path, CollectionItem.cover_url, CollectionItem.created_at,
+)
+# 表格视图展示的列 (不含简介、演员等长文本)
+TABLE_COLUMNS = (
+    CollectionItem.id, CollectionItem.title, CollectionItem.media_type,
+    CollectionItem.isbn, CollectionItem.imdb_id, CollectionItem.douban_id,
+    CollectionItem.my_rating, CollectionItem.my_status, CollectionItem.my_comment, CollectionItem.updated_at,
+)
+
+
+def filtered_query(session, media_type=None, status=None, tags=None, tag_mode="and", columns=None):
+    """
+    根据界面上的类型/状态/标签筛选构造查询 (None 或空表示不过滤)。
+    指定 columns 时只查询这些列，返回行而不是 CollectionItem。
+    """
+    query = session.query(*columns) if columns else session.query(CollectionItem)
+    if media_type is not None:
+        query = query.filter(CollectionItem.media_type == media_type)
+    if status is not None:
+        query = query.filter(CollectionItem.my_status == status)
+    if tags:
+        query = query.filter(CollectionItem.id.in_(tagged_item_ids(tags, tag_mode)))
+    return query
+
+
+def count_rows(query):
+    """筛选结果的总数 (SELECT COUNT，不加载任何行)"""
+    return query.order_by(None).with_entities(func.count(CollectionItem.id)).scalar()
+
+
+def offset_page(query, order_column, descending=True, page=1, page_size=100):
+    """
+    按 order_column 排序后取第 page 页 (从 1 开始)，排序在 SQL 中完成。
+    以 id 作为次要排序键，保证翻页时顺序稳定。
+    """
+    direction = (lambda col: col.desc()) if descending else (lambda col: col.asc())
+    return (
+        query.order_by(direction(order_column), direction(CollectionItem.id))
+        .limit(page_size)
+        .offset((max(page, 1) - 1) * page_size)
+        .all()
+    )
+
+
+def keyset_page(query, cursor=None, limit=36):
+    """
+    基于 (created_at, id) 的键集分页，按录入时间倒序。
+    cursor 为上一页最后一条的 (created_at, id)，None 表示第一页。
+    返回 (本页条目, 下一页游标)，没有下一页时游标为 None。
+    """
+    if cursor is not None:
+        created_at, item_id = cursor
+        query = query.filter(or_(
+            CollectionItem.created_at < created_at,
+            and_(CollectionItem.created_at == created_at, CollectionItem.id < item_id)
+        ))
+
+    # 多取一条用于判断是否还有下一页，SQLite 只需物化当前页
+    rows = query.order_by(CollectionItem.created_at.desc(), CollectionItem.id.desc()).limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = (items[-1].created_at, items[-1].id) if len(rows) > limit else None
+    return items, next_cursor
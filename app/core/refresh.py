@@ -0,0 +1,106 @@
+"""
+按陈旧程度增量刷新条目元数据 (豆瓣评分、简介等)。
+
+每个条目记录最近一次抓取时间 fetched_at 与解析结果指纹 content_hash：
+- 每次运行只挑 fetched_at 最旧 (从未抓取的优先) 的 budget 个条目，适合放进 cron
+- 详情页以 max_age=0 重新验证，页面未变时服务器返回 304，不重新下载
+- 解析结果指纹不变时只更新 fetched_at，不改写条目，也不触发检索/统计触发器
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+
+from app.core.models import CollectionItem
+from app.core.upsert import bulk_upsert
+
+# 来自豆瓣、刷新时直接覆盖的字段
+REFRESH_FIELDS = (
+    "title", "cover_url", "rating_douban", "summary", "year", "director", "cast",
+    "country", "genres", "author", "publisher",
+)
+# 用户可能手动修改过的标识符，只在为空时补全
+FILL_FIELDS = ("isbn", "imdb_id")
+MIN_REFRESH_AGE = 7  # 天，抓取时间比这更新的条目本次不刷新
+BATCH_SIZE = 50
+
+
+def fingerprint(detail):
+    """解析结果中参与刷新的字段的指纹"""
+    fields = {field: detail.get(field) for field in REFRESH_FIELDS + FILL_FIELDS}
+    return hashlib.sha1(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def detail_row(item_id, detail, now):
+    """把详情页解析结果转成 bulk_upsert 的一行 (空值不覆盖原值，FILL_FIELDS 只补全)"""
+    row = {field: detail.get(field) for field in REFRESH_FIELDS + FILL_FIELDS}
+    row.update(id=item_id, fetched_at=now, content_hash=fingerprint(detail))
+    return row
+
+
+def stalest_items(session, budget, min_age_days=MIN_REFRESH_AGE):
+    """抓取时间最旧的 budget 个条目，返回 [(id, 豆瓣链接, 指纹)]"""
+    cutoff = datetime.now() - timedelta(days=min_age_days)
+    return (
+        session.query(CollectionItem.id, CollectionItem.douban_url, CollectionItem.content_hash)
+        .filter(CollectionItem.douban_url.isnot(None), CollectionItem.douban_url != "")
+        .filter(or_(CollectionItem.fetched_at.is_(None), CollectionItem.fetched_at < cutoff))
+        .order_by(CollectionItem.fetched_at, CollectionItem.id)
+        .limit(budget)
+        .all()
+    )
+
+
+def _touch(session, item_ids, now):
+    """只更新抓取时间 (显式保留 updated_at，避免 onupdate 改写)"""
+    if item_ids:
+        session.execute(
+            update(CollectionItem)
+            .where(CollectionItem.id.in_(item_ids))
+            .values(fetched_at=now, updated_at=CollectionItem.updated_at)
+        )
+
+
+def refresh_items(session_factory, budget=100, min_age_days=MIN_REFRESH_AGE, workers=4, fetcher=None, progress=print):
+    """
+    刷新最陈旧的至多 budget 个条目，每 BATCH_SIZE 个一个事务。
+    抓取失败的条目同样推后抓取时间，避免反复占用下一次运行的额度。
+    返回 {"checked", "changed", "unchanged", "failed"} 计数。
+    """
+    if fetcher is None:
+        from app.core.fetcher import DoubanFetcher
+        fetcher = DoubanFetcher()
+
+    with session_factory() as session:
+        candidates = stalest_items(session, budget, min_age_days)
+    stats = {"checked": len(candidates), "changed": 0, "unchanged": 0, "failed": 0}
+    progress(f"本次检查 {len(candidates)} 个条目")
+
+    for offset in range(0, len(candidates), BATCH_SIZE):
+        batch = candidates[offset:offset + BATCH_SIZE]
+        details = fetcher.fetch_details_many([url for _, url, _ in batch], max_workers=workers, max_age=0)
+        now = datetime.now()
+        touched, changed = [], []
+        for (item_id, _, old_hash), detail in zip(batch, details):
+            if not detail or not detail.get("title"):
+                stats["failed"] += 1
+                touched.append(item_id)
+            elif fingerprint(detail) == old_hash:
+                stats["unchanged"] += 1
+                touched.append(item_id)
+            else:
+                changed.append((item_id, detail))
+
+        with session_factory() as session:
+            _touch(session, touched, now)
+            # 抓取期间可能已被删除，不能让 upsert 重新插入
+            alive = {row[0] for row in session.query(CollectionItem.id).filter(CollectionItem.id.in_([i for i, _ in changed]))}
+            rows = [detail_row(item_id, detail, now) for item_id, detail in changed if item_id in alive]
+            outcomes = bulk_upsert(session, rows, keep_existing=FILL_FIELDS, commit=False)
+            session.commit()
+            stats["changed"] += sum(status == "updated" for status, _ in outcomes)
+            stats["failed"] += sum(status == "failed" for status, _ in outcomes)
+        progress(f"进度 {offset + len(batch)}/{len(candidates)} | 更新 {stats['changed']} | 未变 {stats['unchanged']} | 失败 {stats['failed']}")
+
+    return stats
@@ -0,0 +1,166 @@
+"""
+本地库全文检索 (SQLite FTS5)。
+
+collection_fts 是以 collection_items 为外部内容表的 FTS5 虚表，由触发器保持同步。
+分词使用 trigram：对中文无需分词即可做任意子串匹配；不足 3 个字的检索词
+(如“活着”) trigram 无法索引，退回到 LIKE 子串匹配：需要扫描全表，也没有 bm25，
+只按命中的字段 (权重同 FTS_WEIGHTS，标题命中排在简介命中之前) 粗略排序。
+旧版 SQLite (< 3.34) 没有 trigram，索引改用 unicode61：连续的汉字被当作一个词，
+“肖申克”匹配不到“肖申克的救赎”，因此这时含中日韩文字的词一律走 LIKE。
+"""
+import re
+import weakref
+
+from sqlalchemy import text
+
+from app.core.models import CollectionItem
+from app.core.tags import tag_filter_sql
+
+FTS_TABLE = "collection_fts"
+FTS_COLUMNS = ("title", "original_title", "summary", "my_comment", "my_tags", "author", "director", "cast")
+# bm25 列权重，与 FTS_COLUMNS 一一对应：标题命中最重要，简介最轻
+FTS_WEIGHTS = (10.0, 8.0, 1.0, 2.0, 5.0, 5.0, 5.0, 3.0)
+MIN_TRIGRAM_LEN = 3
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+
+_tokenizers = weakref.WeakKeyDictionary()  # {engine: 索引使用的分词器}
+
+
+def _quoted(columns, prefix=""):
+    return ", ".join(f'{prefix}"{c}"' for c in columns)
+
+
+def _has_trigram(conn):
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE temp._trigram_probe USING fts5(x, tokenize='trigram')"))
+        conn.execute(text("DROP TABLE temp._trigram_probe"))
+        return True
+    except Exception:
+        return False
+
+
+def fts_tokenizer(session):
+    """读取 collection_fts 建表语句中的分词器 (按 engine 缓存)，索引不存在时返回 None"""
+    engine = session.get_bind()
+    if engine not in _tokenizers:
+        sql = session.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).scalar()
+        match = re.search(r"tokenize\s*=\s*'(\w+)", sql or "")
+        _tokenizers[engine] = match.group(1) if match else None
+    return _tokenizers[engine]
+
+
+def _uses_index(term, tokenizer):
+    """该词能否交给 FTS5 MATCH：trigram 要求至少 3 个字，unicode61 无法匹配汉字子串"""
+    if tokenizer == "trigram":
+        return len(term) >= MIN_TRIGRAM_LEN
+    return tokenizer is not None and len(term) >= MIN_TRIGRAM_LEN and not CJK_RE.search(term)
+
+
+def ensure_fts(engine):
+    """创建 FTS5 虚表与同步触发器 (已存在时跳过)，新建时从现有数据回填"""
+    cols = _quoted(FTS_COLUMNS)
+    new_cols = _quoted(FTS_COLUMNS, "new.")
+    old_cols = _quoted(FTS_COLUMNS, "old.")
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        if exists:
+            return
+
+        # 旧版 SQLite (< 3.34) 没有 trigram 分词器，退回 unicode61 (中文词由 search_library 改走 LIKE)
+        tokenizer = "trigram" if _has_trigram(conn) else "unicode61"
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({cols}, "
+            f"content='collection_items', content_rowid='id', tokenize='{tokenizer}')"
+        ))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON collection_items BEGIN
+                INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON collection_items BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            END
+        """))
+        # 只在被索引的列变化时才重建该行的索引，改评分/状态不触发
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {cols} ON collection_items BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+        """))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def rebuild_fts(engine):
+    """从 collection_items 全量重建索引 (用于已有数据库或索引损坏时)"""
+    ensure_fts(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+
+
+def _match_expr(terms):
+    """每个词作为短语匹配 (双引号转义)，多个词之间为 AND"""
+    return " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def search_library(session, query, media_type=None, status=None, tags=None, tag_mode="and", limit=60, columns=None):
+    """
+    在本地库中检索，返回按相关度排序的 CollectionItem 列表。
+    长度 >= 3 的词走 FTS5 索引并按 bm25 排序；更短的词 (索引不是 trigram 时还有含汉字的词)
+    用 LIKE 匹配 (全表扫描)，只有这类词时按命中字段的权重之和排序，同分时新录入的在前。
+    指定 columns (需包含 id) 时只查询这些列，返回行。
+    """
+    terms = [t for t in query.split() if t]
+    if not terms:
+        return []
+    tokenizer = fts_tokenizer(session)
+    long_terms = [t for t in terms if _uses_index(t, tokenizer)]
+    short_terms = [t for t in terms if not _uses_index(t, tokenizer)]
+
+    where, params = [], {"limit": limit}
+    if media_type is not None:
+        where.append("c.media_type = :media_type")
+        params["media_type"] = media_type.name
+    if status is not None:
+        where.append("c.my_status = :status")
+        params["status"] = status.name
+    if tags:
+        tag_sql, tag_params = tag_filter_sql(tags, tag_mode)
+        where.append(tag_sql)
+        params.update(tag_params)
+    for i, term in enumerate(short_terms):
+        params[f"like_{i}"] = f"%{term}%"
+        where.append("(" + " OR ".join(f'c."{col}" LIKE :like_{i}' for col in FTS_COLUMNS) + ")")
+
+    if long_terms:
+        where.insert(0, f"{FTS_TABLE} MATCH :match")
+        params["match"] = _match_expr(long_terms)
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        sql = (
+            f"SELECT c.id FROM {FTS_TABLE} JOIN collection_items c ON c.id = {FTS_TABLE}.rowid "
+            f"WHERE {' AND '.join(where)} ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT :limit"
+        )
+    else:
+        score = " + ".join(
+            f'(c."{col}" LIKE :like_{i}) * {weight}'
+            for i in range(len(short_terms)) for col, weight in zip(FTS_COLUMNS, FTS_WEIGHTS)
+        )
+        sql = (
+            f"SELECT c.id FROM collection_items c WHERE {' AND '.join(where)} "
+            f"ORDER BY {score} DESC, c.created_at DESC, c.id DESC LIMIT :limit"
+        )
+
+    ids = [row[0] for row in session.execute(text(sql), params)]
+    if not ids:
+        return []
+    rows = session.query(*columns) if columns else session.query(CollectionItem)
+    by_id = {item.id: item for item in rows.filter(CollectionItem.id.in_(ids))}
+    return [by_id[i] for i in ids if i in by_id]
@@ -0,0 +1,352 @@
+"""
+“相似条目”与推荐。
+
+每个条目表示为一个稀疏特征向量，特征取自：
+- g:<流派>       genres (电影) 与 genre (音乐)
+- t:<标签>       my_tags
+- p:<人名>       导演、作者、表演者与前 MAX_CAST 位主演
+- y:<年代>       年份所在的十年 (相邻年代各计一半，1999 与 2000 不至于毫无关系)
+- m:<类型>       条目类型
+各类特征按 FIELD_WEIGHTS 加权后乘以 IDF (罕见的标签、人名更有区分度)，再按行做 L2 归一化，
+两个条目的余弦相似度即两行的点积；查询一个条目只需一次稀疏矩阵乘向量，再用 argpartition 取前 k 个。
+
+原始的加权词频矩阵与条目 id 持久化在 data/similar_index.npz。
+sync 按 updated_at 只重算变化过的条目，另外补上索引中缺少的条目、清除已删除的条目；
+IDF 与归一化矩阵在有变化后的第一次查询时向量化地整体重算 (不涉及逐条目的 Python 循环)。
+依赖 numpy 与 scipy (已列入 requirements.txt)；缺少时 SIMILAR_AVAILABLE 为 False，界面隐藏相关面板。
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.core.models import CollectionItem, CollectionStatus, MediaType, parse_tags
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # 未安装时不提供相似条目
+    np = sparse = None
+
+SIMILAR_AVAILABLE = sparse is not None
+INDEX_PATH = "data/similar_index.npz"
+FEATURE_VERSION = 1      # 特征提取规则变化时递增，旧的索引文件会被整体重建
+FIELD_WEIGHTS = {"g": 1.0, "t": 1.2, "p": 1.5, "y": 0.6, "m": 0.4}
+MAX_CAST = 5
+MIN_DF = 2               # 出现在少于这么多条目中的特征不参与相似度
+COMPACT_RATIO = 0.2      # 已删除条目占行数超过该比例时压缩矩阵
+SYNC_CHUNK = 2000
+# 按 updated_at 增量同步时向前多取的时间窗口 (秒)：同步期间才提交、但时间戳更早的修改也不会漏掉
+SYNC_OVERLAP = 60
+FEATURE_COLUMNS = (
+    CollectionItem.id, CollectionItem.media_type, CollectionItem.genres, CollectionItem.genre,
+    CollectionItem.my_tags, CollectionItem.director, CollectionItem.author, CollectionItem.performer,
+    CollectionItem.cast, CollectionItem.year, CollectionItem.updated_at,
+)
+TYPE_CODES = {media_type: code for code, media_type in enumerate(MediaType)}
+
+
+def _split_people(text):
+    return [name.strip() for name in (text or "").replace("／", "/").split("/") if name.strip()]
+
+
+def item_features(row):
+    """一行 (FEATURE_COLUMNS) 的加权特征 {特征: 权重}"""
+    features = {}
+
+    def add(kind, value, scale=1.0):
+        value = (value or "").strip().lower()
+        if value:
+            key = f"{kind}:{value}"[:120]
+            features[key] = features.get(key, 0.0) + FIELD_WEIGHTS[kind] * scale
+
+    for text in (row.genres, row.genre):
+        for name in _split_people(text):
+            add("g", name)
+    for name in parse_tags(row.my_tags):
+        add("t", name)
+    for text in (row.director, row.author, row.performer):
+        for name in _split_people(text):
+            add("p", name)
+    for name in _split_people(row.cast)[:MAX_CAST]:
+        add("p", name)
+    if row.year:
+        decade = row.year // 10 * 10
+        add("y", f"{decade}s")
+        neighbour = decade - 10 if row.year % 10 < 5 else decade + 10
+        add("y", f"{neighbour}s", 0.5)
+    if row.media_type is not None:
+        add("m", row.media_type.name)
+    return features
+
+
+class SimilarIndex:
+    """条目的 TF-IDF 矩阵与余弦相似度查询"""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.lock = threading.RLock()
+        self.vocab = {}                          # 特征 -> 列号
+        self.terms = []                          # 列号 -> 特征
+        self.ids = np.zeros(0, dtype=np.int64)   # 行号 -> 条目 id，已删除的行为 -1
+        self.types = np.zeros(0, dtype=np.int8)  # 行号 -> 条目类型编号
+        self.rows = {}                           # 条目 id -> 行号
+        self.counts = sparse.csr_matrix((0, 0), dtype=np.float32)  # 加权词频
+        self.synced_at = None                    # 上次同步开始的时间
+        self.matrix = None                       # 归一化后的 TF-IDF，有变化时置空
+        self.load()
+
+    # --- 持久化 ---
+
+    def load(self):
+        """读取索引文件；不存在、损坏或特征规则已变化时从空索引开始"""
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("version") != FEATURE_VERSION:
+                    return
+                vocab = [str(key) for key in data["vocab"]]
+                counts = sparse.csr_matrix(
+                    (data["data"], data["indices"], data["indptr"]), shape=(len(data["ids"]), len(vocab))
+                )
+                ids, types = data["ids"], data["types"]
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"读取相似索引失败，将重建: {e}")
+            return
+        self.vocab = {key: col for col, key in enumerate(vocab)}
+        self.terms = vocab
+        self.ids, self.types, self.counts = ids, types, counts
+        self.rows = {int(item_id): row for row, item_id in enumerate(ids) if item_id >= 0}
+        self.synced_at = datetime.fromisoformat(meta["synced_at"]) if meta.get("synced_at") else None
+        self.matrix = None
+
+    def save(self):
+        """原子地写出索引文件"""
+        self._compact()
+        meta = {"version": FEATURE_VERSION, "synced_at": self.synced_at.isoformat() if self.synced_at else None}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+            np.savez(
+                tmp_path, meta=np.array(json.dumps(meta)), vocab=np.array(self.terms, dtype=str),
+                ids=self.ids, types=self.types, data=self.counts.data,
+                indices=self.counts.indices, indptr=self.counts.indptr,
+            )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"写入相似索引失败: {e}")
+
+    # --- 增量更新 ---
+
+    def _compact(self):
+        """去掉已删除条目留下的空行"""
+        live = self.ids >= 0
+        if live.all() or (~live).sum() < COMPACT_RATIO * len(self.ids):
+            return
+        self.ids, self.types = self.ids[live], self.types[live]
+        self.counts = self.counts[live]
+        self.rows = {int(item_id): row for row, item_id in enumerate(self.ids)}
+        self.matrix = None
+
+    def _apply(self, changed, removed):
+        """changed: [(条目 id, 类型, {特征: 权重})]；removed: 条目 id 列表"""
+        new_ids = [item_id for item_id, _, _ in changed if item_id not in self.rows]
+        if new_ids:
+            start = len(self.ids)
+            self.ids = np.concatenate([self.ids, np.array(new_ids, dtype=np.int64)])
+            self.types = np.concatenate([self.types, np.zeros(len(new_ids), dtype=np.int8)])
+            self.rows.update((item_id, start + i) for i, item_id in enumerate(new_ids))
+
+        cleared = np.zeros(len(self.ids), dtype=bool)
+        rows, cols, vals = [], [], []
+        for item_id, media_type, features in changed:
+            row = self.rows[item_id]
+            cleared[row] = True
+            self.types[row] = TYPE_CODES.get(media_type, -1)
+            for key, weight in features.items():
+                col = self.vocab.get(key)
+                if col is None:
+                    col = self.vocab[key] = len(self.terms)
+                    self.terms.append(key)
+                rows.append(row)
+                cols.append(col)
+                vals.append(weight)
+        for item_id in removed:
+            row = self.rows.pop(item_id, None)
+            if row is not None:
+                cleared[row] = True
+                self.ids[row] = -1
+
+        shape = (len(self.ids), len(self.vocab))
+        counts = self.counts.tocsr()
+        counts.resize(shape)
+        # 清空变化过的行再加上新值，都是对整个稀疏矩阵的向量化运算
+        counts = sparse.diags((~cleared).astype(np.float32)) @ counts
+        counts = counts + sparse.csr_matrix((np.array(vals, dtype=np.float32), (rows, cols)), shape=shape)
+        counts.eliminate_zeros()
+        self.counts = counts.tocsr()
+        self.matrix = None
+
+    def _stored_features(self, row):
+        start, end = self.counts.indptr[row], self.counts.indptr[row + 1]
+        return {
+            self.terms[col]: round(float(value), 4)
+            for col, value in zip(self.counts.indices[start:end], self.counts.data[start:end])
+        }
+
+    def sync(self, session, save=True):
+        """把库中的变化同步到索引，返回更新与删除的条目数"""
+        with self.lock:
+            started = datetime.now()
+            current = set(session.execute(select(CollectionItem.id)).scalars())
+            removed = [item_id for item_id in self.rows if item_id not in current]
+            missing = list(current - self.rows.keys())
+
+            rows = []
+            if self.synced_at is not None:
+                since = self.synced_at - timedelta(seconds=SYNC_OVERLAP)
+                rows += session.execute(select(*FEATURE_COLUMNS).where(CollectionItem.updated_at >= since)).all()
+            for start in range(0, len(missing), SYNC_CHUNK):
+                rows += session.execute(
+                    select(*FEATURE_COLUMNS).where(CollectionItem.id.in_(missing[start:start + SYNC_CHUNK]))
+                ).all()
+
+            changed = {}
+            for row in rows:
+                features = item_features(row)
+                stored = self.rows.get(row.id)
+                if stored is not None and TYPE_CODES.get(row.media_type, -1) == self.types[stored] and \
+                        self._stored_features(stored) == {key: round(float(np.float32(w)), 4) for key, w in features.items()}:
+                    continue  # 重叠窗口内未变化的条目
+                changed[row.id] = (row.id, row.media_type, features)
+            if changed or removed:
+                self._apply(list(changed.values()), removed)
+            self.synced_at = started
+            if save and (changed or removed):
+                self.save()
+            return len(changed) + len(removed)
+
+    def rebuild(self, session):
+        """丢弃现有索引并全部重算"""
+        with self.lock:
+            self.vocab, self.terms, self.rows, self.synced_at, self.matrix = {}, [], {}, None, None
+            self.ids = np.zeros(0, dtype=np.int64)
+            self.types = np.zeros(0, dtype=np.int8)
+            self.counts = sparse.csr_matrix((0, 0), dtype=np.float32)
+            return self.sync(session)
+
+    # --- 查询 ---
+
+    def _normalized(self):
+        """IDF 加权并按行 L2 归一化的矩阵 (有变化后首次调用时重算)"""
+        if self.matrix is None:
+            counts = self.counts
+            live = max(len(self.rows), 1)
+            df = np.bincount(counts.indices, minlength=counts.shape[1])
+            idf = (np.log((1 + live) / (1 + df)) + 1).astype(np.float32)
+            idf[df < MIN_DF] = 0  # 只出现在一个条目中的特征无法带来相似，只会稀释其余特征
+            weighted = counts @ sparse.diags(idf)
+            norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+            norms[norms == 0] = 1
+            self.matrix = (sparse.diags((1 / norms).astype(np.float32)) @ weighted).tocsr()
+        return self.matrix
+
+    def _top(self, query, k, exclude=(), media_type=None, candidates=None):
+        """query 为特征空间中的稠密向量，返回得分最高的 [(条目 id, 得分)]"""
+        scores = self._normalized() @ query
+        scores[self.ids < 0] = 0
+        if media_type is not None:
+            scores[self.types != TYPE_CODES.get(media_type, -1)] = 0
+        if candidates is not None:
+            allowed = np.zeros(len(scores), dtype=bool)
+            allowed[[self.rows[item_id] for item_id in candidates if item_id in self.rows]] = True
+            scores[~allowed] = 0
+        for item_id in exclude:
+            row = self.rows.get(item_id)
+            if row is not None:
+                scores[row] = 0
+        k = min(k, int((scores > 0).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self.ids[row]), round(float(scores[row]), 3)) for row in top]
+
+    def similar_to(self, item_id, k=8, same_type=True):
+        """与条目最相似的 k 个条目 [(条目 id, 余弦相似度)]，按相似度降序"""
+        with self.lock:
+            row = self.rows.get(item_id)
+            if row is None:
+                return []
+            media_type = list(MediaType)[self.types[row]] if same_type and self.types[row] >= 0 else None
+            return self._top(self._normalized()[row].toarray().ravel(), k, exclude=(item_id,), media_type=media_type)
+
+    def recommend(self, seeds, k=10, candidates=None, media_type=None):
+        """
+        seeds 为 {条目 id: 权重} (如按评分加权的高分条目)，返回与它们的加权平均最相似的 k 个条目；
+        给定 candidates (条目 id 集合) 时只在其中挑选。
+        """
+        with self.lock:
+            rows = [self.rows[item_id] for item_id in seeds if item_id in self.rows]
+            if not rows:
+                return []
+            weights = np.array([seeds[int(self.ids[row])] for row in rows], dtype=np.float32)
+            weights /= weights.sum()
+            profile = (sparse.csr_matrix(weights[None, :]) @ self._normalized()[rows]).toarray().ravel()
+            return self._top(profile, k, exclude=seeds, media_type=media_type, candidates=candidates)
+
+
+def describe(session, pairs):
+    """把 [(条目 id, 得分)] 补上标题等信息，保持原有顺序"""
+    if not pairs:
+        return []
+    rows = session.execute(
+        select(CollectionItem.id, CollectionItem.title, CollectionItem.year, CollectionItem.media_type,
+               CollectionItem.my_status)
+        .where(CollectionItem.id.in_([item_id for item_id, _ in pairs]))
+    ).all()
+    found = {row.id: row for row in rows}
+    return [
+        {
+            "id": item_id, "title": found[item_id].title, "year": found[item_id].year,
+            "media_type": found[item_id].media_type.value,
+            "my_status": found[item_id].my_status.value if found[item_id].my_status else None,
+            "score": score,
+        }
+        for item_id, score in pairs if item_id in found
+    ]
+
+
+def recommend_wishlist(session, index, k=10, min_rating=4.0, max_seeds=200, media_type=None):
+    """从“想看”清单中挑出与高分条目最相似的 k 个，返回 [(条目 id, 得分)]"""
+    seeds = dict(session.execute(
+        select(CollectionItem.id, CollectionItem.my_rating)
+        .where(CollectionItem.my_rating >= min_rating)
+        .order_by(CollectionItem.my_rating.desc(), CollectionItem.updated_at.desc())
+        .limit(max_seeds)
+    ).all())
+    if not seeds:
+        return []
+    wish = session.execute(select(CollectionItem.id).where(CollectionItem.my_status == CollectionStatus.WISH))
+    return index.recommend(
+        {item_id: rating - min_rating + 1 for item_id, rating in seeds.items()},
+        k=k, candidates=set(wish.scalars()), media_type=media_type,
+    )
+
+
+_default_indexes = {}
+_default_lock = threading.Lock()
+
+
+def get_similar_index(path=INDEX_PATH):
+    """进程内共享的相似索引 (未安装 numpy / scipy 时返回 None)"""
+    if not SIMILAR_AVAILABLE:
+        return None
+    with _default_lock:
+        if path not in _default_indexes:
+            _default_indexes[path] = SimilarIndex(path)
+        return _default_indexes[path]
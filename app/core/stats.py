@@ -0,0 +1,112 @@
+"""
+数据分析面板的统计数据。
+
+library_stats 是由触发器增量维护的计数表，每行一个 key：
+- all            条目总数
+- type:<类型>     各类型条目数
+- status:<状态>   各状态条目数
+- year:<年份>     各年份条目数
+- rating         已评分条目数 (n) 与评分之和 (total)
+面板读取时只访问这张小表，与库的大小无关。
+"""
+from sqlalchemy import text
+
+from app.core.models import CollectionItem, MediaType, CollectionStatus
+
+STATS_TABLE = "library_stats"
+
+
+def _bump(sign, row):
+    """生成对 row (new/old) 的各项计数加减 sign 的语句"""
+    return f"""
+        INSERT INTO {STATS_TABLE}(key, n, total) VALUES ('all', {sign}, 0)
+            ON CONFLICT(key) DO UPDATE SET n = n + ({sign});
+        INSERT INTO {STATS_TABLE}(key, n, total) VALUES ('type:' || {row}.media_type, {sign}, 0)
+            ON CONFLICT(key) DO UPDATE SET n = n + ({sign});
+        INSERT INTO {STATS_TABLE}(key, n, total) SELECT 'status:' || {row}.my_status, {sign}, 0 WHERE {row}.my_status IS NOT NULL
+            ON CONFLICT(key) DO UPDATE SET n = n + ({sign});
+        INSERT INTO {STATS_TABLE}(key, n, total) SELECT 'year:' || {row}.year, {sign}, 0 WHERE {row}.year IS NOT NULL
+            ON CONFLICT(key) DO UPDATE SET n = n + ({sign});
+        INSERT INTO {STATS_TABLE}(key, n, total) SELECT 'rating', {sign}, {sign} * {row}.my_rating WHERE {row}.my_rating IS NOT NULL
+            ON CONFLICT(key) DO UPDATE SET n = n + ({sign}), total = total + excluded.total;
+    """
+
+
+def rebuild_stats(engine):
+    """用聚合查询重算整张统计表"""
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {STATS_TABLE}"))
+        conn.execute(text(f"""
+            INSERT INTO {STATS_TABLE}(key, n, total)
+            SELECT 'all', COUNT(*), 0 FROM collection_items
+            UNION ALL SELECT 'type:' || media_type, COUNT(*), 0 FROM collection_items GROUP BY media_type
+            UNION ALL SELECT 'status:' || my_status, COUNT(*), 0 FROM collection_items WHERE my_status IS NOT NULL GROUP BY my_status
+            UNION ALL SELECT 'year:' || year, COUNT(*), 0 FROM collection_items WHERE year IS NOT NULL GROUP BY year
+            UNION ALL SELECT 'rating', COUNT(my_rating), COALESCE(SUM(my_rating), 0) FROM collection_items
+        """))
+
+
+def ensure_stats(engine):
+    """创建统计表与维护触发器 (已存在时跳过)，新建时回填"""
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": STATS_TABLE}
+        ).first()
+        if exists:
+            return
+        conn.execute(text(f"""
+            CREATE TABLE {STATS_TABLE} (
+                key TEXT PRIMARY KEY,
+                n INTEGER NOT NULL DEFAULT 0,
+                total REAL NOT NULL DEFAULT 0
+            )
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER {STATS_TABLE}_ai AFTER INSERT ON collection_items BEGIN
+                {_bump(1, "new")}
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER {STATS_TABLE}_ad AFTER DELETE ON collection_items BEGIN
+                {_bump(-1, "old")}
+            END
+        """))
+        # 只有参与统计的列变化时才更新
+        conn.execute(text(f"""
+            CREATE TRIGGER {STATS_TABLE}_au AFTER UPDATE OF media_type, my_status, year, my_rating ON collection_items BEGIN
+                {_bump(-1, "old")}
+                {_bump(1, "new")}
+            END
+        """))
+    rebuild_stats(engine)
+
+
+def load_dashboard(session, recent=5):
+    """读取数据分析面板所需的全部指标"""
+    counters = {key: (n, total) for key, n, total in session.execute(
+        text(f"SELECT key, n, total FROM {STATS_TABLE} WHERE n > 0")
+    )}
+
+    def group(prefix, decode):
+        return {decode(key[len(prefix):]): n for key, (n, _) in counters.items() if key.startswith(prefix)}
+
+    rated, rating_sum = counters.get("rating", (0, 0.0))
+    recent_rows = (
+        session.query(CollectionItem.title, CollectionItem.media_type, CollectionItem.my_status)
+        .order_by(CollectionItem.created_at.desc(), CollectionItem.id.desc())
+        .limit(recent)
+        .all()
+    )
+    return {
+        "total": counters.get("all", (0, 0.0))[0],
+        "avg_rating": rating_sum / rated if rated else None,
+        "done": counters.get(f"status:{CollectionStatus.DONE.name}", (0, 0.0))[0],
+        "type_counts": group("type:", lambda name: MediaType[name].value),
+        "status_counts": group("status:", lambda name: CollectionStatus[name].value),
+        "year_counts": dict(sorted(group("year:", int).items())),
+        "recent": [
+            {"title": title, "media_type": media_type.value, "my_status": status.value if status else ""}
+            for title, media_type, status in recent_rows
+        ],
+    }
@@ -0,0 +1,99 @@
+from sqlalchemy import func, select
+
+from app.core.models import CollectionItem, Tag, item_tags, parse_tags
+
+
+def rebuild_tags(engine, chunk_size=2000):
+    """根据 collection_items.my_tags 全量重建 tags / item_tags"""
+    with engine.begin() as conn:
+        conn.execute(item_tags.delete())
+        tag_ids = {name: tag_id for tag_id, name in conn.execute(select(Tag.id, Tag.name))}
+
+        rows = conn.execution_options(yield_per=chunk_size).execute(
+            select(CollectionItem.id, CollectionItem.my_tags)
+            .where(CollectionItem.my_tags.isnot(None), CollectionItem.my_tags != "")
+        )
+        for chunk in rows.partitions():
+            links = []
+            for item_id, raw in chunk:
+                for name in parse_tags(raw):
+                    if name not in tag_ids:
+                        tag_ids[name] = conn.execute(Tag.__table__.insert().values(name=name)).inserted_primary_key[0]
+                    links.append({"item_id": item_id, "tag_id": tag_ids[name]})
+            if links:
+                conn.execute(item_tags.insert(), links)
+
+        # 清理已无条目引用的标签
+        conn.execute(Tag.__table__.delete().where(~Tag.id.in_(select(item_tags.c.tag_id))))
+
+
+def migrate_tags(engine):
+    """旧数据库迁移：有 my_tags 文本但关联表为空时回填一次"""
+    with engine.connect() as conn:
+        has_links = conn.execute(select(item_tags.c.item_id).limit(1)).first()
+        has_text = conn.execute(
+            select(CollectionItem.id).where(CollectionItem.my_tags.isnot(None), CollectionItem.my_tags != "").limit(1)
+        ).first()
+    if has_text and not has_links:
+        rebuild_tags(engine)
+
+
+def set_item_tags(session, tags_by_item):
+    """
+    按 {条目 id: my_tags 文本} 重设这些条目的标签关联。
+    供绕过 ORM 的批量写入使用 (before_flush 中的同步不会触发)。
+    """
+    if not tags_by_item:
+        return
+    parsed = {item_id: parse_tags(text) for item_id, text in tags_by_item.items()}
+    names = {name for names in parsed.values() for name in names}
+    tag_ids = dict(session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all()) if names else {}
+    for name in sorted(names - tag_ids.keys()):
+        tag_ids[name] = session.execute(Tag.__table__.insert().values(name=name)).inserted_primary_key[0]
+    session.execute(item_tags.delete().where(item_tags.c.item_id.in_(list(parsed))))
+    links = [{"item_id": item_id, "tag_id": tag_ids[name]} for item_id, names in parsed.items() for name in names]
+    if links:
+        session.execute(item_tags.insert(), links)
+
+
+def tag_counts(session, limit=None):
+    """一次 GROUP BY 统计各标签的条目数，按数量倒序返回 [(标签, 数量)]"""
+    count = func.count(item_tags.c.item_id)
+    query = (
+        session.query(Tag.name, count)
+        .join(item_tags, item_tags.c.tag_id == Tag.id)
+        .group_by(Tag.id)
+        .order_by(count.desc(), Tag.name)
+    )
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def tagged_item_ids(names, mode="and"):
+    """
+    带有给定标签的条目 id 子查询。
+    mode="or" 命中任一标签即可；mode="and" 需同时带有全部标签。
+    """
+    subquery = (
+        select(item_tags.c.item_id)
+        .join(Tag, Tag.id == item_tags.c.tag_id)
+        .where(Tag.name.in_(names))
+    )
+    if mode == "and":
+        subquery = subquery.group_by(item_tags.c.item_id).having(func.count() == len(set(names)))
+    return subquery
+
+
+def tag_filter_sql(names, mode="and", column="c.id"):
+    """tagged_item_ids 的原生 SQL 版本，供 search_library 等手写 SQL 拼接，返回 (条件, 参数)"""
+    params = {f"tag_{i}": name for i, name in enumerate(names)}
+    placeholders = ", ".join(f":{key}" for key in params)
+    sql = (
+        f"{column} IN (SELECT it.item_id FROM item_tags it JOIN tags t ON t.id = it.tag_id "
+        f"WHERE t.name IN ({placeholders})"
+    )
+    if mode == "and":
+        sql += f" GROUP BY it.item_id HAVING COUNT(*) = {len(set(names))}"
+    return sql + ")", params
+
@@ -0,0 +1,118 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Referer': 'https://www.douban.com/'
+}
+
+
+class HostLimiter:
+    """单个主机的并发与速率限制：最多 concurrency 个请求同时进行，相邻请求至少间隔 min_interval 秒"""
+
+    def __init__(self, concurrency=4, min_interval=0.0):
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._min_interval = min_interval
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._slots.acquire()
+        if self._min_interval > 0:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._next_at - now
+                self._next_at = max(now, self._next_at) + self._min_interval
+            if wait > 0:
+                time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc):
+        self._slots.release()
+        return False
+
+
+class HttpClient:
+    """
+    共享的 HTTP 传输层：
+    - 基于 requests.Session 的长连接池 (避免每次请求都重新握手)
+    - 对连接错误与 429/5xx 按指数退避自动重试
+    - 按主机限制并发数与请求间隔
+    - map() 以线程池保持多个请求同时在途
+    """
+
+    def __init__(self, headers=None, timeout=10, pool_size=16, max_retries=3, backoff_factor=0.5,
+                 per_host_concurrency=4, per_host_interval=0.2):
+        self.timeout = timeout
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_interval = per_host_interval
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+
+    def _limiter(self, url):
+        host = urlparse(url).netloc
+        with self._limiters_lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = HostLimiter(self.per_host_concurrency, self.per_host_interval)
+                self._limiters[host] = limiter
+            return limiter
+
+    def get(self, url, **kwargs):
+        """发起 GET 请求 (受主机限流约束)，参数同 requests.get"""
+        kwargs.setdefault("timeout", self.timeout)
+        with self._limiter(url):
+            return self.session.get(url, **kwargs)
+
+    def map(self, fn, items, max_workers=4):
+        """并发执行 fn(item)，按输入顺序返回结果；单项异常时结果为 None"""
+        items = list(items)
+        if not items:
+            return []
+
+        def run(item):
+            try:
+                return fn(item)
+            except Exception as e:
+                print(f"并发请求失败: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+            return list(pool.map(run, items))
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    """进程内共享的 HTTP 客户端"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -0,0 +1,149 @@
+"""
+条目元数据的批量写入 (INSERT ... ON CONFLICT DO UPDATE)。
+
+每批先用三次 IN 查询把行匹配到已有条目：优先豆瓣 ID，其次 ISBN、IMDb ID
+(也可直接给出 id)；再用一条带 RETURNING 的 upsert 语句写入整批，一批一个事务。
+- 行中为 None 或缺失的字段不会覆盖已有值 (COALESCE)
+- keep_existing 中的字段只在原值为空时写入 (例如用户可能手动改过的 ISBN)
+- 检索与统计由触发器维护；my_tags 的标签关联在同一事务内同步
+- 更新时递增 version_id (乐观锁，见 app.core.edits)
+- 某一行违反约束时整批回滚到保存点，再逐行写入，只有出错的行记为失败
+返回与输入一一对应的 (结果, 条目 id)，结果为 "inserted" / "updated" / "failed"。
+"""
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.core.models import CollectionItem, CollectionStatus, MediaType
+from app.core.tags import set_item_tags
+
+BATCH_SIZE = 500
+# 可通过 upsert 写入的列 (id 用于匹配，created_at 只在新建时写入，version_id 在更新时递增)
+UPSERT_FIELDS = tuple(
+    col.name for col in CollectionItem.__table__.columns
+    if col.name not in ("id", "created_at", "updated_at", "version_id")
+)
+MATCH_KEYS = ("douban_id", "isbn", "imdb_id")
+
+
+def _coerce(row):
+    """把导入/抓取得到的字符串转换成列类型，去掉未知字段，空字符串视为 None"""
+    data = {}
+    for field in UPSERT_FIELDS:
+        value = row.get(field)
+        if value == "":
+            value = None
+        if field == "media_type" and isinstance(value, str):
+            value = MediaType(value) if value in MediaType._value2member_map_ else MediaType[value.upper()]
+        elif field == "my_status" and isinstance(value, str):
+            value = CollectionStatus(value) if value in CollectionStatus._value2member_map_ else CollectionStatus[value.upper()]
+        elif field == "year" and value is not None and not isinstance(value, int):
+            value = int(value) if str(value).isdigit() else None
+        data[field] = value
+    data["id"] = row.get("id")
+    return data
+
+
+def _match_existing(session, rows):
+    """为没有 id 的行按 豆瓣 ID > ISBN > IMDb ID 查找已有条目，原地填入 id"""
+    table = CollectionItem.__table__
+    found = {}
+    for key in MATCH_KEYS:
+        values = {row[key] for row in rows if row["id"] is None and row[key]}
+        if values:
+            found[key] = dict(session.execute(
+                select(table.c[key], table.c.id).where(table.c[key].in_(values))
+            ).all())
+    for row in rows:
+        if row["id"] is None:
+            for key in MATCH_KEYS:
+                if row[key] and row[key] in found.get(key, {}):
+                    row["id"] = found[key][row[key]]
+                    break
+
+    # SQLite 在判断冲突前就检查 NOT NULL，更新时缺少的必填字段用原值补上
+    missing = {row["id"] for row in rows if row["id"] is not None and (row["title"] is None or row["media_type"] is None)}
+    if missing:
+        current = {item_id: (title, media_type) for item_id, title, media_type in session.execute(
+            select(table.c.id, table.c.title, table.c.media_type).where(table.c.id.in_(missing))
+        )}
+        for row in rows:
+            if row["id"] in current:
+                row["title"] = row["title"] or current[row["id"]][0]
+                row["media_type"] = row["media_type"] or current[row["id"]][1]
+
+
+def _statement(keep_existing):
+    table = CollectionItem.__table__
+    stmt = insert(table)
+    update = {}
+    for field in UPSERT_FIELDS:
+        if field in keep_existing:
+            update[field] = func.coalesce(table.c[field], stmt.excluded[field])
+        else:
+            update[field] = func.coalesce(stmt.excluded[field], table.c[field])
+    update["updated_at"] = stmt.excluded.updated_at
+    # 与 ORM 的乐观锁一致：正在编辑这一条目的界面保存时能发现它已被修改
+    update["version_id"] = table.c.version_id + 1
+    return stmt.on_conflict_do_update(index_elements=[table.c.id], set_=update).returning(
+        table.c.id, sort_by_parameter_order=True
+    )
+
+
+def _write(session, rows, keep_existing):
+    """写入一组行，返回条目 id 列表 (与 rows 顺序一致)"""
+    now = datetime.now()
+    params = []
+    for row in rows:
+        data = dict(row)
+        data["updated_at"] = now
+        data["created_at"] = now
+        if data["id"] is None and data["my_status"] is None:
+            data["my_status"] = CollectionStatus.WISH
+        params.append(data)
+    ids = [item_id for item_id, in session.execute(_statement(keep_existing), params)]
+    set_item_tags(session, {item_id: row["my_tags"] for item_id, row in zip(ids, rows) if row["my_tags"] is not None})
+    return ids
+
+
+def bulk_upsert(session, rows, keep_existing=(), batch_size=BATCH_SIZE, commit=True):
+    """
+    批量写入元数据字典 (字段名同 CollectionItem 的列)。
+    commit=False 时不提交，由调用方与其他写入放在同一事务中。
+    """
+    keep_existing = frozenset(keep_existing)
+    outcomes = []
+    for offset in range(0, len(rows), batch_size):
+        batch = [_coerce(row) for row in rows[offset:offset + batch_size]]
+        _match_existing(session, batch)
+        statuses = ["updated" if row["id"] is not None else "inserted" for row in batch]
+
+        # 同一批中重复的条目 (匹配到同一 id 或同一豆瓣 ID) 只写最后一次
+        last = {}
+        for i, row in enumerate(batch):
+            key = ("id", row["id"]) if row["id"] is not None else ("douban_id", row["douban_id"] or i)
+            last[key] = i
+        unique = sorted(last.values())
+
+        ids = {}
+        try:
+            with session.begin_nested():
+                ids.update(zip(unique, _write(session, [batch[i] for i in unique], keep_existing)))
+        except IntegrityError:
+            # 逐行重试，只让违反约束的行失败
+            for i in unique:
+                try:
+                    with session.begin_nested():
+                        ids[i] = _write(session, [batch[i]], keep_existing)[0]
+                except IntegrityError as e:
+                    print(f"写入条目失败 ({batch[i].get('title')}): {e.orig}")
+
+        for i, row in enumerate(batch):
+            key = ("id", row["id"]) if row["id"] is not None else ("douban_id", row["douban_id"] or i)
+            item_id = ids.get(last[key])
+            outcomes.append((statuses[i] if item_id is not None else "failed", item_id))
+        if commit:
+            session.commit()
+    return outcomes
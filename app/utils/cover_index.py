@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+
+COVER_DIR = "data/covers"
+# 同一标识符存在多种格式时按此顺序优先
+COVER_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+
+class CoverIndex:
+    """
+    本地封面文件索引：一次目录扫描建立 标识符 -> 路径 的映射，
+    之后只在目录修改时间变化时重新扫描，避免逐条目调用 os.path.exists。
+    """
+
+    def __init__(self, cover_dir=COVER_DIR, check_interval=1.0):
+        self.cover_dir = os.path.normpath(cover_dir)
+        self.check_interval = check_interval  # 两次检查目录 mtime 的最小间隔 (秒)
+        self._by_id = {}
+        self._paths = set()
+        self._dir_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """目录有变化时重建索引，开销通常只是一次 stat"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.cover_dir).st_mtime_ns
+        except OSError:
+            mtime = None
+        if not force and mtime == self._dir_mtime:
+            return
+
+        by_id, paths = {}, set()
+        if mtime is not None:
+            for entry in os.scandir(self.cover_dir):
+                stem, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if ext not in COVER_EXTS or not entry.is_file():
+                    continue
+                path = os.path.join(self.cover_dir, entry.name)
+                paths.add(path)
+                current = by_id.get(stem)
+                if current is None or COVER_EXTS.index(ext) < COVER_EXTS.index(os.path.splitext(current)[1].lower()):
+                    by_id[stem] = path
+
+        with self._lock:
+            self._by_id, self._paths, self._dir_mtime = by_id, paths, mtime
+
+    def add(self, path):
+        """登记刚写入的封面 (无需等待下一次扫描)"""
+        if not path:
+            return
+        path = os.path.normpath(path)
+        if os.path.dirname(path) != self.cover_dir:
+            return
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with self._lock:
+            self._paths.add(path)
+            self._by_id.setdefault(stem, path)
+
+    def exists(self, path):
+        """判断封面路径是否存在；索引目录之外的路径才回退到 os.path.exists"""
+        if not path:
+            return False
+        path = os.path.normpath(path)
+        if os.path.dirname(path) == self.cover_dir:
+            self.refresh()
+            return path in self._paths
+        return os.path.exists(path)
+
+    def find(self, *identifiers):
+        """按顺序查找第一个有本地封面的标识符"""
+        self.refresh()
+        for identifier in identifiers:
+            if identifier and identifier in self._by_id:
+                return self._by_id[identifier]
+        return None
+
+    def resolve(self, item):
+        """条目的本地封面：优先数据库记录的路径，其次按 ISBN/IMDb/豆瓣 ID 匹配"""
+        if self.exists(item.local_cover_path):
+            return item.local_cover_path
+        return self.find(item.isbn, item.imdb_id, item.douban_id)
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_cover_index():
+    """进程内共享的封面索引"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = CoverIndex()
+        return _default_index
@@ -0,0 +1,185 @@
+"""
+按内容寻址的封面存储。
+
+- 下载按块流式写入临时文件，超过 MAX_COVER_BYTES 即放弃，校验图片文件头后原子重命名
+- 文件内容只保存一份：data/covers/.blobs/<sha256>.<ext>
+- data/covers/<标识符>.<ext> 是指向该文件的硬链接 (文件系统不支持时退回复制)，
+  同一张海报按 ISBN、IMDb、豆瓣 ID 命名也不占额外空间
+- gc() 删除已没有任何标识符引用的内容文件 (链接数为 1)
+写入过程中崩溃只会留下临时文件，不会出现被当作有效封面的半截文件。
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from app.core.transport import get_client
+
+COVER_DIR = "data/covers"
+BLOB_DIRNAME = ".blobs"
+MAX_COVER_BYTES = 10 * 1024 * 1024  # 单张封面上限 10MB
+CHUNK_SIZE = 64 * 1024
+TMP_MAX_AGE = 3600  # 秒，gc 时清理超过该时间的残留临时文件
+
+
+def sniff_image(head):
+    """根据文件头判断图片格式，返回扩展名；不是支持的图片时返回 None"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def is_valid_cover(path):
+    """文件存在、非空且文件头是图片"""
+    try:
+        with open(path, "rb") as f:
+            return sniff_image(f.read(12)) is not None
+    except OSError:
+        return False
+
+
+class CoverStore:
+    """封面内容存储，见模块说明"""
+
+    def __init__(self, cover_dir=COVER_DIR, max_bytes=MAX_COVER_BYTES):
+        self.cover_dir = cover_dir
+        self.blob_dir = os.path.join(cover_dir, BLOB_DIRNAME)
+        self.max_bytes = max_bytes
+
+    def _tmp_path(self):
+        os.makedirs(self.blob_dir, exist_ok=True)
+        return os.path.join(self.blob_dir, f".tmp-{os.getpid()}-{threading.get_ident()}-{uuid.uuid4().hex[:8]}")
+
+    def _blob_path(self, digest, ext):
+        return os.path.join(self.blob_dir, digest + ext)
+
+    def _commit_blob(self, tmp_path, digest, ext):
+        """把已写完的临时文件放到内容地址上 (内容已存在时丢弃临时文件)"""
+        blob_path = self._blob_path(digest, ext)
+        if os.path.exists(blob_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, blob_path)
+        return blob_path
+
+    def download(self, url, client=None, timeout=15):
+        """流式下载到内容存储，返回内容文件路径；失败、过大或不是图片时抛出异常"""
+        tmp_path = self._tmp_path()
+        response = (client or get_client()).get(url, timeout=timeout, stream=True)
+        try:
+            if response.status_code != 200:
+                raise ValueError(f"HTTP {response.status_code}")
+            length = response.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                raise ValueError(f"封面过大 ({length} 字节)")
+
+            digest, size, ext = hashlib.sha256(), 0, None
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if ext is None:
+                        ext = sniff_image(chunk[:12])
+                        if ext is None:
+                            raise ValueError("不是有效的图片")
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f"封面超过 {self.max_bytes} 字节")
+                    digest.update(chunk)
+                    f.write(chunk)
+            if ext is None:
+                raise ValueError("响应为空")
+            return self._commit_blob(tmp_path, digest.hexdigest(), ext)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            response.close()
+
+    def ingest(self, path):
+        """把已有的本地图片放入内容存储 (原文件不变)，返回内容文件路径；不是图片时返回 None"""
+        with open(path, "rb") as f:
+            ext = sniff_image(f.read(12))
+            if ext is None:
+                return None
+            f.seek(0)
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        blob_path = self._blob_path(digest.hexdigest(), ext)
+        if not os.path.exists(blob_path):
+            tmp_path = self._tmp_path()
+            shutil.copyfile(path, tmp_path)
+            self._commit_blob(tmp_path, digest.hexdigest(), ext)
+        return blob_path
+
+    def link(self, blob_path, identifier, ext=None):
+        """让 data/covers/<identifier>.<ext> 指向内容文件 (原子替换)，返回该路径"""
+        ext = ext or os.path.splitext(blob_path)[1]
+        name = os.path.join(self.cover_dir, f"{identifier}{ext}")
+        if os.path.exists(name) and os.path.samefile(name, blob_path):
+            return name
+        tmp_path = self._tmp_path()
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            shutil.copyfile(blob_path, tmp_path)  # 不支持硬链接的文件系统
+        os.replace(tmp_path, name)
+        return name
+
+    def adopt_existing(self):
+        """把封面目录中已有的独立文件并入内容存储 (相同内容只保留一份)，返回处理的文件数"""
+        adopted = 0
+        if not os.path.isdir(self.cover_dir):
+            return adopted
+        for entry in os.scandir(self.cover_dir):
+            if not entry.is_file() or entry.name.startswith(".") or entry.stat().st_nlink > 1:
+                continue
+            stem, ext = os.path.splitext(entry.name)
+            blob_path = self.ingest(entry.path)
+            if blob_path:
+                # 保持原文件名不变，数据库中记录的路径依然有效
+                self.link(blob_path, stem, ext=ext)
+                adopted += 1
+        return adopted
+
+    def gc(self):
+        """删除没有任何标识符引用的内容文件与残留临时文件，返回 (删除数, 释放字节数)"""
+        removed, freed = 0, 0
+        if not os.path.isdir(self.blob_dir):
+            return removed, freed
+        now = time.time()
+        for entry in os.scandir(self.blob_dir):
+            st = entry.stat()
+            if entry.name.startswith(".tmp-"):
+                stale = now - st.st_mtime > TMP_MAX_AGE
+            else:
+                stale = st.st_nlink <= 1
+            if stale:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                removed += 1
+                freed += st.st_size
+        return removed, freed
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_cover_store():
+    """进程内共享的封面存储"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = CoverStore()
+        return _default_store
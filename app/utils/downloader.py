@@ -1,48 +1,54 @@
-import requests
 import os
 import hashlib
-from urllib.parse import urlparse
+from app.core.metrics import timed
+from app.core.transport import get_client
+from app.utils.cover_index import COVER_EXTS
+from app.utils.cover_store import CoverStore, is_valid_cover
 
-def download_cover(url, save_dir="data/covers", identifier=None):
+@timed("download_cover")
+def download_cover(url, save_dir="data/covers", identifier=None, client=None, aliases=()):
     """
     下载封面图并返回本地相对路径。
     优先使用 identifier (如 ISBN/IMDb ID) 作为文件名，
     如果没有 identifier，则使用 URL 的哈希值。
+    aliases 中的其他标识符 (如豆瓣 ID) 链接到同一份文件，不重复占用空间。
+    内容按哈希保存并原子写入，见 app.utils.cover_store。
     """
     if not url or not url.startswith("http"):
         return None
         
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
+    os.makedirs(save_dir, exist_ok=True)
         
     try:
-        # 确定文件名
-        ext = os.path.splitext(urlparse(url).path)[-1]
-        if not ext or len(ext) > 5: ext = ".jpg" # 处理异常后缀
+        # 确定文件名 (扩展名由图片实际格式决定)
+        name = identifier or hashlib.md5(url.encode()).hexdigest()
         
-        if identifier:
-            filename = f"{identifier}{ext}"
-        else:
-            filename = hashlib.md5(url.encode()).hexdigest() + ext
+        # 如果已有有效的封面则直接返回
+        for ext in COVER_EXTS:
+            local_path = os.path.join(save_dir, f"{name}{ext}")
+            if is_valid_cover(local_path):
+                return local_path
             
-        local_path = os.path.join(save_dir, filename)
-        
-        # 如果文件已存在则直接返回
-        if os.path.exists(local_path):
-            return local_path
-            
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Referer': 'https://www.douban.com/'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=15)
-        if response.status_code == 200:
-            with open(local_path, 'wb') as f:
-                f.write(response.content)
-            return local_path
-        return None
+        store = CoverStore(save_dir)
+        blob_path = store.download(url, client=client or get_client())
+        local_path = store.link(blob_path, name)
+        for alias in aliases:
+            if alias and alias != name:
+                store.link(blob_path, alias)
+        return local_path
     except Exception as e:
         print(f"下载封面失败: {e}")
         return None
 
+
+def download_covers(jobs, save_dir="data/covers", max_workers=4, client=None):
+    """
+    并发下载多张封面。jobs 为 (url, identifier) 列表，
+    按输入顺序返回本地路径 (失败项为 None)。
+    """
+    client = client or get_client()
+    return client.map(
+        lambda job: download_cover(job[0], save_dir=save_dir, identifier=job[1], client=client),
+        jobs,
+        max_workers=max_workers
+    )
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 未安装时直接使用原图
+    Image = None
+
+# 缩略图规格：网格墙约 240px 宽，详情页稍大
+THUMB_SIZES = {
+    "grid": (240, 360),
+    "detail": (600, 900),
+}
+THUMB_DIR = "data/covers/.thumbs"
+THUMB_CACHE_LIMIT = 200 * 1024 * 1024  # 缓存目录上限 200MB
+THUMB_QUALITY = 80
+THUMB_VERIFY_INTERVAL = 60  # 同一缩略图两次校验原图 mtime 的最小间隔 (秒)
+
+
+class ThumbnailCache:
+    """
+    有容量上限的 WebP 缩略图磁盘缓存。
+    访问顺序只在内存中维护 (启动时按文件修改时间初始化)，超出上限时淘汰最久未用的文件。
+    """
+
+    def __init__(self, cache_dir=THUMB_DIR, max_bytes=THUMB_CACHE_LIMIT):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # 路径 -> 文件大小，越靠后越新
+        self._total = 0
+        self._verified = {}  # 缩略图路径 -> 上次确认未过期的时间
+        self._lock = threading.Lock()
+        self._scan()
+
+    def _scan(self):
+        """一次目录扫描建立 LRU 初始顺序"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".webp"):
+                st = entry.stat()
+                found.append((st.st_mtime, entry.path, st.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._total += size
+        self._evict()
+
+    def _thumb_path(self, src_path, size):
+        stem = os.path.splitext(os.path.basename(src_path))[0]
+        return os.path.join(self.cache_dir, f"{stem}_{size}.webp")
+
+    def get(self, src_path, size="grid"):
+        """返回 src_path 对应规格的缩略图路径，必要时即时生成；失败时退回原图"""
+        if Image is None or not src_path or size not in THUMB_SIZES:
+            return src_path
+
+        thumb_path = self._thumb_path(src_path, size)
+        now = time.monotonic()
+        with self._lock:
+            cached = thumb_path in self._entries
+            if cached:
+                self._entries.move_to_end(thumb_path)
+                # 近期校验过的缩略图直接返回，不再访问文件系统
+                if now - self._verified.get(thumb_path, float("-inf")) < THUMB_VERIFY_INTERVAL:
+                    return thumb_path
+
+        try:
+            # 原图被替换 (例如手动同步了高清封面) 后需要重新生成
+            if not (cached and os.path.getmtime(thumb_path) >= os.path.getmtime(src_path)):
+                thumb_path = self._generate(src_path, thumb_path, size)
+            self._verified[thumb_path] = now
+            return thumb_path
+        except Exception as e:
+            print(f"生成缩略图失败: {e}")
+            return src_path
+
+    def _generate(self, src_path, thumb_path, size):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        with Image.open(src_path) as img:
+            img = img.convert("RGB")
+            img.thumbnail(THUMB_SIZES[size], Image.LANCZOS)
+            tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, "WEBP", quality=THUMB_QUALITY, method=4)
+        os.replace(tmp_path, thumb_path)
+
+        new_size = os.path.getsize(thumb_path)
+        with self._lock:
+            self._total -= self._entries.pop(thumb_path, 0)
+            self._entries[thumb_path] = new_size
+            self._total += new_size
+            self._evict()
+        return thumb_path
+
+    def _evict(self):
+        """淘汰最久未访问的缩略图直到低于上限 (调用方持有锁)"""
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total -= size
+            self._verified.pop(path, None)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def generate_many(self, src_paths, sizes=("grid",), max_workers=4):
+        """批量预生成缩略图，返回成功生成的数量"""
+        jobs = [(p, s) for p in src_paths for s in sizes]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(lambda job: self.get(*job), jobs))
+        return sum(1 for (src, _), out in zip(jobs, results) if out != src)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """进程内共享的缩略图缓存"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ThumbnailCache()
+        return _default_cache
+
+
+def get_thumbnail(src_path, size="grid"):
+    """获取封面缩略图路径 (远程 URL 原样返回)"""
+    if not src_path or src_path.startswith("http"):
+        return src_path
+    return get_thumbnail_cache().get(src_path, size)
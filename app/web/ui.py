@@ -1,10 +1,26 @@
 import streamlit as st
-from app.core.models import init_db, get_session, CollectionItem, MediaType, CollectionStatus
+from app.core.models import CollectionItem, MediaType, CollectionStatus
+from app.core.db import get_session_factory, get_scoped_session, library_version, run_write
+from app.core.edits import snapshot, save_edit, delete_item, EditConflict
+from app.core.queries import filtered_query, keyset_page, count_rows, offset_page, GRID_COLUMNS, TABLE_COLUMNS
+from app.core.search import search_library
+from app.core.tags import tag_counts
+from app.core.stats import load_dashboard
+from app.core.jobs import get_worker, enqueue, job_counts, retry_failed, JOB_ENRICH, JOB_COVER
+from app.core.prefetch import get_prefetcher, link_cover
+from app.core.refresh import detail_row, FILL_FIELDS
+from app.core.upsert import bulk_upsert
+from app.core.dedup import find_matches, find_duplicate_groups, refresh_keys
+from app.core.similar import get_similar_index, describe, recommend_wishlist
 from app.core.fetcher import DoubanFetcher
-from app.utils.downloader import download_cover
+from app.core.metrics import timed, begin_collect, end_collect, slow_queries, maybe_write_prometheus
+from app.utils.thumbnails import get_thumbnail
+from app.utils.cover_index import get_cover_index
 import pandas as pd
 from datetime import datetime
+import html
 import os
+import uuid
 
 # --- 页面配置 ---
 st.set_page_config(
@@ -13,6 +29,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# 收集本次重跑各环节 (SQL、查询、抓取) 的耗时，显示在侧边栏底部的调试面板
+rerun_timing = begin_collect()
+
 # --- 核心设计系统 (CSS) ---
 st.markdown("""
 <style>
@@ -117,16 +136,183 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# --- 数据库初始化 ---
-engine = init_db()
-session = get_session(engine)
+# 网格视图每页条数 (6 列 x 6 行)
+GRID_PAGE_SIZE = 36
+# 本地检索最多展示的结果数
+SEARCH_LIMIT = 60
+# 表格视图每页条数与可排序的列
+TABLE_PAGE_SIZE = 100
+TABLE_SORTS = {
+    "录入时间": CollectionItem.created_at,
+    "更新时间": CollectionItem.updated_at,
+    "标题": CollectionItem.title,
+    "我的评分": CollectionItem.my_rating,
+    "类型": CollectionItem.media_type,
+    "状态": CollectionItem.my_status,
+    "ID": CollectionItem.id,
+}
+# 标签筛选下拉框与标签云展示的标签数
+TAG_OPTIONS_LIMIT = 300
+TAG_CLOUD_SIZE = 50
+# 每个查询缓存保留的结果数 (旧版本号的结果会被逐步挤出)
+QUERY_CACHE_ENTRIES = 64
+# 有后台任务未完成时，侧边栏任务状态的刷新间隔 (秒)
+JOB_STATUS_REFRESH = 3
+# 点击入库时等待未完成的预取的最长时间 (秒)，超时则照旧由后台任务补全
+PREFETCH_WAIT = 1.0
+# 编辑冲突提示中的字段名
+EDIT_FIELD_LABELS = {
+    "my_status": "收藏状态", "my_rating": "我的评分", "my_tags": "标签", "my_comment": "短评",
+    "isbn": "ISBN", "imdb_id": "IMDb ID", "douban_id": "豆瓣 ID", "local_cover_path": "封面",
+}
+# 编辑侧边栏的“更多相似”条数与数据分析页的推荐条数
+SIMILAR_COUNT = 6
+RECOMMEND_COUNT = 10
+
+# --- 数据库 ---
+# 引擎与会话工厂在进程内只初始化一次；读查询以库版本号为键缓存，
+# 只切换控件的重跑不访问数据库，任何一次提交都会让版本号变化
+Session = get_session_factory()
+# 本次重跑使用的会话：Streamlit 每个浏览器会话的重跑在各自的线程中执行，按线程隔离；
+# 先关闭同一线程中上次被 st.rerun 中断、没有走到页面末尾的会话。写入都经 run_write 在短事务中完成
+session = get_scoped_session()
+session.remove()
+cover_index = get_cover_index()
+worker = get_worker()
+prefetcher = get_prefetcher()
+similar_index = get_similar_index()  # 未安装 numpy / scipy 时为 None
+version = library_version()
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+@timed("query:total")
+def cached_total(version):
+    with Session() as s:
+        return s.query(CollectionItem).count()
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+@timed("query:job_counts")
+def cached_job_counts(version):
+    with Session() as s:
+        return job_counts(s)
+
+
+def render_job_status():
+    """侧边栏的后台任务状态；任务全部结束时整页刷新以显示补全后的封面与信息"""
+    counts = cached_job_counts(library_version())
+    active = counts.get("pending", 0) + counts.get("running", 0)
+    failed = counts.get("failed", 0)
+    if active:
+        st.caption(f"⏳ 后台任务：{active} 个处理中")
+    elif st.session_state.get('jobs_active'):
+        st.session_state['jobs_active'] = False
+        st.rerun()
+    st.session_state['jobs_active'] = bool(active)
+    if failed:
+        st.caption(f"⚠️ {failed} 个后台任务失败")
+        if st.button("🔁 重试失败任务", key="retry_jobs"):
+            with Session() as s:
+                retry_failed(s)
+                s.commit()
+            worker.wake()
+            st.rerun()
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+@timed("query:tag_counts")
+def cached_tag_counts(version, limit):
+    with Session() as s:
+        return [tuple(row) for row in tag_counts(s, limit=limit)]
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+@timed("query:grid_page")
+def cached_grid_page(version, media_type, status, tags, tag_mode, cursor):
+    with Session() as s:
+        query = filtered_query(s, media_type=media_type, status=status, tags=list(tags), tag_mode=tag_mode, columns=GRID_COLUMNS)
+        return keyset_page(query, cursor=cursor, limit=GRID_PAGE_SIZE)
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+@timed("query:search")
+def cached_search(version, text, media_type, status, tags, tag_mode):
+    with Session() as s:
+        return search_library(
+            s, text, media_type=media_type, status=status, tags=list(tags),
+            tag_mode=tag_mode, limit=SEARCH_LIMIT, columns=GRID_COLUMNS
+        )
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+@timed("query:table_count")
+def cached_table_count(version, media_type, status, tags, tag_mode):
+    with Session() as s:
+        return count_rows(filtered_query(s, media_type=media_type, status=status, tags=list(tags), tag_mode=tag_mode))
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+@timed("query:table_page")
+def cached_table_page(version, media_type, status, tags, tag_mode, sort_by, descending, page):
+    with Session() as s:
+        query = filtered_query(s, media_type=media_type, status=status, tags=list(tags), tag_mode=tag_mode, columns=TABLE_COLUMNS)
+        return [
+            {
+                "ID": item.id,
+                "标题": item.title,
+                "类型": item.media_type.value,
+                "书号/IMDb": item.isbn or item.imdb_id or "-",
+                "豆瓣ID": item.douban_id or "-",
+                "我的评分": item.my_rating,
+                "状态": item.my_status.value,
+                "笔记/评价": item.my_comment or "",
+                "更新时间": item.updated_at.strftime("%Y-%m-%d")
+            }
+            for item in offset_page(query, TABLE_SORTS[sort_by], descending, page, TABLE_PAGE_SIZE)
+        ]
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+@timed("query:dashboard")
+def cached_dashboard(version):
+    with Session() as s:
+        return load_dashboard(s)
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+@timed("query:duplicates")
+def cached_duplicates(version):
+    with Session() as s:
+        return find_duplicate_groups(s)
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES, show_spinner=False)
+@timed("query:similar")
+def cached_similar(version, item_id):
+    with Session() as s:
+        similar_index.sync(s)
+        return describe(s, similar_index.similar_to(item_id, k=SIMILAR_COUNT))
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+@timed("query:recommend")
+def cached_recommendations(version):
+    with Session() as s:
+        similar_index.sync(s)
+        return describe(s, recommend_wishlist(s, similar_index, k=RECOMMEND_COUNT))
+
 
 # --- 侧边栏：导航与统计 ---
 with st.sidebar:
     st.title("🍃 BeanStash")
     
-    total_count = session.query(CollectionItem).count()
+    total_count = cached_total(version)
     st.write(f"📊 当前总藏品：**{total_count}**")
+
+    # 有任务在执行时定时刷新这一小块，其余页面不重跑
+    job_counts_now = cached_job_counts(version)
+    job_active = job_counts_now.get("pending", 0) + job_counts_now.get("running", 0)
+    st.fragment(run_every=JOB_STATUS_REFRESH if job_active else None)(render_job_status)()
     
     menu = st.radio(
         "导航", 
@@ -141,15 +327,26 @@ with st.sidebar:
         st.markdown("### ⚙️ 管理")
 
         item_id = st.session_state['editing_item_id']
-        item_to_edit = session.query(CollectionItem).filter(CollectionItem.id == item_id).first()
+        item_to_edit = session.get(CollectionItem, item_id)
         
         if item_to_edit:
             st.info(f"正在编辑：《{item_to_edit.title}》")
 
+            # 表单以开始编辑时的原值为初值 (他人同时修改不会换掉正在改的内容)，保存时只写改动过的字段
+            edit_base = st.session_state.get('edit_base')
+            if not edit_base or edit_base['id'] != item_to_edit.id:
+                edit_base = st.session_state['edit_base'] = snapshot(item_to_edit)
+                st.session_state.pop('edit_conflict', None)
+            original = edit_base['fields']
+
+            # 详情面板加载原图
+            if cover_index.exists(item_to_edit.local_cover_path):
+                st.image(item_to_edit.local_cover_path, use_container_width=True)
+
             # 状态编辑
             status_map = ["想看/想听/想读", "在看/在听/在读", "看过/听过/读过"]
             try:
-                current_idx = status_map.index(item_to_edit.my_status.value)
+                current_idx = status_map.index(original['my_status'].value)
             except:
                 current_idx = 0
                 
@@ -160,26 +357,26 @@ with st.sidebar:
             with st.expander("📁 资源编码", expanded=False):
 
                 if item_to_edit.media_type == MediaType.BOOK:
-                    temp_isbn = st.text_input("ISBN (书号)", value=item_to_edit.isbn or "")
+                    temp_isbn = st.text_input("ISBN (书号)", value=original['isbn'] or "")
                 else:
-                    temp_isbn = item_to_edit.isbn
+                    temp_isbn = original['isbn']
                     
                 if item_to_edit.media_type == MediaType.MOVIE:
-                    temp_imdb = st.text_input("IMDb ID", value=item_to_edit.imdb_id or "")
+                    temp_imdb = st.text_input("IMDb ID", value=original['imdb_id'] or "")
                 else:
-                    temp_imdb = item_to_edit.imdb_id
+                    temp_imdb = original['imdb_id']
                 
-                temp_douban = st.text_input("豆瓣 ID", value=item_to_edit.douban_id or "")
+                temp_douban = st.text_input("豆瓣 ID", value=original['douban_id'] or "")
                 st.caption("注：修改后需点击上方“保存修改”以生效")
 
             # 评分
-            new_rating = st.slider("我的评分", 0.0, 5.0, float(item_to_edit.my_rating or 0.0), 0.5)
+            new_rating = st.slider("我的评分", 0.0, 5.0, float(original['my_rating'] or 0.0), 0.5)
             
             # 标签
-            new_tags = st.text_input("标签 (逗号分隔)", value=item_to_edit.my_tags or "")
+            new_tags = st.text_input("标签 (逗号分隔)", value=original['my_tags'] or "")
             
             # --- 评论功能 (核心) ---
-            new_comment = st.text_area("短评 & 个人笔记", value=item_to_edit.my_comment or "", height=200)
+            new_comment = st.text_area("短评 & 个人笔记", value=original['my_comment'] or "", height=200)
             
             # --- 3. 操作按钮 (极致紧凑图标行) ---
             st.markdown("""
@@ -202,43 +399,76 @@ with st.sidebar:
             </style>
             """, unsafe_allow_html=True)
             
+            map_rev = {"想看/想听/想读": CollectionStatus.WISH, "在看/在听/在读": CollectionStatus.DOING, "看过/听过/读过": CollectionStatus.DONE}
+            edit_values = {
+                "isbn": temp_isbn or None,
+                "imdb_id": temp_imdb or None,
+                "douban_id": temp_douban or None,
+                "my_status": map_rev[new_status],
+                "my_rating": new_rating,
+                "my_tags": new_tags,
+                "my_comment": new_comment,
+            }
+            if not cover_index.exists(original['local_cover_path']):
+                potential_path = cover_index.find(edit_values['isbn'], edit_values['imdb_id'], edit_values['douban_id'])
+                if potential_path: edit_values['local_cover_path'] = potential_path
+
+            def save_current(force=False):
+                """保存；他人已改过同一字段时记下冲突，由下方提示让用户选择"""
+                try:
+                    save_edit(edit_base, edit_values, force=force)
+                except EditConflict as e:
+                    st.session_state['edit_conflict'] = e
+                    return
+                st.session_state.pop('edit_base', None)
+                st.session_state.pop('edit_conflict', None)
+                st.rerun()
+
             row_cols = st.columns(3)
             with row_cols[0]:
                 if st.button("💾保存", use_container_width=True):
-                    map_rev = {"想看/想听/想读": CollectionStatus.WISH, "在看/在听/在读": CollectionStatus.DOING, "看过/听过/读过": CollectionStatus.DONE}
-                    item_to_edit.isbn = temp_isbn
-                    item_to_edit.imdb_id = temp_imdb
-                    item_to_edit.douban_id = temp_douban
-                    item_to_edit.my_status = map_rev[new_status]
-                    item_to_edit.my_rating = new_rating
-                    item_to_edit.my_tags = new_tags
-                    item_to_edit.my_comment = new_comment
-                    item_to_edit.updated_at = datetime.now()
-                    if not item_to_edit.local_cover_path or not os.path.exists(item_to_edit.local_cover_path):
-                        identifier = item_to_edit.isbn or item_to_edit.imdb_id or item_to_edit.douban_id
-                        if identifier:
-                            potential_path = f"data/covers/{identifier}.jpg"
-                            if os.path.exists(potential_path): item_to_edit.local_cover_path = potential_path
-                    session.commit()
-                    st.success("已保存")
-                    st.rerun()
+                    save_current()
             
             with row_cols[1]:
                 if st.button("✖️退出", use_container_width=True):
                     del st.session_state['editing_item_id']
+                    st.session_state.pop('edit_base', None)
                     st.rerun()
 
             with row_cols[2]:
                 if st.button("🗑️删除", use_container_width=True):
-                    session.delete(item_to_edit)
-                    session.commit()
+                    delete_item(item_to_edit.id)
                     del st.session_state['editing_item_id']
+                    st.session_state.pop('edit_base', None)
                     st.rerun()
 
-
-
-
-
+            conflict = st.session_state.get('edit_conflict')
+            if conflict:
+                if conflict.deleted:
+                    st.warning("这一条目已被删除")
+                else:
+                    lines = [f"- {EDIT_FIELD_LABELS.get(field, field)}：{value if value not in (None, '') else '(空)'}" for field, value in conflict.fields.items()]
+                    st.warning("保存前这一条目已被修改，以下字段的当前值与你的修改不同：\n" + "\n".join(lines))
+                    col_mine, col_theirs = st.columns(2)
+                    with col_mine:
+                        if st.button("以我的为准", key="edit_force", use_container_width=True):
+                            save_current(force=True)
+                    with col_theirs:
+                        if st.button("放弃我的修改", key="edit_reload", use_container_width=True):
+                            st.session_state.pop('edit_base', None)
+                            st.session_state.pop('edit_conflict', None)
+                            st.rerun()
+
+            # 按流派、标签、主创与年代计算的相似条目，点击切换到该条目
+            if similar_index is not None:
+                similar_items = cached_similar(version, item_to_edit.id)
+                if similar_items:
+                    st.caption("🔗 更多相似")
+                    for other in similar_items:
+                        label = f"{other['title']} ({other['year'] or '-'}) · {other['score']:.2f}"
+                        if st.button(label, key=f"similar_{other['id']}", use_container_width=True):
+                            st.session_state['editing_item_id'] = other['id']
+                            st.rerun()
 
         else:
             del st.session_state['editing_item_id']
@@ -247,6 +477,9 @@ with st.sidebar:
 if menu == "🏛️ 我的私藏":
     st.header("我的书影音库")
     
+    # 本地全文检索
+    search_text = st.text_input("🔍 搜索我的收藏", placeholder="标题、简介、笔记、标签、作者、导演、演员...").strip()
+
     # 筛选与视图切换
     col_f1, col_f2, col_v = st.columns([1, 1, 1])
     with col_f1:
@@ -256,83 +489,95 @@ if menu == "🏛️ 我的私藏":
     with col_v:
         view_mode = st.radio("视图模式", ["🗂️ 封面网格", "📑 数据库表格"], horizontal=True)
     
-    # 查询
-    query = session.query(CollectionItem)
-    if type_filter != "全部":
-        type_map = {"电影": MediaType.MOVIE, "书籍": MediaType.BOOK, "音乐": MediaType.MUSIC}
-        query = query.filter(CollectionItem.media_type == type_map[type_filter])
-    if status_filter != "全部":
-        status_map_rev = {"想看/想听/想读": CollectionStatus.WISH, "在看/在听/在读": CollectionStatus.DOING, "看过/听过/读过": CollectionStatus.DONE}
-        query = query.filter(CollectionItem.my_status == status_map_rev[status_filter])
+    # 标签筛选与标签云 (一次 GROUP BY 统计)
+    tag_stats = cached_tag_counts(version, TAG_OPTIONS_LIMIT)
+    col_t1, col_t2 = st.columns([2, 1])
+    with col_t1:
+        tag_filter = st.multiselect("标签", [name for name, _ in tag_stats])
+    with col_t2:
+        tag_mode = "and" if st.radio("标签匹配", ["全部满足", "任一满足"], horizontal=True) == "全部满足" else "or"
+    if tag_stats:
+        with st.expander("🏷️ 标签云", expanded=False):
+            top_count = tag_stats[0][1]
+            cloud = " ".join(
+                f'<span style="font-size:{0.8 + 1.2 * count / top_count:.2f}rem; margin-right:0.6rem; color:#6a994e;">{html.escape(name)}<sup style="color:#aaa;">{count}</sup></span>'
+                for name, count in tag_stats[:TAG_CLOUD_SIZE]
+            )
+            st.markdown(cloud, unsafe_allow_html=True)
     
-    items = query.order_by(CollectionItem.created_at.desc()).all()
+    # 查询
+    type_map = {"电影": MediaType.MOVIE, "书籍": MediaType.BOOK, "音乐": MediaType.MUSIC}
+    status_map_rev = {"想看/想听/想读": CollectionStatus.WISH, "在看/在听/在读": CollectionStatus.DOING, "看过/听过/读过": CollectionStatus.DONE}
+    filters = (type_map.get(type_filter), status_map_rev.get(status_filter), tuple(tag_filter), tag_mode)
     
-    if not items:
-        st.info("库中还没有藏品，请先去录入吧！")
+    if search_text:
+        # 检索结果按相关度排序，只展示前 SEARCH_LIMIT 条，不分页
+        items = cached_search(version, search_text, *filters)
     elif view_mode == "📑 数据库表格":
-        # 数据表视图
-        data = []
-        for item in items:
-            data.append({
-                "ID": item.id,
-                "标题": item.title,
-                "类型": item.media_type.value,
-                "书号/IMDb": item.isbn or item.imdb_id or "-",
-                "豆瓣ID": item.douban_id or "-",
-                "我的评分": item.my_rating,
-                "状态": item.my_status.value,
-                "笔记/评价": item.my_comment or "",
-                "更新时间": item.updated_at.strftime("%Y-%m-%d")
-            })
-        
-        df = pd.DataFrame(data)
-        
-        # 分页逻辑
-        items_per_page = 100
-        total_items = len(df)
-        total_pages = (total_items - 1) // items_per_page + 1 if total_items > 0 else 1
-        
-        col_p1, col_p2 = st.columns([1, 4])
+        # 表格只查询当前页与展示的列，总数来自 COUNT，排序在 SQL 中完成
+        total_items = cached_table_count(version, *filters)
+        total_pages = (total_items - 1) // TABLE_PAGE_SIZE + 1 if total_items > 0 else 1
+
+        col_s1, col_s2, col_p1, col_p2 = st.columns([1, 1, 1, 3])
+        with col_s1:
+            sort_by = st.selectbox("排序", list(TABLE_SORTS))
+        with col_s2:
+            descending = st.radio("顺序", ["降序", "升序"], horizontal=True) == "降序"
+        # 筛选或排序变化、或当前页已超出范围时回到第一页
+        table_key = filters + (sort_by, descending)
+        if st.session_state.get('table_filter') != table_key or st.session_state.get('table_page', 1) > total_pages:
+            st.session_state['table_filter'] = table_key
+            st.session_state['table_page'] = 1
         with col_p1:
-            page_num = st.number_input("页码", min_value=1, max_value=total_pages, step=1)
+            page_num = st.number_input("页码", min_value=1, max_value=total_pages, step=1, key="table_page")
         with col_p2:
             st.write(f"📊 共 **{total_items}** 条记录 | 第 {page_num}/{total_pages} 页")
-        
-        start_idx = (page_num - 1) * items_per_page
-        end_idx = start_idx + items_per_page
+
+        items = cached_table_page(version, *filters, sort_by, descending, page_num)
+    else:
+        # 网格按页加载：筛选条件变化时回到第一页，游标栈用于“上一页”
+        grid_key = (type_filter, status_filter, tuple(tag_filter), tag_mode)
+        if st.session_state.get('grid_filter') != grid_key:
+            st.session_state['grid_filter'] = grid_key
+            st.session_state['grid_cursors'] = [None]
+        cursors = st.session_state['grid_cursors']
+        items, next_cursor = cached_grid_page(version, *filters, cursors[-1])
+        if not items and len(cursors) > 1:
+            # 当前页的条目已被删空，退回上一页
+            cursors.pop()
+            st.rerun()
+    
+    if not items and search_text:
+        st.info(f"没有找到与“{search_text}”相关的藏品")
+    elif not items:
+        st.info("库中还没有藏品，请先去录入吧！")
+    elif view_mode == "📑 数据库表格":
+        # 数据表视图 (只含当前页)
+        df = pd.DataFrame(items)
         
         # 展示表格，增加高度
         st.dataframe(
-            df.iloc[start_idx:end_idx], 
+            df, 
             use_container_width=True, 
             hide_index=True,
             height=600 # 显式设置高度，让表格变大
         )
-        st.caption("💡 提示：点击列头可以排序。如需修改，请切换回“封面网格”并点击“管理”。")
+        st.caption("💡 提示：用上方“排序”对整个库排序，点击列头只在当前页内排序。如需修改，请切换回“封面网格”并点击“管理”。")
 
     else:
         # 网格视图 - 使用 6 列布局，提高展示密度
         cols = st.columns(6)
         DEFAULT_COVER = "config/default_cover.png"
+        fallback_cover = DEFAULT_COVER if os.path.exists(DEFAULT_COVER) else "https://via.placeholder.com/300x450?text=BeanStash"
         
         for i, item in enumerate(items):
             with cols[i % 6]:
 
 
                 # 封面展示逻辑
-                cover_path = None
-                
                 # 1. 优先使用数据库记录的本地路径
-                if item.local_cover_path and os.path.exists(item.local_cover_path):
-                    cover_path = item.local_cover_path
-                
-                # 2. 如果数据库路径失效，尝试根据 ID 自动猜测是否存在本地文件
-                if not cover_path:
-                    identifier = item.isbn or item.imdb_id or item.douban_id
-                    if identifier:
-                        potential_path = f"data/covers/{identifier}.jpg"
-                        if os.path.exists(potential_path):
-                            cover_path = potential_path
+                # 2. 如果数据库路径失效，根据 ID 在封面索引中查找本地文件
+                cover_path = cover_index.resolve(item)
                 
                 # 3. 尝试使用远程 URL
                 if not cover_path and item.cover_url and item.cover_url.startswith("http") and item.cover_url != "https://via.placeholder.com/300x450":
@@ -340,9 +585,10 @@ if menu == "🏛️ 我的私藏":
                 
                 # 4. 最后回退到默认封面
                 if not cover_path:
-                    cover_path = DEFAULT_COVER if os.path.exists(DEFAULT_COVER) else "https://via.placeholder.com/300x450?text=BeanStash"
+                    cover_path = fallback_cover
 
-                st.image(cover_path, use_container_width=True)
+                # 网格只发送缩略图，原图留给编辑面板
+                st.image(get_thumbnail(cover_path, "grid"), use_container_width=True)
                 
                 # 文字信息
                 st.markdown(f"**{item.title}**")
@@ -360,6 +606,22 @@ if menu == "🏛️ 我的私藏":
                         st.session_state['editing_item_id'] = item.id
                         st.rerun()
 
+        # 翻页 (检索结果不分页)
+        if search_text:
+            st.caption(f"🔍 共找到 {len(items)} 条相关藏品")
+        else:
+            col_prev, col_page, col_next = st.columns([1, 4, 1])
+            with col_prev:
+                if len(cursors) > 1 and st.button("⬅️", key="grid_prev", help="上一页"):
+                    cursors.pop()
+                    st.rerun()
+            with col_page:
+                st.caption(f"第 {len(cursors)} 页")
+            with col_next:
+                if next_cursor is not None and st.button("➡️", key="grid_next", help="下一页"):
+                    cursors.append(next_cursor)
+                    st.rerun()
+
 
 elif menu == "✨ 发现与录入":
     st.header("添加新藏品")
@@ -374,6 +636,44 @@ elif menu == "✨ 发现与录入":
         if not results:
             st.warning("未找到结果")
         else:
+            # 结果一展示就在后台预取详情页与封面，点击入库时多半已经就绪；
+            # 预取器由所有浏览器会话共享，按会话记录各自需要的结果，互不取消
+            owner = st.session_state.setdefault('prefetch_owner', uuid.uuid4().hex)
+            prefetcher.prefetch([res['url'] for res in results], owner=owner)
+
+            def result_record(res):
+                """入库写入的字段：预取已完成时使用完整详情，否则只有搜索结果中的标题与链接"""
+                record = {
+                    "title": res['title'],
+                    "media_type": MediaType(category),
+                    "douban_id": res.get('sid') or None,
+                    "douban_url": res['url'],
+                }
+                ready = prefetcher.get(res['url'], wait=PREFETCH_WAIT)
+                if ready:
+                    record.update(detail_row(None, ready["detail"], datetime.now()))
+                return record, ready
+
+            def add_result(record, ready):
+                # 已收藏的条目只更新链接与详情，不改状态；未预取到的详情与封面由后台任务补全
+                if ready and ready["cover"]:
+                    record["local_cover_path"] = link_cover(
+                        ready["cover"], [record.get("isbn"), record.get("imdb_id"), record["douban_id"]]
+                    )
+                def write(s):
+                    [(status, item_id)] = bulk_upsert(s, [record], keep_existing=FILL_FIELDS, commit=False)
+                    if item_id is not None and not ready:
+                        enqueue(s, JOB_ENRICH, item_id)
+                    elif status == "inserted" and record.get("cover_url") and not record.get("local_cover_path"):
+                        enqueue(s, JOB_COVER, item_id)
+
+                run_write(write)
+                worker.wake()
+                if ready and record.get("local_cover_path"):
+                    st.success(f"《{record['title']}》已加入我的私藏")
+                else:
+                    st.success(f"《{record['title']}》已加入我的私藏，详情与封面正在后台补全")
+
             for idx, res in enumerate(results):
                 col_res1, col_res2 = st.columns([4, 1])
                 with col_res1:
@@ -381,46 +681,48 @@ elif menu == "✨ 发现与录入":
                     st.caption(res['url'])
                 with col_res2:
                     if st.button("入库", key=f"add_{idx}"):
-                        detail = fetcher.fetch_detail(res['url'])
-                        if detail:
-                            # 确定唯一标识符用于封面命名
-                            cover_id = detail.get('isbn') or detail.get('imdb_id') or res.get('sid')
-                            
-                            local_path = download_cover(detail['cover_url'], identifier=cover_id)
-                            new_item = CollectionItem(
-                                title=detail['title'],
-                                media_type=MediaType(detail['media_type']),
-                                cover_url=detail['cover_url'],
-                                local_cover_path=local_path,
-                                douban_id=res.get('sid'),
-                                douban_url=res['url'],
-                                isbn=detail.get('isbn'),
-                                imdb_id=detail.get('imdb_id'),
-                                my_status=CollectionStatus.WISH,
-                                year=int(detail['year']) if str(detail.get('year', '')).isdigit() else None,
-                                author=detail.get('author'),
-                                director=detail.get('director')
-                            )
-                            session.add(new_item)
-                            session.commit()
-                            st.success(f"《{detail['title']}》已加入我的私藏")
+                        # 库中已有相同或相似的条目时先提示，确认后再入库
+                        record, ready = result_record(res)
+                        refresh_keys()
+                        matches = find_matches(session, record)
+                        if matches:
+                            st.session_state['dup_confirm'] = (res['url'], matches)
+                        else:
+                            add_result(record, ready)
+                pending = st.session_state.get('dup_confirm')
+                if pending and pending[0] == res['url']:
+                    lines = [
+                        f"- 《{m['title']}》{m['year'] or ''} ({m['reason']})" for m in pending[1]
+                    ]
+                    notice = st.empty()
+                    notice.warning("私藏中可能已有这一条目：\n" + "\n".join(lines))
+                    col_yes, col_no = st.columns(2)
+                    with col_yes:
+                        if st.button("仍然入库", key=f"add_force_{idx}"):
+                            del st.session_state['dup_confirm']
+                            notice.empty()
+                            add_result(*result_record(res))
+                    with col_no:
+                        if st.button("取消", key=f"add_cancel_{idx}"):
+                            del st.session_state['dup_confirm']
+                            st.rerun()
 
 
 elif menu == "📈 数据分析":
     st.header("统计分析")
-    df = pd.read_sql(session.query(CollectionItem).statement, engine)
+    stats = cached_dashboard(version)
     
-    if df.empty:
+    if not stats["total"]:
         st.info("暂无数据，请先录入一些藏品吧！")
     else:
         # 顶部总览卡片
         col_m1, col_m2, col_m3 = st.columns(3)
         with col_m1:
-            st.metric("总藏品", len(df))
+            st.metric("总藏品", stats["total"])
         with col_m2:
-            st.metric("平均评分", round(df['my_rating'].mean(), 1) if not df['my_rating'].isnull().all() else "-")
+            st.metric("平均评分", round(stats["avg_rating"], 1) if stats["avg_rating"] is not None else "-")
         with col_m3:
-            st.metric("已完成", len(df[df['my_status'] == CollectionStatus.DONE]))
+            st.metric("已完成", stats["done"])
 
         st.divider()
 
@@ -428,32 +730,73 @@ elif menu == "📈 数据分析":
         col_c1, col_c2 = st.columns(2)
         with col_c1:
             st.subheader("📁 类型分布")
-            type_counts = df['media_type'].apply(lambda x: x.value).value_counts()
-            st.bar_chart(type_counts)
+            st.bar_chart(pd.Series(stats["type_counts"]).sort_values(ascending=False))
         
         with col_c2:
             st.subheader("🎏 状态分布")
-            status_counts = df['my_status'].apply(lambda x: x.value).value_counts()
-            st.bar_chart(status_counts)
+            st.bar_chart(pd.Series(stats["status_counts"]).sort_values(ascending=False))
 
         st.divider()
 
         # 第二排：年份分布
         st.subheader("📅 年份分布")
-        # 过滤掉空的年份
-        year_df = df[df['year'].notnull()].copy()
-        if not year_df.empty:
-            year_counts = year_df['year'].value_counts().sort_index()
-            st.bar_chart(year_counts)
+        if stats["year_counts"]:
+            st.bar_chart(pd.Series(stats["year_counts"]))
         else:
             st.caption("暂无年份信息")
 
         # 最近录入
         st.divider()
         st.subheader("🕒 最近录入")
-        recent_df = df.sort_values(by="created_at", ascending=False).head(5)
-        st.table(recent_df[['title', 'media_type', 'my_status']].assign(
-            media_type=recent_df['media_type'].apply(lambda x: x.value),
-            my_status=recent_df['my_status'].apply(lambda x: x.value)
-        ))
+        st.table(pd.DataFrame(stats["recent"], columns=["title", "media_type", "my_status"]))
 
+        # 疑似重复 (按需计算)
+        st.divider()
+        st.subheader("🧬 疑似重复")
+        if st.toggle("查找疑似重复的条目", key="show_duplicates"):
+            # 先在单独的短事务中同步签名 (有变化时库版本号随之变化)，缓存的查询本身只读
+            refresh_keys()
+            groups = cached_duplicates(library_version())
+            if not groups:
+                st.caption("没有发现疑似重复的条目")
+            for group in groups:
+                st.markdown(f"**{group['reason']}** · 相似度 {group['score']}")
+                st.table(pd.DataFrame(group["items"], columns=["id", "title", "year", "media_type", "douban_id"]))
+
+        # 推荐：想看清单中与高分条目最相似的
+        st.divider()
+        st.subheader("🎯 为你推荐")
+        if similar_index is None:
+            st.caption("安装 numpy 与 scipy 后可根据高分条目推荐想看清单中的条目")
+        else:
+            picks = cached_recommendations(version)
+            if picks:
+                st.caption("从“想看”清单中挑出流派、标签、主创与年代最接近你的高分条目的几部")
+                st.table(pd.DataFrame(picks, columns=["title", "year", "media_type", "score"]))
+            else:
+                st.caption("给一些条目打 4 星以上，并在想看清单中添加条目后，这里会出现推荐")
+
+
+# --- 性能调试面板 ---
+# 写在页面最后，统计的是本次重跑中它之前的全部代码
+session.remove()
+rerun_elapsed, rerun_breakdown = end_collect(rerun_timing)
+maybe_write_prometheus()
+with st.sidebar:
+    st.divider()
+    if st.toggle("🐞 性能调试", key="debug_panel"):
+        st.caption(f"本次重跑 {rerun_elapsed * 1000:.1f} ms (各项可能嵌套，例如 fetch_detail 包含 http_get 与 parse_detail)")
+        rows = [
+            {"环节": name, "耗时 ms": round(total * 1000, 1), "次数": count, "占比": f"{total / rerun_elapsed:.0%}" if rerun_elapsed else "-"}
+            for name, total, count in rerun_breakdown
+        ]
+        if rows:
+            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+        else:
+            st.caption("本次重跑没有访问数据库或网络 (全部命中缓存)")
+        recent_slow = slow_queries()
+        if recent_slow:
+            with st.expander(f"最近的慢查询 ({len(recent_slow)})"):
+                for entry in recent_slow[:10]:
+                    st.caption(f"{entry['at']} · {entry['ms']} ms")
+                    st.code(f"{entry['statement']}\n-- {entry['params']}", language="sql")
@@ -0,0 +1,205 @@
+"""
+生成用于性能测试的合成收藏库。
+
+同样的 (条目数, 随机种子) 总是生成同样的库：条目类型、状态、评分、标签、年份、
+标识符的分布大致与真实收藏相当；封面为 COVER_VARIANTS 张不同的图片，
+按内容存储 (见 app.utils.cover_store)，每个有封面的条目以标识符硬链接到其中一张。
+生成结果保存在 <workdir>/lib-<条目数>/ 下并记录参数，参数不变时直接复用。
+
+    python -m benchmarks.generate 10000 --workdir data/bench
+"""
+import io
+import json
+import os
+import random
+import shutil
+import time
+from datetime import datetime, timedelta
+
+GENERATOR_VERSION = 3
+COVER_VARIANTS = 64
+BATCH_SIZE = 2000
+
+CHARS = "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小多然于心学么之都好看起发当没成只如事把还用第样道想作种开美总从无情己面最女但现前些所同日手又行意动方期它头经长儿回位分爱老因很给名法间斯知世什两次使身者被高已亲其进此话常与活正感"
+WORDS = ("the", "of", "night", "city", "love", "story", "last", "world", "river", "dream", "house", "war", "king", "time", "blue")
+TAGS = (
+    "经典", "科幻", "悬疑", "治愈", "剧情", "爱情", "历史", "推理", "动画", "纪录片", "文学", "小说",
+    "日本", "美国", "英国", "法国", "香港", "台湾", "韩国", "传记", "哲学", "心理学", "经济", "社会学",
+    "摇滚", "爵士", "古典", "民谣", "电子", "流行", "重看", "收藏", "借阅", "待补", "豆瓣Top250", "年度最佳",
+)
+TYPE_WEIGHTS = (("movie", 50), ("book", 35), ("music", 15))
+STATUS_WEIGHTS = (("WISH", 40), ("DOING", 10), ("DONE", 50))
+
+
+def _weighted(rng, choices):
+    return rng.choices([c for c, _ in choices], weights=[w for _, w in choices])[0]
+
+
+def _title(rng):
+    title = "".join(rng.choice(CHARS) for _ in range(rng.randint(2, 9)))
+    if rng.random() < 0.3:
+        title += " " + " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 4)))
+    return title
+
+
+def _isbn(rng):
+    core = "978" + "".join(str(rng.randint(0, 9)) for _ in range(9))
+    check = (10 - sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(core)) % 10) % 10
+    return core + str(check)
+
+
+def make_rows(count, seed=0):
+    """生成 count 条元数据字典 (bulk_upsert 的输入格式)，以及每条的录入时间"""
+    rng = random.Random(seed)
+    start = datetime(2019, 1, 1)
+    rows, created = [], []
+    for i in range(count):
+        media_type = _weighted(rng, TYPE_WEIGHTS)
+        status = _weighted(rng, STATUS_WEIGHTS)
+        row = {
+            "title": _title(rng),
+            "media_type": media_type,
+            "douban_id": str(1000000 + i),
+            "douban_url": f"https://{media_type}.douban.com/subject/{1000000 + i}/",
+            "my_status": status,
+            "my_rating": rng.randint(1, 5) if status == "DONE" and rng.random() < 0.8 else None,
+            "my_tags": ",".join(rng.sample(TAGS, rng.randint(0, 3))) or None,
+            "my_comment": "".join(rng.choice(CHARS) for _ in range(rng.randint(5, 60))) if rng.random() < 0.3 else None,
+            "year": rng.randint(1950, 2025) if rng.random() < 0.95 else None,
+            "rating_douban": round(rng.uniform(5.0, 9.7), 1) if rng.random() < 0.9 else None,
+            "summary": "".join(rng.choice(CHARS) for _ in range(rng.randint(80, 400))),
+        }
+        if media_type == "movie":
+            row.update(
+                imdb_id=f"tt{rng.randint(100000, 9999999):07d}" if rng.random() < 0.8 else None,
+                director=_title(rng)[:6],
+                cast=" / ".join(_title(rng)[:4] for _ in range(rng.randint(2, 6))),
+                country=rng.choice(("美国", "中国大陆", "日本", "英国", "法国", "韩国")),
+                genres=" / ".join(rng.sample(("剧情", "喜剧", "动作", "爱情", "科幻", "悬疑", "动画"), 2)),
+            )
+        elif media_type == "book":
+            row.update(
+                isbn=_isbn(rng) if rng.random() < 0.9 else None,
+                author=_title(rng)[:6],
+                publisher=rng.choice(("人民文学出版社", "上海译文出版社", "译林出版社", "中信出版社", "三联书店")),
+            )
+        else:
+            row.update(performer=_title(rng)[:6], genre=rng.choice(("Rock", "Jazz", "Pop", "Folk", "Classical")))
+        rows.append(row)
+        created.append(start + timedelta(seconds=rng.randint(0, 6 * 365 * 86400)))
+    return rows, created
+
+
+def _cover_bytes(rng, index):
+    """一张封面图片 (有 Pillow 时生成真实 JPEG，否则是能通过格式检查的最小文件)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return b"\xff\xd8\xff\xe0" + bytes(rng.getrandbits(8) for _ in range(4096)) + index.to_bytes(4, "big")
+    image = Image.new("RGB", (270, 400), tuple(rng.randint(0, 255) for _ in range(3)))
+    for _ in range(30):
+        x, y = rng.randint(0, 260), rng.randint(0, 390)
+        image.paste(tuple(rng.randint(0, 255) for _ in range(3)), (x, y, x + rng.randint(5, 60), y + rng.randint(5, 60)))
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+
+def make_covers(cover_dir, session, seed=0, variants=COVER_VARIANTS):
+    """生成 variants 张封面并链接给约 85% 的条目 (其中一部分只靠标识符匹配，不记录路径)"""
+    from sqlalchemy import bindparam, update
+    from app.core.models import CollectionItem
+    from app.utils.cover_store import CoverStore
+
+    rng = random.Random(seed + 1)
+    store = CoverStore(cover_dir)
+    blobs = []
+    for index in range(variants):
+        src = os.path.join(cover_dir, f".src-{index}.jpg")
+        with open(src, "wb") as f:
+            f.write(_cover_bytes(rng, index))
+        blobs.append(store.ingest(src))
+        os.remove(src)
+
+    updates = []
+    rows = session.query(CollectionItem.id, CollectionItem.isbn, CollectionItem.imdb_id, CollectionItem.douban_id)
+    for item_id, isbn, imdb_id, douban_id in rows.order_by(CollectionItem.id):
+        if rng.random() >= 0.85:
+            continue
+        path = store.link(rng.choice(blobs), isbn or imdb_id or douban_id)
+        if rng.random() < 0.8:
+            updates.append({"b_id": item_id, "b_path": path})
+    if updates:
+        table = CollectionItem.__table__
+        session.execute(
+            # 保留 updated_at (否则 onupdate 会把它改成生成时刻)
+            update(table).where(table.c.id == bindparam("b_id")).values(
+                local_cover_path=bindparam("b_path"), updated_at=table.c.updated_at
+            ),
+            updates,
+        )
+        session.commit()
+
+
+def generate_library(workdir, count, seed=0, force=False, progress=print):
+    """生成 (或复用) 条目数为 count 的合成库，返回 (数据库 URL, 封面目录)"""
+    from app.core.models import schema_fingerprint
+
+    libdir = os.path.join(workdir, f"lib-{count}")
+    db_path = os.path.join(libdir, "collection.db")
+    cover_dir = os.path.join(libdir, "covers")
+    meta_path = os.path.join(libdir, "meta.json")
+    meta = {"count": count, "seed": seed, "generator": GENERATOR_VERSION, "schema": schema_fingerprint()}
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            reusable = json.load(f) == meta and os.path.exists(db_path)
+    except (OSError, ValueError):
+        reusable = False
+    db_url = f"sqlite:///{db_path}"
+    if reusable and not force:
+        return db_url, cover_dir
+
+    started = time.time()
+    progress(f"正在生成 {count} 条目的测试库 ({libdir}) ...")
+    shutil.rmtree(libdir, ignore_errors=True)
+    os.makedirs(cover_dir)
+
+    from sqlalchemy import bindparam, update
+    from app.core.db import get_session_factory
+    from app.core.dedup import sync_keys
+    from app.core.models import CollectionItem
+    from app.core.upsert import bulk_upsert
+
+    rows, created = make_rows(count, seed)
+    with get_session_factory(db_url)() as session:
+        for offset in range(0, count, BATCH_SIZE):
+            outcomes = bulk_upsert(session, rows[offset:offset + BATCH_SIZE])
+            table = CollectionItem.__table__
+            session.execute(
+                update(table).where(table.c.id == bindparam("b_id")).values(
+                    created_at=bindparam("b_created"), updated_at=bindparam("b_created")
+                ),
+                [{"b_id": item_id, "b_created": when} for (_, item_id), when in zip(outcomes, created[offset:offset + BATCH_SIZE])],
+            )
+            session.commit()
+        sync_keys(session)
+        session.commit()
+        make_covers(cover_dir, session, seed)
+        # 把 WAL 合并回主文件，每次测试从相同的文件状态开始
+        session.connection().exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    progress(f"生成完成，耗时 {time.time() - started:.1f}s")
+    return db_url, cover_dir
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="生成性能测试用的合成收藏库")
+    parser.add_argument("count", type=int, help="条目数")
+    parser.add_argument("--workdir", default="data/bench", help="输出目录")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--force", action="store_true", help="参数未变时也重新生成")
+    opts = parser.parse_args()
+    print(generate_library(opts.workdir, opts.count, seed=opts.seed, force=opts.force))
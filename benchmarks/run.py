@@ -0,0 +1,306 @@
+"""
+离线性能测试：在合成库上计时界面与抓取的关键路径，结果输出为 JSON 便于跨提交比较。
+
+    python -m benchmarks.run                          # 1k / 10k 条目
+    python -m benchmarks.run --sizes 1000,10000,100000 --repeat 9
+    python -m benchmarks.run --compare data/bench/results-<旧提交>.json
+
+场景：
+- 与库大小相关 (每个大小一组)：网格首页 / 筛选后首页 / 第 20 页、表格计数加一页、
+  数据分析面板、全文检索 (FTS5 与短词 LIKE 两种)、封面目录扫描与一页封面解析、相似条目查询与无变化时的索引同步
+- 与库大小无关：解析 fixtures/douban 中的详情页、经本地 HTTP 服务器的 fetch_detail、
+  download_cover 的首次下载与已存在时的直接返回
+每个场景先预热一次，再运行 repeat 次，记录最小值、中位数、p95 与平均值 (毫秒)。
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.generate import generate_library
+
+FIXTURE_DIR = "fixtures/douban"
+DEFAULT_SIZES = (1000, 10000)
+DEFAULT_REPEAT = 7
+GRID_PAGE_SIZE = 36      # 与界面一致
+TABLE_PAGE_SIZE = 100
+DEEP_PAGES = 20
+SIMILAR_QUERIES = 10     # similar_top_k 每次查询的条目数
+SLOWER_RATIO = 1.2       # 比较时慢于基准这么多倍即标记
+
+
+def measure(fn, repeat):
+    """预热一次后运行 repeat 次，返回耗时统计 (毫秒)"""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "runs": repeat,
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def library_scenarios(db_url, cover_dir):
+    """与库大小相关的场景：{名称: 无参函数}"""
+    from app.core.db import get_session_factory
+    from app.core.models import CollectionItem, CollectionStatus, MediaType
+    from app.core.queries import GRID_COLUMNS, TABLE_COLUMNS, count_rows, filtered_query, keyset_page, offset_page
+    from app.core.search import search_library
+    from app.core.stats import load_dashboard
+    from app.utils.cover_index import CoverIndex
+
+    Session = get_session_factory(db_url)
+    index = CoverIndex(cover_dir)
+
+    def grid(**filters):
+        with Session() as s:
+            return keyset_page(filtered_query(s, columns=GRID_COLUMNS, **filters), limit=GRID_PAGE_SIZE)
+
+    def grid_deep():
+        cursor = None
+        with Session() as s:
+            for _ in range(DEEP_PAGES):
+                items, cursor = keyset_page(filtered_query(s, columns=GRID_COLUMNS), cursor=cursor, limit=GRID_PAGE_SIZE)
+
+    def table_page():
+        with Session() as s:
+            count_rows(filtered_query(s))
+            query = filtered_query(s, columns=TABLE_COLUMNS)
+            return offset_page(query, CollectionItem.title, descending=False, page=DEEP_PAGES, page_size=TABLE_PAGE_SIZE)
+
+    def analytics():
+        with Session() as s:
+            return load_dashboard(s)
+
+    def search(term):
+        with Session() as s:
+            return search_library(s, term, limit=60, columns=GRID_COLUMNS)
+
+    with Session() as s:
+        page, _ = keyset_page(filtered_query(s, columns=GRID_COLUMNS), limit=GRID_PAGE_SIZE)
+
+    def covers_resolve():
+        for item in page:
+            index.resolve(item)
+
+    scenarios = {
+        "grid_first_page": grid,
+        "grid_filtered": lambda: grid(media_type=MediaType.MOVIE, status=CollectionStatus.DONE, tags=["经典"]),
+        "grid_page_20": grid_deep,
+        "table_page": table_page,
+        "analytics": analytics,
+        # ≥3 个字走 FTS5 索引 (bm25)，更短的词退回 LIKE 全表扫描
+        "search_fts": lambda: search("river"),
+        "search_short": lambda: search("的一"),
+        "cover_index_scan": lambda: index.refresh(force=True),
+        "cover_resolve_page": covers_resolve,
+    }
+
+    from app.core.similar import SIMILAR_AVAILABLE, SimilarIndex
+    if SIMILAR_AVAILABLE:
+        similar = SimilarIndex(os.path.join(os.path.dirname(cover_dir), "similar_index.npz"))
+        with Session() as s:
+            similar.sync(s)
+        seeds = [item.id for item in page[:SIMILAR_QUERIES]]
+
+        def similar_top_k():
+            for item_id in seeds:
+                similar.similar_to(item_id, k=10)
+
+        def similar_sync():
+            with Session() as s:
+                similar.sync(s, save=False)
+
+        scenarios.update(similar_top_k=similar_top_k, similar_sync=similar_sync)
+    else:
+        print("未安装 numpy / scipy，跳过相似条目场景")
+    return scenarios
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    """/<豆瓣链接去掉协议> 返回 fixtures 中的详情页，/cover/... 返回封面图片"""
+    pages = {}
+    cover = b""
+
+    def do_GET(self):
+        if self.path.startswith("/cover/"):
+            body, ctype = self.cover, "image/jpeg"
+        else:
+            body, ctype = self.pages.get(self.path), "text/html; charset=utf-8"
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def fetch_scenarios(workdir, cover_dir):
+    """与库大小无关的抓取与解析场景，返回 ({名称: 函数}, 关闭服务器的函数)"""
+    from app.core.fetcher import DoubanFetcher
+    from app.core.transport import HttpClient
+    from app.utils.downloader import download_cover
+
+    cases = []
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if name.endswith(".json"):
+            with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+                url = json.load(f)["url"]
+            with open(os.path.join(FIXTURE_DIR, name[:-5] + ".html"), encoding="utf-8") as f:
+                cases.append((name[:-5], url, f.read()))
+    _FixtureHandler.pages = {"/" + url.split("://", 1)[1]: html.encode("utf-8") for _, url, html in cases}
+    blobs = os.path.join(cover_dir, ".blobs")
+    sample = next((os.path.join(blobs, n) for n in sorted(os.listdir(blobs)) if not n.startswith(".")), None)
+    with open(sample, "rb") as f:
+        _FixtureHandler.cover = f.read()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    # 本地服务器不需要限速；不使用响应缓存，每次都真正请求
+    client = HttpClient(per_host_interval=0)
+    fetcher = DoubanFetcher(client=client, cache=False)
+    download_dir = os.path.join(workdir, "downloads")
+    counter = [0]
+
+    def parse():
+        for _, url, html in cases:
+            fetcher.parse_detail(html, url)
+
+    def fetch():
+        # 链接中保留原主机名，解析器据此判断条目类型
+        for _, url, _ in cases:
+            fetcher.fetch_detail(f"{base}/{url.split('://', 1)[1]}")
+
+    def download_new():
+        counter[0] += 1
+        download_cover(f"{base}/cover/{counter[0]}.jpg", save_dir=download_dir, identifier=f"bench{os.getpid()}-{counter[0]}", client=client)
+
+    def download_existing():
+        download_cover(f"{base}/cover/existing.jpg", save_dir=download_dir, identifier="bench-existing", client=client)
+
+    scenarios = {
+        "parse_detail": parse,
+        "fetch_detail_local": fetch,
+        "download_cover_new": download_new,
+        "download_cover_existing": download_existing,
+    }
+
+    def close():
+        client.close()
+        server.shutdown()
+        server.server_close()
+    return scenarios, close
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, workdir="data/bench", only=None, progress=print):
+    """运行全部场景，返回结果字典 (见模块说明)"""
+    results = {}
+
+    def record(name, size, fn):
+        if only and not any(part in name for part in only):
+            return
+        stats = measure(fn, repeat)
+        stats.update(scenario=name, size=size)
+        results[f"{name}@{size}" if size else name] = stats
+        progress(f"{name:<26}{size or '-':>8}{stats['median_ms']:>12.2f} ms  (p95 {stats['p95_ms']:.2f})")
+
+    cover_dir = None
+    for size in sizes:
+        db_url, cover_dir = generate_library(workdir, size, progress=progress)
+        for name, fn in library_scenarios(db_url, cover_dir).items():
+            record(name, size, fn)
+
+    scenarios, close = fetch_scenarios(workdir, cover_dir)
+    try:
+        for name, fn in scenarios.items():
+            record(name, None, fn)
+    finally:
+        close()
+
+    return {
+        "meta": {
+            "commit": _commit(),
+            "started_at": datetime.now().isoformat(sep=" ", timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "sizes": list(sizes),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, progress=print):
+    """逐场景比较中位数，返回慢于基准 SLOWER_RATIO 倍以上的场景名"""
+    slower = []
+    progress(f"{'场景':<32}{'基准 ms':>10}{'当前 ms':>10}{'比值':>8}")
+    for key, stats in current["results"].items():
+        base = baseline["results"].get(key)
+        if not base:
+            continue
+        ratio = stats["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        flag = " ⚠️" if ratio > SLOWER_RATIO else ""
+        if flag:
+            slower.append(key)
+        progress(f"{key:<32}{base['median_ms']:>10.2f}{stats['median_ms']:>10.2f}{ratio:>8.2f}{flag}")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="离线性能测试")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="合成库条目数，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每个场景的运行次数")
+    parser.add_argument("--workdir", default="data/bench", help="合成库与下载文件的目录")
+    parser.add_argument("--only", action="append", help="只运行名称包含该字符串的场景，可重复指定")
+    parser.add_argument("--output", help="结果 JSON 路径 (默认 <workdir>/results-<提交>.json)")
+    parser.add_argument("--compare", help="与之前的结果 JSON 比较，有场景明显变慢时以状态码 1 退出")
+    opts = parser.parse_args(argv)
+
+    sizes = [int(size) for size in opts.sizes.split(",") if size.strip()]
+    report = run_benchmarks(sizes, opts.repeat, opts.workdir, opts.only)
+    output = opts.output or os.path.join(opts.workdir, f"results-{report['meta']['commit'] or 'local'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+
+    if opts.compare:
+        with open(opts.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
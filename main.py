@@ -1,10 +1,47 @@
 import os
 import sys
 import subprocess
-from app.core.models import init_db, get_session, CollectionItem, MediaType, CollectionStatus
-from app.core.fetcher import DoubanFetcher
 
-def run_web():
+# 各子命令只在执行时导入所需模块 (SQLAlchemy、requests、bs4 等)，
+# 使 `python main.py web`、`--help` 等命令无需加载数据库与爬虫代码
+
+# 常用命令的启动耗时预算 (秒，含解释器启动)，由 `python main.py startup` 测量
+STARTUP_BUDGETS = {
+    "--help": 0.15,
+    "list --limit 1": 0.8,
+    "get 1": 0.8,
+    "stats": 0.8,
+}
+# list 每次从数据库读取的行数
+STREAM_CHUNK = 1000
+LIST_FIELDS = ("id", "title", "media_type", "year", "my_status", "my_rating", "douban_id", "isbn", "imdb_id", "my_tags")
+
+def _session_factory():
+    os.makedirs("data", exist_ok=True)
+    from app.core.db import get_session_factory
+    return get_session_factory()
+
+def _value(value):
+    """把枚举、时间等转换成可输出的值"""
+    if hasattr(value, "isoformat"):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if hasattr(value, "value") and hasattr(value, "name"):
+        return value.value
+    return value
+
+def _write_rows(rows, fields, fmt, out):
+    """逐行输出 JSONL 或 TSV (TSV 首行为列名)"""
+    import json
+    if fmt == "tsv":
+        out.write("\t".join(fields) + "\n")
+    for row in rows:
+        values = [_value(getattr(row, field)) for field in fields]
+        if fmt == "tsv":
+            out.write("\t".join("" if v is None else str(v).replace("\t", " ").replace("\n", " ") for v in values) + "\n")
+        else:
+            out.write(json.dumps(dict(zip(fields, values)), ensure_ascii=False) + "\n")
+
+def run_web(opts=None):
     """启动 Streamlit 页面"""
     print("🚀 正在启动 Web 界面...")
     # 动态获取当前脚本所在目录的 app/web/ui.py 路径
@@ -12,38 +49,278 @@ def run_web():
     # 使用 sys.executable 确保使用当前环境的 Python 运行 Streamlit
     subprocess.run([sys.executable, "-m", "streamlit", "run", ui_path])
 
-def main():
-    # 检查命令行参数
-    if len(sys.argv) > 1 and sys.argv[1] == "web":
-        run_web()
+def run_thumbs(opts=None):
+    """为 data/covers 下所有封面批量预生成缩略图"""
+    from app.utils.thumbnails import get_thumbnail_cache, THUMB_SIZES
+    cover_dir = os.path.join("data", "covers")
+    if not os.path.isdir(cover_dir):
+        print("没有找到封面目录。")
         return
+    paths = [e.path for e in os.scandir(cover_dir) if e.is_file()]
+    print(f"🖼️ 正在为 {len(paths)} 张封面生成缩略图...")
+    done = get_thumbnail_cache().generate_many(paths, sizes=tuple(THUMB_SIZES))
+    print(f"✅ 完成，共生成/校验 {done} 张缩略图。")
+
+def run_covers(opts=None):
+    """把已有封面并入按内容去重的存储，并清理不再被引用的文件"""
+    from app.utils.cover_store import get_cover_store
+    store = get_cover_store()
+    print(f"🗂️ 已整理 {store.adopt_existing()} 张封面。")
+    removed, freed = store.gc()
+    print(f"✅ 清理 {removed} 个未引用文件，释放 {freed / 1024 / 1024:.1f} MB。")
+
+def run_import_cmd(opts):
+    """python main.py import <文件> [--workers N] [--batch N]"""
+    from app.core.importer import run_import
+    with _session_factory()() as session:
+        stats = run_import(session, opts.file, workers=opts.workers, batch_size=opts.batch)
+    print(f"✅ 导入结束：成功 {stats['imported']}，失败 {stats['failed']}，跳过 {stats['skipped']}，"
+          f"耗时 {stats['elapsed']:.1f}s ({stats['rate']:.1f} 条/秒)")
+    if stats["stopped"] or stats["failed"]:
+        print("💡 重新运行同一命令即可从断点继续。")
+
+def run_reindex(opts=None):
+    """重建本地全文检索索引"""
+    from app.core.db import get_engine
+    from app.core.search import rebuild_fts
+    os.makedirs("data", exist_ok=True)
+    print("🔎 正在重建全文索引...")
+    rebuild_fts(get_engine())
+    print("✅ 索引重建完成。")
+
+def run_jobs_cmd(opts):
+    """python main.py jobs [--workers N] [--now] [--retry-failed]"""
+    from app.core.jobs import run_pending, job_counts, retry_failed
+    Session = _session_factory()
+    if opts.retry_failed:
+        with Session() as session:
+            print(f"🔁 重新排队 {retry_failed(session)} 个失败任务。")
+            session.commit()
+    stats = run_pending(Session, max_workers=opts.workers, ignore_delay=opts.now)
+    with Session() as session:
+        counts = job_counts(session)
+    print(f"✅ 执行结束：成功 {stats['done']}，失败 {stats['failed']}；"
+          f"剩余待重试 {counts.get('pending', 0)}，已放弃 {counts.get('failed', 0)}")
+
+def run_refresh_cmd(opts):
+    """python main.py refresh [--budget N] [--min-age 天] [--workers N]"""
+    from app.core.refresh import refresh_items
+    stats = refresh_items(_session_factory(), budget=opts.budget, min_age_days=opts.min_age, workers=opts.workers)
+    print(f"✅ 刷新结束：检查 {stats['checked']}，更新 {stats['changed']}，未变 {stats['unchanged']}，失败 {stats['failed']}")
+
+def run_dupes(opts):
+    """python main.py dupes [--json]"""
+    from app.core.dedup import find_duplicate_groups, refresh_keys
+    Session = _session_factory()
+    refresh_keys()
+    with Session() as session:
+        groups = find_duplicate_groups(session)
+    if opts.json:
+        import json
+        for group in groups:
+            print(json.dumps(group, ensure_ascii=False))
+        return
+    for group in groups:
+        print(f"[{group['reason']} {group['score']}]")
+        for item in group["items"]:
+            print(f"  #{item['id']} {item['title']} ({item['year'] or '-'}, {item['media_type']})")
+    print(f"共 {len(groups)} 组疑似重复。")
+
+def run_similar(opts):
+    """python main.py similar [ID] [--k 10] [--rebuild] [--json]；不给 ID 时从想看清单推荐"""
+    from app.core.similar import get_similar_index, describe, recommend_wishlist
+    index = get_similar_index()
+    if index is None:
+        print("相似条目需要 numpy 与 scipy，当前环境中未安装：pip install -r requirements.txt (或 pip install numpy scipy)", file=sys.stderr)
+        return 1
+    with _session_factory()() as session:
+        changed = index.rebuild(session) if opts.rebuild else index.sync(session)
+        if changed:
+            print(f"索引已更新 {changed} 个条目。", file=sys.stderr)
+        if opts.id is None:
+            pairs = recommend_wishlist(session, index, k=opts.k)
+        else:
+            pairs = index.similar_to(opts.id, k=opts.k)
+        items = describe(session, pairs)
+    if opts.json:
+        import json
+        for item in items:
+            print(json.dumps(item, ensure_ascii=False))
+        return
+    for item in items:
+        print(f"{item['score']:.3f}  #{item['id']} {item['title']} ({item['year'] or '-'}, {item['media_type']})")
+
+def _filtered_rows(session, opts, columns):
+    """按命令行的 --type/--status/--tag 筛选，按 id 顺序分块读取"""
+    from app.core.models import CollectionItem, MediaType, CollectionStatus
+    from app.core.queries import filtered_query
+    query = filtered_query(
+        session,
+        media_type=MediaType[opts.type.upper()] if opts.type else None,
+        status=CollectionStatus[opts.status.upper()] if opts.status else None,
+        tags=opts.tag,
+        tag_mode="or" if opts.any_tag else "and",
+        columns=columns,
+    ).order_by(CollectionItem.id)
+    if getattr(opts, "limit", None):
+        query = query.limit(opts.limit)
+    # yield_per 让结果分块到达，内存占用与库的大小无关
+    return query.yield_per(STREAM_CHUNK)
+
+def run_list(opts):
+    """python main.py list [--format jsonl|tsv] [--type T] [--status S] [--tag 标签] [--limit N]"""
+    from app.core.models import CollectionItem
+    columns = [getattr(CollectionItem, field) for field in LIST_FIELDS]
+    with _session_factory()() as session:
+        _write_rows(_filtered_rows(session, opts, columns), LIST_FIELDS, opts.format, sys.stdout)
+
+def run_export(opts):
+    """python main.py export <文件> [--format csv|tsv|jsonl|parquet] [--incremental]"""
+    from app.core.db import get_engine
+    from app.core.exporter import export_items
+    os.makedirs("data", exist_ok=True)
+    result = export_items(get_engine(), opts.output, fmt=opts.format, incremental=opts.incremental)
+    since = f" (自 {result['since']:%Y-%m-%d %H:%M:%S} 起的变化)" if result["since"] else ""
+    print(f"✅ 已导出 {result['rows']} 条到 {result['path']}{since}")
+
+def run_backup(opts):
+    """python main.py backup [--dir 目录] [--keep N] [--force]"""
+    from app.core.backup import backup_database
+    backup_database(backup_dir=opts.dir, keep=opts.keep, force=opts.force)
+
+def run_get(opts):
+    """python main.py get <id> | get --douban <豆瓣 ID> | get <豆瓣链接>：以 JSON 输出一个条目的全部字段"""
+    import json
+    import re
+    from app.core.models import CollectionItem
+    # 豆瓣 ID 与条目 id 都是数字，只有显式指定 --douban 或给出豆瓣链接时才按豆瓣 ID 查找
+    match = re.search(r"douban\.com/subject/(\d+)", opts.key)
+    douban_id = match.group(1) if match else (opts.key if opts.douban else None)
+    with _session_factory()() as session:
+        if douban_id is not None:
+            item = session.query(CollectionItem).filter(CollectionItem.douban_id == douban_id).first()
+        elif opts.key.isdigit():
+            item = session.get(CollectionItem, int(opts.key))
+        else:
+            item = None
+        if item is None:
+            print(f"没有找到条目: {opts.key}", file=sys.stderr)
+            return 1
+        data = {col.name: _value(getattr(item, col.name)) for col in CollectionItem.__table__.columns}
+    print(json.dumps(data, ensure_ascii=False, indent=2))
+
+def run_add(opts):
+    """
+    python main.py add <豆瓣链接> [--status S] [--rating R] [--tags T] [--comment C] [--force]
+    与界面的“入库”相同：经 bulk_upsert 按豆瓣 ID / ISBN / IMDb ID 合并到已有条目，
+    库中有相似的其他条目时先列出并退出 (--force 仍然入库)
+    """
+    import json
+    from app.core.db import run_write
+    from app.core.dedup import find_matches, refresh_keys
+    from app.core.importer import normalize_record, item_fields
+    from app.core.fetcher import DoubanFetcher
+    from app.core.refresh import FILL_FIELDS
+    from app.core.upsert import bulk_upsert
+    from app.utils.downloader import download_cover
+    from app.utils.cover_index import get_cover_index
+    record = normalize_record({
+        "url": opts.url, "status": opts.status, "rating": opts.rating,
+        "tags": opts.tags, "comment": opts.comment,
+    })
+    if record is None:
+        print(f"无法识别的豆瓣条目链接: {opts.url}", file=sys.stderr)
+        return 2
+    detail = DoubanFetcher().fetch_detail(record["url"])
+    if not detail or not detail.get("title"):
+        print(f"抓取详情失败: {record['url']}", file=sys.stderr)
+        return 1
+    fields = item_fields(record, detail)
+    # 没给 --status 时不改已有条目的状态 (新条目由 bulk_upsert 记为想看)
+    fields["my_status"] = record["my_status"]
+
+    Session = _session_factory()
+    if not opts.force:
+        refresh_keys()
+        with Session() as session:
+            matches = [m for m in find_matches(session, fields) if m["reason"] != "豆瓣 ID 相同"]
+        if matches:
+            print(json.dumps({"status": "possible_duplicate", "matches": matches}, ensure_ascii=False))
+            print("私藏中可能已有这一条目，确认要入库请加 --force", file=sys.stderr)
+            return 3
+
+    identifiers = [i for i in (detail.get("isbn"), detail.get("imdb_id"), record["sid"]) if i]
+    cover = download_cover(detail.get("cover_url"), identifier=identifiers[0], aliases=identifiers[1:])
+    if cover:
+        get_cover_index().add(cover)
+        fields["local_cover_path"] = cover
+    [(status, item_id)] = run_write(lambda s: bulk_upsert(s, [fields], keep_existing=FILL_FIELDS, commit=False))
+    if status == "failed":
+        print(f"写入条目失败: {fields['title']}", file=sys.stderr)
+        return 1
+    print(json.dumps({"id": item_id, "title": fields["title"], "status": status}, ensure_ascii=False))
+
+def run_stats(opts):
+    """python main.py stats [--json]：输出数据分析面板的统计"""
+    import json
+    from app.core.stats import load_dashboard
+    with _session_factory()() as session:
+        stats = load_dashboard(session)
+    if opts.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+        return
+    avg = f"{stats['avg_rating']:.1f}" if stats["avg_rating"] is not None else "-"
+    print(f"总藏品 {stats['total']} | 平均评分 {avg} | 已完成 {stats['done']}")
+    for title, counts in (("类型", stats["type_counts"]), ("状态", stats["status_counts"])):
+        print(f"{title}: " + "，".join(f"{name} {n}" for name, n in counts.items()))
+
+def run_startup(opts):
+    """测量常用命令的启动耗时 (取多次运行的中位数) 并与 STARTUP_BUDGETS 比较"""
+    import shlex
+    import statistics
+    import time
+    over = 0
+    for command, budget in STARTUP_BUDGETS.items():
+        samples = []
+        for _ in range(opts.runs):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, __file__] + shlex.split(command),
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            samples.append(time.perf_counter() - started)
+        median = statistics.median(samples)
+        ok = median <= budget
+        over += not ok
+        print(f"{'✅' if ok else '❌'} {command:<16} {median * 1000:6.0f} ms (预算 {budget * 1000:.0f} ms)")
+    return 1 if over else 0
+
+def run_shell(opts=None):
+    """交互式录入 / 浏览"""
+    from app.core.models import CollectionItem, MediaType, CollectionStatus
+    from app.core.fetcher import DoubanFetcher
 
     print("=== 欢迎使用 Douban-Collect (个人书影音收藏库) ===")
-    
+
     # 1. 初始化数据库
-    if not os.path.exists("data"):
-        os.makedirs("data")
-    engine = init_db()
-    session = get_session(engine)
-    
+    session = _session_factory()()
+
     # ... 其余 CLI 代码保持不变 ...
     while True:
         print("\n[1] 录入新收藏  [2] 查看我的库  [3] 退出")
         choice = input("请选择操作: ")
-        
+
         if choice == "1":
             keyword = input("请输入要搜索的名称: ")
             print("正在搜索...")
             fetcher = DoubanFetcher()
             results = fetcher.search(keyword)
-            
+
             if not results:
                 print("未找到结果。")
                 continue
-                
+
             for i, res in enumerate(results):
                 print(f"[{i}] {res['title']} ({res['url']})")
-                
+
             idx = input("请选择序号 (或输入 q 取消): ")
             try:
                 if idx == 'q': continue
@@ -61,7 +338,7 @@ def main():
                 print("✅ 录入成功！")
             except (ValueError, IndexError):
                 print("❌ 输入无效。")
-            
+
         elif choice == "2":
             items = session.query(CollectionItem).all()
             if not items:
@@ -69,9 +346,106 @@ def main():
             else:
                 for item in items:
                     print(f"[{item.media_type.value}] {item.title} - 状态: {item.my_status.value}")
-        
+
         elif choice == "3":
             break
 
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(prog="main.py", description="BeanStash 个人书影音收藏库 (不带子命令时进入交互模式)")
+    sub = parser.add_subparsers(dest="command", metavar="<命令>")
+
+    sub.add_parser("web", help="启动 Web 界面").set_defaults(func=run_web)
+    sub.add_parser("shell", help="交互式录入 / 浏览").set_defaults(func=run_shell)
+    sub.add_parser("thumbs", help="批量生成封面缩略图").set_defaults(func=run_thumbs)
+    sub.add_parser("covers", help="封面去重与清理").set_defaults(func=run_covers)
+    sub.add_parser("reindex", help="重建全文检索索引").set_defaults(func=run_reindex)
+
+    def add_filters(p):
+        p.add_argument("--format", choices=("jsonl", "tsv"), default="jsonl", help="输出格式")
+        p.add_argument("--type", choices=("movie", "book", "music"), help="只输出该类型")
+        p.add_argument("--status", choices=("wish", "doing", "done"), help="只输出该状态")
+        p.add_argument("--tag", action="append", help="按标签筛选，可重复指定")
+        p.add_argument("--any-tag", action="store_true", help="多个标签时命中任一即可 (默认需全部满足)")
+
+    p = sub.add_parser("list", help="逐行输出条目 (JSONL/TSV)")
+    add_filters(p)
+    p.add_argument("--limit", type=int, help="最多输出的条目数")
+    p.set_defaults(func=run_list)
+
+    p = sub.add_parser("export", help="分块导出全部条目 (CSV/TSV/JSONL/Parquet)")
+    p.add_argument("output", help="输出文件路径，格式默认取自扩展名")
+    p.add_argument("--format", choices=("csv", "tsv", "jsonl", "parquet"), help="导出格式")
+    p.add_argument("--incremental", action="store_true", help="只导出上次导出后变化的条目")
+    p.set_defaults(func=run_export)
+
+    p = sub.add_parser("backup", help="在线备份数据库 (写入时也能得到一致的副本)")
+    p.add_argument("--dir", default="data/backups", help="备份目录")
+    p.add_argument("--keep", type=int, default=7, help="保留最近几份备份")
+    p.add_argument("--force", action="store_true", help="数据库没有变化时也备份")
+    p.set_defaults(func=run_backup)
+
+    p = sub.add_parser("get", help="以 JSON 输出一个条目")
+    p.add_argument("key", help="条目 id (或豆瓣链接)")
+    p.add_argument("--douban", action="store_true", help="key 为豆瓣 ID")
+    p.set_defaults(func=run_get)
+
+    p = sub.add_parser("add", help="按豆瓣链接录入一个条目")
+    p.add_argument("url", help="豆瓣条目链接")
+    p.add_argument("--status", help="想看/在看/看过 (或 wish/doing/done)")
+    p.add_argument("--rating", help="我的评分 (0-5)")
+    p.add_argument("--tags", help="标签，逗号分隔")
+    p.add_argument("--comment", help="短评")
+    p.add_argument("--force", action="store_true", help="库中有相似条目时仍然入库")
+    p.set_defaults(func=run_add)
+
+    p = sub.add_parser("stats", help="输出统计信息")
+    p.add_argument("--json", action="store_true", help="以 JSON 输出")
+    p.set_defaults(func=run_stats)
+
+    p = sub.add_parser("import", help="从豆瓣导出文件或 URL 列表批量导入")
+    p.add_argument("file", help="豆瓣导出 CSV/JSON，或每行一个条目链接的文本文件")
+    p.add_argument("--workers", type=int, default=4, help="并发抓取数")
+    p.add_argument("--batch", type=int, default=50, help="每个事务写入的条目数")
+    p.set_defaults(func=run_import_cmd)
+
+    p = sub.add_parser("jobs", help="在命令行执行后台任务队列 (详情补全、封面下载)")
+    p.add_argument("--workers", type=int, default=4, help="并发执行的任务数")
+    p.add_argument("--now", action="store_true", help="不等待重试间隔，失败任务立即重试")
+    p.add_argument("--retry-failed", action="store_true", help="先把已失败的任务重新放回队列")
+    p.set_defaults(func=run_jobs_cmd)
+
+    p = sub.add_parser("refresh", help="按抓取时间从旧到新刷新条目的豆瓣元数据")
+    p.add_argument("--budget", type=int, default=100, help="本次最多抓取的详情页数")
+    p.add_argument("--min-age", type=int, default=7, help="只刷新超过这么多天未抓取的条目")
+    p.add_argument("--workers", type=int, default=4, help="并发抓取数")
+    p.set_defaults(func=run_refresh_cmd)
+
+    p = sub.add_parser("dupes", help="查找疑似重复的条目")
+    p.add_argument("--json", action="store_true", help="每组输出一行 JSON")
+    p.set_defaults(func=run_dupes)
+
+    p = sub.add_parser("similar", help="列出与某个条目相似的条目 (不给 ID 时从想看清单推荐)")
+    p.add_argument("id", type=int, nargs="?", help="条目 ID")
+    p.add_argument("--k", type=int, default=10, help="输出的条目数")
+    p.add_argument("--rebuild", action="store_true", help="丢弃现有索引并全部重算")
+    p.add_argument("--json", action="store_true", help="每个条目输出一行 JSON")
+    p.set_defaults(func=run_similar)
+
+    p = sub.add_parser("startup", help="测量常用命令的启动耗时")
+    p.add_argument("--runs", type=int, default=5, help="每个命令运行的次数")
+    p.set_defaults(func=run_startup)
+    return parser
+
+def main(argv=None):
+    opts = build_parser().parse_args(argv)
+    func = getattr(opts, "func", run_shell)
+    try:
+        return func(opts)
+    except BrokenPipeError:
+        # 输出被 head 等命令提前关闭
+        sys.stderr.close()
+        return 0
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
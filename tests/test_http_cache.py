@@ -0,0 +1,65 @@
+"""app.core.http_cache.ResponseCache：多个实例共用缓存文件时的容量淘汰、访问时间的批量写回"""
+import os
+import sqlite3
+
+from app.core import http_cache
+from app.core.http_cache import ResponseCache
+
+
+def _page(n):
+    # 随机字节的十六进制文本，压缩后约为 n 字节
+    return os.urandom(n).hex()
+
+
+def _keys(path):
+    with sqlite3.connect(path) as conn:
+        return {row[0] for row in conn.execute("SELECT url FROM responses")}
+
+
+def test_eviction_counts_entries_written_by_other_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = ResponseCache(path, max_bytes=10000)
+    second = ResponseCache(path, max_bytes=10000)
+    for i in range(4):
+        first.put(f"http://a/{i}", "detail", _page(2000))
+    # second 打开时缓存为空，但淘汰时应按文件中的实际总量计算
+    for i in range(4):
+        second.put(f"http://b/{i}", "detail", _page(2000))
+    with sqlite3.connect(path) as conn:
+        total = conn.execute("SELECT SUM(size) FROM responses").fetchone()[0]
+    assert total <= 10000
+    assert "http://b/3" in _keys(path)
+    assert "http://a/0" not in _keys(path)
+
+
+def test_hits_are_written_back_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, "TOUCH_BATCH", 3)
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path)
+    for i in range(3):
+        cache.put(f"http://a/{i}", "detail", "page")
+
+    def accessed():
+        with sqlite3.connect(path) as conn:
+            return dict(conn.execute("SELECT url, accessed_at FROM responses"))
+
+    before = accessed()
+    cache.get("http://a/0")
+    cache.get("http://a/1")
+    assert accessed() == before
+    cache.get("http://a/2")
+    after = accessed()
+    assert all(after[url] > before[url] for url in before)
+
+
+def test_recent_hits_survive_eviction(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path, max_bytes=10000)
+    for i in range(4):
+        cache.put(f"http://a/{i}", "detail", _page(2000))
+    # 尚未写回的命中也要参与淘汰顺序
+    assert cache.get("http://a/0") is not None
+    cache.put("http://a/4", "detail", _page(2000))
+    cache.put("http://a/5", "detail", _page(2000))
+    assert "http://a/0" in _keys(path)
+    assert "http://a/1" not in _keys(path)
@@ -0,0 +1,28 @@
+"""app.core.importer 对导出文件中状态文本的识别"""
+import pytest
+
+from app.core.importer import _parse_status, normalize_record
+from app.core.models import CollectionStatus
+
+
+@pytest.mark.parametrize("text, status", [
+    ("done", CollectionStatus.DONE),
+    ("Done ", CollectionStatus.DONE),
+    ("doing", CollectionStatus.DOING),
+    ("do", CollectionStatus.DOING),
+    ("collect", CollectionStatus.DONE),
+    ("wish", CollectionStatus.WISH),
+    ("看过", CollectionStatus.DONE),
+    ("想读", CollectionStatus.WISH),
+    ("在听", CollectionStatus.DOING),
+    ("2020-01-01 读过", CollectionStatus.DONE),
+    ("download", None),
+    ("", None),
+])
+def test_parse_status(text, status):
+    assert _parse_status(text) is status
+
+
+def test_normalize_record_status():
+    record = normalize_record({"url": "https://movie.douban.com/subject/1292052/", "status": "done"})
+    assert record["my_status"] is CollectionStatus.DONE
@@ -0,0 +1,29 @@
+"""app.core.parser.parse_detail 对 fixtures/douban 冻结样本的输出"""
+import os
+
+import pytest
+
+from app.core import parser
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), parser.CORPUS_DIR)
+
+
+def test_corpus_matches():
+    assert parser.verify_corpus(CORPUS_DIR) == []
+
+
+def test_corpus_matches_with_html_parser(monkeypatch):
+    monkeypatch.setattr(parser, "PARSER_ENGINE", "html.parser")
+    assert parser.verify_corpus(CORPUS_DIR) == []
+
+
+def test_corpus_matches_without_strainer(monkeypatch):
+    # bs4 < 4.13 没有 allow_tag_creation，此时整页建树
+    monkeypatch.setattr(parser, "_STRAINER", None)
+    assert parser.verify_corpus(CORPUS_DIR) == []
+
+
+def test_corpus_matches_without_json_ld(monkeypatch):
+    # 不带 JSON-LD 的页面全部走 DOM 选择器
+    monkeypatch.setattr(parser, "_json_ld", lambda html: {})
+    assert parser.verify_corpus(CORPUS_DIR) == []
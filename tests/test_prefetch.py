@@ -0,0 +1,52 @@
+"""app.core.prefetch.Prefetcher：按 owner 取消过时的预取，多个会话互不影响"""
+import threading
+
+from app.core.prefetch import Prefetcher
+
+
+class _BlockingFetcher:
+    """fetch_detail 阻塞到 release 被设置，便于观察尚未完成的预取"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def fetch_detail(self, url):
+        self.release.wait(5)
+        return {"title": url}
+
+
+def _prefetcher():
+    fetcher = _BlockingFetcher()
+    return Prefetcher(fetcher=fetcher, max_workers=1, max_entries=10, covers=False), fetcher
+
+
+def test_new_search_cancels_own_stale_entries():
+    prefetcher, fetcher = _prefetcher()
+    prefetcher.prefetch(["a1", "a2", "a3"], owner="tab-a")
+    prefetcher.prefetch(["a4"], owner="tab-a")
+    fetcher.release.set()
+    assert prefetcher.get("a4", wait=2) == {"detail": {"title": "a4"}, "cover": None}
+    # a1 已开始执行，a2/a3 尚未开始，都已被取消
+    assert "a2" not in prefetcher.entries and "a3" not in prefetcher.entries
+    assert prefetcher.get("a2") is None
+
+
+def test_other_sessions_keep_their_entries():
+    prefetcher, fetcher = _prefetcher()
+    prefetcher.prefetch(["a1", "a2"], owner="tab-a")
+    prefetcher.prefetch(["b1", "b2"], owner="tab-b")
+    prefetcher.prefetch(["a3"], owner="tab-a")
+    fetcher.release.set()
+    assert prefetcher.get("b2", wait=2) == {"detail": {"title": "b2"}, "cover": None}
+    assert "a2" not in prefetcher.entries
+
+
+def test_shared_url_survives_until_no_owner_needs_it():
+    prefetcher, fetcher = _prefetcher()
+    prefetcher.prefetch(["busy", "shared"], owner="tab-a")
+    prefetcher.prefetch(["shared"], owner="tab-b")
+    prefetcher.prefetch(["other"], owner="tab-a")
+    assert "shared" in prefetcher.entries
+    prefetcher.cancel(owner="tab-b")
+    assert "shared" not in prefetcher.entries
+    fetcher.release.set()
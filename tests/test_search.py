@@ -0,0 +1,34 @@
+"""app.core.search.search_library：trigram 与旧版 SQLite 的 unicode61 索引下都能检索中文"""
+import pytest
+
+from app.core import search
+from app.core.models import CollectionItem, MediaType, get_session, init_db
+
+
+@pytest.fixture(params=[True, False], ids=["trigram", "unicode61"])
+def session(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(search, "_has_trigram", lambda conn: request.param)
+    session = get_session(init_db(f"sqlite:///{tmp_path / 'collection.db'}"))
+    session.add_all([
+        CollectionItem(title="肖申克的救赎", original_title="The Shawshank Redemption", media_type=MediaType.MOVIE),
+        CollectionItem(title="活着", author="余华", media_type=MediaType.BOOK),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_tokenizer_is_read_from_schema(session, request):
+    assert search.fts_tokenizer(session) == request.node.callspec.id
+
+
+@pytest.mark.parametrize("query, titles", [
+    ("肖申克", ["肖申克的救赎"]),
+    ("活着", ["活着"]),
+    ("余华 活着", ["活着"]),
+    ("shawshank", ["肖申克的救赎"]),
+    ("救赎 redemption", ["肖申克的救赎"]),
+    ("不存在的书", []),
+])
+def test_search_library(session, query, titles):
+    assert [item.title for item in search.search_library(session, query)] == titles
@@ -0,0 +1,117 @@
+"""app.core.transport.HttpClient 对本地桩服务器的行为：5xx/429 重试、按主机的请求间隔、连接复用"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.transport import HttpClient
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """/fail/<n>/<状态码> 前 n 次返回该状态码、之后返回 200；其余路径直接返回 200"""
+    protocol_version = "HTTP/1.1"  # 保持连接，才能观察到复用
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append((self.path, time.monotonic(), self.client_address[1]))
+            seen = sum(1 for path, _, _ in server.hits if path == self.path)
+        status = 200
+        if self.path.startswith("/fail/"):
+            _, _, failures, code = self.path.split("/")
+            if seen <= int(failures):
+                status = int(code)
+        body = b"ok" if status == 200 else b"error"
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.hits = []
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client():
+    client = HttpClient(backoff_factor=0, per_host_interval=0, timeout=5)
+    yield client
+    client.close()
+
+
+@pytest.mark.parametrize("code", [500, 502, 503, 504, 429])
+def test_retries_transient_errors(stub, client, code):
+    server, base = stub
+    resp = client.get(f"{base}/fail/2/{code}")
+    assert resp.status_code == 200
+    assert len(server.hits) == 3
+
+
+def test_gives_up_after_max_retries(stub):
+    server, base = stub
+    client = HttpClient(backoff_factor=0, per_host_interval=0, max_retries=2)
+    try:
+        resp = client.get(f"{base}/fail/10/503")
+    finally:
+        client.close()
+    assert resp.status_code == 503
+    assert len(server.hits) == 3  # 首次请求 + 2 次重试
+
+
+def test_does_not_retry_client_errors(stub, client):
+    server, base = stub
+    resp = client.get(f"{base}/fail/1/404")
+    assert resp.status_code == 404
+    assert len(server.hits) == 1
+
+
+def test_per_host_interval_spaces_requests(stub):
+    server, base = stub
+    interval = 0.1
+    client = HttpClient(backoff_factor=0, per_host_interval=interval, per_host_concurrency=4)
+    try:
+        # 并发发起，限流器仍让同一主机的请求按间隔依次开始
+        results = client.map(lambda i: client.get(f"{base}/item/{i}").status_code, range(5), max_workers=5)
+    finally:
+        client.close()
+    assert results == [200] * 5
+    starts = sorted(at for _, at, _ in server.hits)
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    assert min(gaps) >= interval * 0.8
+
+
+def test_interval_is_per_host(stub):
+    server, base = stub
+    other = base.replace("127.0.0.1", "localhost")  # 同一服务器，不同的主机名
+    client = HttpClient(backoff_factor=0, per_host_interval=0.5)
+    try:
+        started = time.monotonic()
+        client.get(f"{base}/a")
+        client.get(f"{other}/b")
+        elapsed = time.monotonic() - started
+    finally:
+        client.close()
+    assert elapsed < 0.5
+
+
+def test_reuses_connections(stub, client):
+    server, base = stub
+    for i in range(5):
+        assert client.get(f"{base}/item/{i}").status_code == 200
+    ports = {port for _, _, port in server.hits}
+    assert len(server.hits) == 5
+    assert len(ports) == 1